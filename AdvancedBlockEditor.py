@@ -1,36 +1,118 @@
 import sys
 import math
+import itertools
+from functools import lru_cache
 from PyQt5.QtWidgets import (QApplication, QMainWindow, QWidget, QVBoxLayout, 
                              QHBoxLayout, QLabel, QPushButton, QGraphicsView, 
                              QGraphicsScene, QGraphicsItem, QGraphicsRectItem,
                              QGraphicsEllipseItem, QGraphicsTextItem, QMenu,
                              QAction, QDialog, QLineEdit, QComboBox, QFormLayout,
                              QDialogButtonBox, QMessageBox, QSplitter, QListWidget,
-                             QGroupBox, QFrame, QScrollArea, QTextEdit, QTabWidget)
+                             QGroupBox, QFrame, QScrollArea, QTextEdit, QTabWidget,
+                             QInputDialog, QFileDialog, QSlider)
+from PyQt5 import sip
 from PyQt5.QtCore import Qt, QPointF, QRectF, QLineF, pyqtSignal, QTimer
-from PyQt5.QtGui import QPainter, QPen, QBrush, QColor, QFont, QPainterPath
+from PyQt5.QtGui import (QPainter, QPen, QBrush, QColor, QFont, QPainterPath,
+                         QPainterPathStroker, QPolygonF)
 import control
 import numpy as np
+from matplotlib.backends.backend_qt5agg import FigureCanvasQTAgg as FigureCanvas
+from matplotlib.figure import Figure
+from ConnectorRouting import ConnectorRouter
+from DiagramCache import DiagramFingerprint, ReductionCache, element_hash
+from DiagramLayout import LayoutWorker
+from DiagramValidation import DiagramValidator, OK, WARNING, ERROR
+from DiscreteSimulator import split_delay
+from FrequencyResponse import FREQUENCY_POINTS, FrequencyResponseSolver, bode_data, rational_response
+from ExpressionParser import ExpressionError, parse_coefficients
+from NetlistImport import NetlistError, parse_netlist
+from ParametricSystems import (DEFAULT_PARAMETER_VALUE, ParametricFlowGraph, compile_expression,
+                               free_parameters, param_gain, parse_parametric, reduce_parametric)
+from DiagramReducer import (SignalFlowGraph, Zpk, rat, rat_mul, reduce_graph, reduce_matrix,
+                            strong_components)
+from PIDTuner import PIDTuner, LoopModel, pid_coefficients, PID_DEFAULT_FILTER
+from StreamingSimulation import LivePlotWidget
+from SystemAnalysis import (routh_hurwitz, step_metrics, discrete_step_metrics,
+                            tf_batch, format_metrics, loop_functions, METRIC_LABELS,
+                            stability_margins, format_margins)
+
+# Blocks that live in the z-domain and carry a sample time
+DISCRETE_BLOCK_TYPES = ['unit_delay', 'discrete_tf', 'zoh']
+
+BLOCK_TYPES = ['sum', 'subtract', 'gain', 'integrator', 'transfer_function', 'pid',
+               'delay', 'input', 'output'] + DISCRETE_BLOCK_TYPES
+
+@lru_cache(maxsize=1024)
+def evaluate_tf_expression(expression, dt=None):
+    """Memoized transfer function of an expression in s, or in z when dt is given"""
+    if dt is None:
+        return control.tf(*parse_coefficients(expression, 's'))
+    return control.tf(*parse_coefficients(expression, 'z'), dt)
+
+
+# Fill colour of each block type, built once instead of per block
+BLOCK_COLORS = {
+    'sum': QColor(255, 200, 200),
+    'subtract': QColor(255, 200, 200),
+    'gain': QColor(200, 255, 200),
+    'integrator': QColor(200, 200, 255),
+    'transfer_function': QColor(255, 255, 200),
+    'pid': QColor(200, 240, 220),
+    'delay': QColor(240, 220, 200),
+    'input': QColor(200, 255, 255),
+    'output': QColor(255, 200, 255),
+    'unit_delay': QColor(220, 200, 255),
+    'discrete_tf': QColor(255, 230, 180),
+    'zoh': QColor(220, 220, 220)
+}
+
+# Session-unique block ids, used to identify blocks in diagram fingerprints
+_block_ids = itertools.count()
+
+
+@lru_cache(maxsize=256)
+def pade_coefficients(delay, order):
+    """Memoized Pade approximant of exp(-delay*s) as (num, den) tuples"""
+    if delay == 0:
+        return (1.0,), (1.0,)
+    num, den = control.pade(delay, order)
+    return tuple(num), tuple(den)
+
 
 class BlockItem(QGraphicsRectItem):
     """Enhanced block item with transfer function calculation capabilities"""
     def __init__(self, block_type, name, transfer_function=None):
         super().__init__()
+        self.uid = next(_block_ids)
         self.block_type = block_type
         self.name = name
         self.transfer_function = transfer_function
+        # Expression text of a transfer function block, and the named
+        # parameters it uses (values come from the diagram)
+        self.expression = None
+        self.parameters = ()
+        # Why the expression cannot be evaluated at the current values, if so
+        self.evaluation_error = None
         self.gain_value = 1.0
+        self.sample_time = 0.1
+        self.kp = 1.0
+        self.ki = 0.0
+        self.kd = 0.0
+        self.filter_n = PID_DEFAULT_FILTER
+        self.delay_time = 1.0
+        self.pade_order = 3
         self.input_ports = []
         self.output_ports = []
         self.connections = []
         self.input_blocks = []
         self.output_blocks = []
+        self.status = OK
         
         # Set up the block appearance
         self.setRect(0, 0, 120, 80)
-        self.setFlag(QGraphicsItem.ItemIsMovable, True)
-        self.setFlag(QGraphicsItem.ItemIsSelectable, True)
-        self.setFlag(QGraphicsItem.ItemSendsGeometryChanges, True)
+        # One setFlags call: every flag change is a round trip through itemChange
+        self.setFlags(QGraphicsItem.ItemIsMovable | QGraphicsItem.ItemIsSelectable |
+                      QGraphicsItem.ItemSendsGeometryChanges)
         
         # Create ports
         self.create_ports()
@@ -59,46 +141,86 @@ class BlockItem(QGraphicsRectItem):
             
     def setup_appearance(self):
         """Set up the visual appearance of the block"""
-        colors = {
-            'sum': QColor(255, 200, 200),
-            'subtract': QColor(255, 200, 200),
-            'gain': QColor(200, 255, 200),
-            'integrator': QColor(200, 200, 255),
-            'transfer_function': QColor(255, 255, 200),
-            'input': QColor(200, 255, 255),
-            'output': QColor(255, 200, 255)
-        }
-        
-        self.setBrush(QBrush(colors.get(self.block_type, QColor(200, 200, 200))))
+        self.setBrush(QBrush(BLOCK_COLORS.get(self.block_type, QColor(200, 200, 200))))
         self.setPen(QPen(QColor(0, 0, 0), 2))
         
     def update_transfer_function(self):
         """Update the transfer function based on block type and parameters"""
-        s = control.TransferFunction.s
-        
         if self.block_type == 'gain':
             self.transfer_function = self.gain_value
         elif self.block_type == 'integrator':
-            self.transfer_function = 1/s
+            self.transfer_function = evaluate_tf_expression("1 / s")
+        elif self.block_type == 'delay':
+            self.transfer_function = control.tf(*pade_coefficients(self.delay_time, self.pade_order))
+        elif self.block_type == 'pid':
+            self.transfer_function = control.tf(*pid_coefficients(self.kp, self.ki, self.kd,
+                                                                  self.filter_n))
         elif self.block_type == 'sum':
             self.transfer_function = 1  # Will be handled by connection logic
         elif self.block_type == 'subtract':
             self.transfer_function = 1  # Will be handled by connection logic
         elif self.block_type == 'transfer_function':
-            if self.transfer_function is None:
-                self.transfer_function = 1 / (s + 1)
+            if isinstance(self.transfer_function, str):
+                # Keep the text so parameter values can be substituted again
+                self.expression = self.transfer_function
+            self.evaluation_error = None
+            try:
+                self.parameters = free_parameters(self.expression) if self.expression else ()
+                if self.expression is not None:
+                    self.transfer_function = self.expression_transfer_function(
+                        scene_parameter_values(self.scene()))
+                elif not isinstance(self.transfer_function, control.TransferFunction):
+                    self.transfer_function = evaluate_tf_expression("1 / (s + 1)")
+            except (ExpressionError, ValueError) as e:
+                # Keep the expression, it may evaluate again with other values;
+                # the block is flagged and calculations refuse it until then
+                self.evaluation_error = f"Cannot evaluate '{self.expression}': {e}"
+                if not isinstance(self.transfer_function, control.TransferFunction):
+                    self.transfer_function = evaluate_tf_expression("1 / (s + 1)")
+        elif self.block_type == 'unit_delay':
+            self.transfer_function = control.tf([1], [1, 0], self.sample_time)
+        elif self.block_type == 'zoh':
+            # Unity gain on the samples; continuous blocks downstream of it are
+            # discretized together (see TransferFunctionCalculator.sampled_data_edges)
+            self.transfer_function = control.tf([1], [1], self.sample_time)
+        elif self.block_type == 'discrete_tf':
+            if isinstance(self.transfer_function, control.TransferFunction):
+                # Keep the coefficients, only the sample time changed
+                self.transfer_function = control.tf(self.transfer_function.num[0][0],
+                                                    self.transfer_function.den[0][0],
+                                                    self.sample_time)
             else:
-                # Try to parse the transfer function string
                 try:
-                    # Replace common mathematical notation
-                    tf_str = str(self.transfer_function)
-                    tf_str = tf_str.replace('^', '**')
-                    # Create a safe evaluation environment
-                    safe_dict = {'s': s, 'control': control, 'np': np}
-                    self.transfer_function = eval(tf_str, {"__builtins__": {}}, safe_dict)
-                except:
-                    # If parsing fails, use default
-                    self.transfer_function = 1 / (s + 1)
+                    self.transfer_function = evaluate_tf_expression(
+                        str(self.transfer_function or "1 / (z - 0.5)"), self.sample_time)
+                except ValueError:
+                    self.transfer_function = evaluate_tf_expression("1 / (z - 0.5)", self.sample_time)
+        self.refresh_fingerprint()
+        validator = scene_validator(self.scene())
+        if validator is not None:
+            validator.block_changed(self)
+
+    def expression_transfer_function(self, values):
+        """Transfer function of the block's expression at the given parameter values"""
+        if not self.parameters:
+            return evaluate_tf_expression(self.expression)
+        compiled = compile_expression(self.expression, self.parameters)
+        return control.tf(*compiled.at(
+            {name: values.get(name, DEFAULT_PARAMETER_VALUE) for name in self.parameters}))
+
+    def structure_hash(self):
+        """Hash of the block type and parameters, independent of its position"""
+        tf = self.transfer_function
+        if isinstance(tf, control.TransferFunction):
+            tf = (list(tf.num[0][0]), list(tf.den[0][0]), tf.dt)
+        return element_hash('block', self.uid, self.block_type, self.gain_value,
+                            self.sample_time, self.kp, self.ki, self.kd, self.filter_n,
+                            self.delay_time, self.pade_order, tf, self.evaluation_error)
+
+    def refresh_fingerprint(self):
+        fingerprint = scene_fingerprint(self.scene())
+        if fingerprint is not None:
+            fingerprint.set(self, self.structure_hash())
                 
     def get_effective_transfer_function(self):
         """Get the effective transfer function considering connections"""
@@ -131,6 +253,12 @@ class BlockItem(QGraphicsRectItem):
             painter.drawText(rect, Qt.AlignCenter, f"K = {self.gain_value}")
         elif self.block_type == 'integrator':
             painter.drawText(rect, Qt.AlignCenter, "1/s")
+        elif self.block_type == 'delay':
+            painter.drawText(rect, Qt.AlignCenter, f"e^(-sT)\nT = {self.delay_time}")
+        elif self.block_type == 'pid':
+            painter.setFont(QFont("Arial", 8, QFont.Bold))
+            painter.drawText(rect, Qt.AlignCenter,
+                             f"PID\nKp = {self.kp:.4g}\nKi = {self.ki:.4g}\nKd = {self.kd:.4g}")
         elif self.block_type == 'transfer_function':
             painter.setFont(QFont("Arial", 8))
             painter.drawText(rect, Qt.AlignCenter, self.name)
@@ -138,6 +266,24 @@ class BlockItem(QGraphicsRectItem):
             painter.drawText(rect, Qt.AlignCenter, "Input")
         elif self.block_type == 'output':
             painter.drawText(rect, Qt.AlignCenter, "Output")
+        elif self.block_type == 'unit_delay':
+            painter.drawText(rect, Qt.AlignCenter, f"1/z\nTs = {self.sample_time}")
+        elif self.block_type == 'zoh':
+            painter.drawText(rect, Qt.AlignCenter, f"ZOH\nTs = {self.sample_time}")
+        elif self.block_type == 'discrete_tf':
+            painter.setFont(QFont("Arial", 8))
+            painter.drawText(rect, Qt.AlignCenter, f"{self.name}\nTs = {self.sample_time}")
+
+        if self.status != OK:
+            painter.setPen(STATUS_PENS[self.status])
+            painter.setBrush(Qt.NoBrush)
+            painter.drawRect(rect.adjusted(3, 3, -3, -3))
+
+    def set_status(self, level, messages):
+        """Validation status, shown as an outline and a tooltip"""
+        self.status = level
+        self.setToolTip("\n".join(messages))
+        self.update()
             
     def itemChange(self, change, value):
         """Handle item changes (movement, selection)"""
@@ -145,12 +291,90 @@ class BlockItem(QGraphicsRectItem):
             # Update port positions when block moves
             for port in self.input_ports + self.output_ports:
                 port.update_position()
+        elif change == QGraphicsItem.ItemPositionHasChanged:
+            self.reroute_connections()
+        elif change == QGraphicsItem.ItemSceneChange:
+            router = scene_router(self.scene())
+            if router is not None:
+                router.remove_obstacle(self)
+            fingerprint = scene_fingerprint(self.scene())
+            if fingerprint is not None:
+                fingerprint.discard(self)
+            validator = scene_validator(self.scene())
+            if validator is not None:
+                validator.remove_block(self)
+        elif change == QGraphicsItem.ItemSceneHasChanged:
+            self.reroute_connections()
+            if self.parameters:
+                # Take the parameter values of the new diagram
+                self.update_transfer_function()
+            else:
+                self.refresh_fingerprint()
+            validator = scene_validator(self.scene())
+            if validator is not None:
+                validator.add_block(self)
         return super().itemChange(change, value)
 
+    def reroute_connections(self):
+        """Re-route this block's wires and any wire crossing its old or new bounds"""
+        router = scene_router(self.scene())
+        if router is None:
+            return
+        affected = router.set_obstacle(self, rect_tuple(self.sceneBoundingRect()))
+        for port in self.input_ports + self.output_ports:
+            affected.update(port.connections)
+        for connection in affected:
+            if connection.scene() is self.scene():
+                connection.update_route()
+            else:
+                router.remove_wire(connection)
+
+def scene_view(scene):
+    """The view showing a scene, if any"""
+    if scene is None or not scene.views():
+        return None
+    return scene.views()[0]
+
+
+def scene_router(scene):
+    """Connector router of the view showing a scene, if any"""
+    return getattr(scene_view(scene), 'router', None)
+
+
+def scene_fingerprint(scene):
+    """Structural fingerprint of the diagram shown in a scene, if any"""
+    return getattr(scene_view(scene), 'fingerprint', None)
+
+
+def scene_validator(scene):
+    """Structural validator of the diagram shown in a scene, if any"""
+    return getattr(scene_view(scene), 'validator', None)
+
+
+def scene_parameter_values(scene):
+    """Named parameter values of the diagram shown in a scene"""
+    return getattr(scene_view(scene), 'parameter_values', {})
+
+
+def rect_tuple(rect):
+    return rect.left(), rect.top(), rect.right(), rect.bottom()
+
+
+PORT_PEN = QPen(QColor(0, 0, 0), 2)
+# Outline drawn around blocks with validation issues
+STATUS_PENS = {
+    WARNING: QPen(QColor(230, 140, 0), 3, Qt.DashLine),
+    ERROR: QPen(QColor(220, 0, 0), 3),
+}
+INPUT_PORT_BRUSH = QBrush(QColor(50, 150, 50))
+OUTPUT_PORT_BRUSH = QBrush(QColor(150, 50, 50))
+
+
 class PortItem(QGraphicsEllipseItem):
     """Enhanced port item with connection management"""
     def __init__(self, parent_block, port_type, x, y):
-        super().__init__()
+        # Child of the block so it moves with it and maps to scene coordinates
+        super().__init__(parent_block)
         self.parent_block = parent_block
         self.port_type = port_type
         self.connections = []
@@ -158,22 +382,23 @@ class PortItem(QGraphicsEllipseItem):
         # Set up port appearance - make them more visible and clickable
         self.setRect(0, 0, 20, 20)  # Even larger size for easier clicking
         self.setPos(x - 10, y - 10)   # Center the larger port
-        self.setBrush(QBrush(QColor(50, 150, 50)))  # Green for input ports
-        self.setPen(QPen(QColor(0, 0, 0), 2))
+        self.setPen(PORT_PEN)
         
         # Set different colors for input vs output ports
         if port_type == 'input':
-            self.setBrush(QBrush(QColor(50, 150, 50)))  # Green for input
+            self.setBrush(INPUT_PORT_BRUSH)  # Green for input
         else:
-            self.setBrush(QBrush(QColor(150, 50, 50)))  # Red for output
+            self.setBrush(OUTPUT_PORT_BRUSH)  # Red for output
             
-        # Make ports selectable and clickable
-        self.setFlag(QGraphicsItem.ItemIsSelectable, True)
-        self.setFlag(QGraphicsItem.ItemIsMovable, False)  # Ports don't move independently
-        self.setFlag(QGraphicsItem.ItemSendsGeometryChanges, True)
+        # Make ports selectable and clickable; ports don't move independently
+        self.setFlags(QGraphicsItem.ItemIsSelectable | QGraphicsItem.ItemSendsGeometryChanges)
         
         # Enable mouse tracking for hover effects
         self.setAcceptHoverEvents(True)
+
+    def center(self):
+        """Scene position of the port center, where wires attach"""
+        return self.mapToScene(self.rect().center())
         
     def update_position(self):
         """Update port position when parent block moves"""
@@ -249,20 +474,97 @@ class ConnectionItem(QGraphicsItem):
         super().__init__()
         self.start_port = start_port
         self.end_port = end_port
+        self.attached = False
+        self.attach()
+
+        # Orthogonal route in scene coordinates, from the output to the input
+        self.points = [self.start_port.center(), self.end_port.center()]
+
+    def attach(self):
+        """Register the wire with its ports and its target block"""
+        if self.attached:
+            return
+        self.attached = True
         self.start_port.connections.append(self)
         self.end_port.connections.append(self)
-        
-        # Update block connections
-        if start_port.port_type == 'output' and end_port.port_type == 'input':
-            end_port.parent_block.input_blocks.append(start_port.parent_block)
-        elif start_port.port_type == 'input' and end_port.port_type == 'output':
-            start_port.parent_block.input_blocks.append(end_port.parent_block)
+        out_port, in_port = self.directed_ports()
+        in_port.parent_block.input_blocks.append(out_port.parent_block)
+
+    def detach(self):
+        """Undo ``attach`` once the wire leaves the diagram"""
+        if not self.attached:
+            return
+        self.attached = False
+        self.start_port.connections.remove(self)
+        self.end_port.connections.remove(self)
+        out_port, in_port = self.directed_ports()
+        in_port.parent_block.input_blocks.remove(out_port.parent_block)
+
+    def end_blocks(self):
+        return self.start_port.parent_block, self.end_port.parent_block
+
+    def itemChange(self, change, value):
+        """Route and fingerprint the wire when it enters a scene, forget it when it leaves"""
+        if change == QGraphicsItem.ItemSceneChange:
+            router = scene_router(self.scene())
+            if router is not None:
+                router.remove_wire(self)
+            fingerprint = scene_fingerprint(self.scene())
+            if fingerprint is not None:
+                fingerprint.discard(self)
+            if self.scene() is not None:
+                self.detach()
+                validator = scene_validator(self.scene())
+                if validator is not None:
+                    validator.connection_changed(*self.end_blocks())
+        elif change == QGraphicsItem.ItemSceneHasChanged:
+            if self.scene() is not None:
+                self.attach()
+                validator = scene_validator(self.scene())
+                if validator is not None:
+                    validator.connection_changed(*self.end_blocks())
+            self.update_route()
+            fingerprint = scene_fingerprint(self.scene())
+            if fingerprint is not None:
+                out_port, in_port = self.directed_ports()
+                target = in_port.parent_block
+                fingerprint.set(self, element_hash('wire', out_port.parent_block.uid, target.uid,
+                                                   target.input_ports.index(in_port)))
+        return super().itemChange(change, value)
+
+    def directed_ports(self):
+        """(output port, input port) regardless of the direction it was drawn in"""
+        if self.start_port.port_type == 'output':
+            return self.start_port, self.end_port
+        return self.end_port, self.start_port
+
+    def update_route(self):
+        """Recompute the orthogonal route around the blocks in the scene"""
+        out_port, in_port = self.directed_ports()
+        start, end = out_port.center(), in_port.center()
+        router = scene_router(self.scene())
+        if router is None:
+            points = [start, end]
+        else:
+            route = router.route(self, (start.x(), start.y()), (end.x(), end.y()))
+            points = [QPointF(x, y) for x, y in route]
+        self.prepareGeometryChange()
+        self.points = points
+        self.update()
         
     def boundingRect(self):
         """Return the bounding rectangle of the connection"""
-        start_pos = self.start_port.scenePos()
-        end_pos = self.end_port.scenePos()
-        return QRectF(start_pos, end_pos).normalized()
+        # Pad for the arrow head and the end markers
+        return QPolygonF(self.points).boundingRect().adjusted(-10, -10, 10, 10)
+
+    def shape(self):
+        """Hit area following the wire instead of its whole bounding box"""
+        path = QPainterPath(self.points[0])
+        for point in self.points[1:]:
+            path.lineTo(point)
+        stroker = QPainterPathStroker()
+        stroker.setWidth(8)
+        return stroker.createStroke(path)
         
     def paint(self, painter, option, widget):
         """Draw the connection line with arrow"""
@@ -275,17 +577,14 @@ class ConnectionItem(QGraphicsItem):
         else:
             painter.setPen(QPen(QColor(0, 0, 0), 2))  # Black normal line
             
-        start_pos = self.start_port.scenePos()
-        end_pos = self.end_port.scenePos()
-        
         # Draw main line
-        painter.drawLine(start_pos, end_pos)
+        painter.drawPolyline(QPolygonF(self.points))
         
-        # Draw arrow
-        self.draw_arrow(painter, start_pos, end_pos)
+        # Draw arrow along the last segment
+        self.draw_arrow(painter, self.points[-2], self.points[-1])
         
         # Draw connection points at the ends
-        self.draw_connection_points(painter, start_pos, end_pos)
+        self.draw_connection_points(painter, self.points[0], self.points[-1])
         
     def draw_arrow(self, painter, start, end):
         """Draw an arrow at the end of the connection"""
@@ -349,37 +648,425 @@ class TempConnectionLine(QGraphicsItem):
 
 class TransferFunctionCalculator:
     """Class to calculate overall transfer function from block diagram"""
-    
+
+    @staticmethod
+    def diagram_sample_time(blocks):
+        """Common sample time of the discrete blocks, or None for a continuous diagram"""
+        sample_times = sorted({b.sample_time for b in blocks if b.block_type in DISCRETE_BLOCK_TYPES})
+        if not sample_times:
+            return None
+        if len(sample_times) > 1:
+            raise ValueError(f"Discrete blocks use different sample times: {sample_times}")
+        return sample_times[0]
+
+    @staticmethod
+    def tf_coefficients(transfer_function):
+        """Return (num, den) coefficient arrays for a block transfer function"""
+        if isinstance(transfer_function, control.TransferFunction):
+            return (np.array(transfer_function.num[0][0], dtype=float),
+                    np.array(transfer_function.den[0][0], dtype=float))
+        return np.array([float(transfer_function)]), np.array([1.0])
+
+    @staticmethod
+    def connection_endpoints(connection):
+        """Return (source block, target block, target input index) of a connection"""
+        if connection.start_port.port_type == 'output':
+            out_port, in_port = connection.start_port, connection.end_port
+        else:
+            out_port, in_port = connection.end_port, connection.start_port
+        target = in_port.parent_block
+        return out_port.parent_block, target, target.input_ports.index(in_port)
+
+    @staticmethod
+    def edge_gain(block, port_index, dt=None):
+        """Gain applied to a signal entering a block through the given input"""
+        if block.block_type == 'subtract' and port_index == 1:
+            return rat([-1.0])
+        if block.block_type in ['sum', 'subtract', 'output']:
+            return rat([1.0])
+        if block.block_type == 'delay' and dt is not None:
+            # Whole-sample delays are exact in the z-domain: z^-k
+            samples, remainder = split_delay(block.delay_time, dt)
+            if remainder:
+                raise ValueError(f"Delay block '{block.name}' of {block.delay_time:g} s is not "
+                                 f"a whole number of {dt:g} s samples")
+            return rat([1.0], [1.0] + [0.0] * samples)
+        return rat(*TransferFunctionCalculator.tf_coefficients(block.transfer_function))
+
     @staticmethod
-    def calculate_overall_tf(blocks, connections):
-        """Calculate the overall transfer function of the system"""
+    def is_continuous_dynamic(block):
+        """Whether a block has continuous-time dynamics (not a plain gain)"""
+        tf = block.transfer_function
+        return (block.block_type not in DISCRETE_BLOCK_TYPES + ['input', 'output', 'delay'] and
+                isinstance(tf, control.TransferFunction) and tf.isctime(strict=True) and
+                len(tf.den[0][0]) > 1)
+
+    @staticmethod
+    def sampled_data_edges(blocks, connections, dt):
+        """(source, target, gain) edges in z of a diagram mixing z and s blocks
+
+        The continuous part of the diagram is discretized as a whole: it must
+        be fed only through zero-order holds, and the transfers from the held
+        signals to the points where it is sampled (by a discrete block, an
+        output, or a sum with a sampled input) are reduced in s, then
+        discretized with one ZOH each.  Discretizing block by block would be wrong for cascades and
+        loops, since a product of ZOH equivalents is not the ZOH equivalent of
+        the product.  Gains, sums and whole-sample delays keep a held signal
+        held, so they may sit between the hold and the continuous blocks.
+        """
+        ends = [TransferFunctionCalculator.connection_endpoints(c) for c in connections]
+        ids = set(blocks)
+        ends = [(s, t, p) for s, t, p in ends if s in ids and t in ids and t.block_type != 'input']
+
+        def transparent(block):
+            return block.block_type not in DISCRETE_BLOCK_TYPES + ['input', 'output']
+
+        inputs = {}
+        for source, target, _ in ends:
+            inputs.setdefault(target, []).append(source)
+        dynamic = {b for b in blocks if TransferFunctionCalculator.is_continuous_dynamic(b)}
+
+        # Held signals: hold outputs, and gains, sums and delays of held signals only
+        held = {b for b in blocks if b.block_type == 'zoh'}
+        changed = True
+        while changed:
+            changed = False
+            for block, sources in inputs.items():
+                if (block not in held and block not in dynamic and transparent(block) and
+                        all(source in held for source in sources)):
+                    held.add(block)
+                    changed = True
+
+        # Continuous signals: outputs of continuous dynamics, and of gains and
+        # sums of continuous and held signals.  A sum that also takes a sample
+        # sequence samples its continuous inputs instead.
+        region = set(dynamic)
+        changed = True
+        while changed:
+            changed = False
+            for block, sources in inputs.items():
+                if (block not in region and transparent(block) and
+                        any(source in region for source in sources) and
+                        all(source in region or source in held for source in sources)):
+                    region.add(block)
+                    changed = True
+        if not region:
+            return [(s, t, TransferFunctionCalculator.edge_gain(t, p, dt)) for s, t, p in ends]
+        for block in region:
+            if block.block_type == 'delay':
+                raise ValueError(f"Delay block '{block.name}' acts on a continuous signal; "
+                                 f"move it to the sampled side of the hold")
+
+        edges = []
+        graph = SignalFlowGraph()
+        entries = []
+        exits = []
+        for source, target, port_index in ends:
+            if target not in region:
+                if source in region and source not in exits:
+                    exits.append(source)
+                edges.append((source, target, TransferFunctionCalculator.edge_gain(target, port_index, dt)))
+                continue
+            if source not in region:
+                if source not in held:
+                    raise ValueError(f"'{target.name}' is continuous but its input from "
+                                     f"'{source.name}' is not held by a zero-order hold")
+                if source not in entries:
+                    entries.append(source)
+            graph.add_edge(source, target, TransferFunctionCalculator.edge_gain(target, port_index))
+        if not entries or not exits:
+            return edges
+
+        rows = reduce_matrix(graph, entries, exits, parallel=False)
+        for exit_block, row in zip(exits, rows):
+            for entry, gain in zip(entries, row):
+                if gain[0].any():
+                    discrete = control.c2d(control.tf(*gain), dt, 'zoh')
+                    edges.append((entry, exit_block,
+                                  rat(*TransferFunctionCalculator.tf_coefficients(discrete))))
+        return edges
+
+    @staticmethod
+    def check_evaluated(blocks, symbolic=False):
+        """Raise ValueError for a block whose expression could not be evaluated
+
+        With ``symbolic`` the blocks using named parameters are skipped, the
+        parametric reduction never evaluates them.
+        """
+        for block in blocks:
+            if block.evaluation_error and not (symbolic and block.parameters):
+                raise ValueError(f"{block.name}: {block.evaluation_error}")
+
+    @staticmethod
+    def build_signal_flow_graph(blocks, connections, dt=None, open_blocks=(), zpk=False,
+                                parameters=None):
+        """Build the coefficient-only signal flow graph of the diagram
+
+        Each block becomes a node carrying its output signal, so the graph
+        (and everything shipped to worker processes) holds no Qt items.
+        Signals entering any of ``open_blocks`` get unity gain, so their nodes
+        carry those blocks' inputs instead.  With ``zpk`` the edge gains are
+        factored into zeros, poles and gain.  With a list of ``parameters``
+        the graph is a ``ParametricFlowGraph`` and blocks using them keep
+        them symbolic.
+        """
+        TransferFunctionCalculator.check_evaluated(blocks, symbolic=parameters is not None)
+        ids = {block: index for index, block in enumerate(blocks)}
+        graph = SignalFlowGraph() if parameters is None else ParametricFlowGraph()
+        for block in blocks:
+            graph.add_node(ids[block])
+        if dt is not None:
+            # Holds and samplers need the continuous part as a whole
+            for source, target, gain in TransferFunctionCalculator.sampled_data_edges(
+                    blocks, connections, dt):
+                graph.add_edge(ids[source], ids[target], Zpk.from_rat(gain) if zpk else gain)
+            return graph, ids
+        for connection in connections:
+            source, target, port_index = TransferFunctionCalculator.connection_endpoints(connection)
+            if source not in ids or target not in ids or target.block_type == 'input':
+                continue
+            if parameters is not None and target.parameters and target not in open_blocks:
+                graph.add_edge(ids[source], ids[target],
+                               parse_parametric(target.expression, parameters))
+                continue
+            if target in open_blocks:
+                gain = rat([1.0])
+            else:
+                gain = TransferFunctionCalculator.edge_gain(target, port_index, dt)
+            if zpk:
+                gain = Zpk.from_rat(gain)
+            elif parameters is not None:
+                gain = param_gain(*gain)
+            graph.add_edge(ids[source], ids[target], gain)
+        return graph, ids
+
+    @staticmethod
+    def controller_loop_model(blocks, connections, controller):
+        """Loop model seen by a controller block, used to tune it in place
+
+        The controller is cut out of the diagram: its input becomes node e and
+        its output a new source node u, then the four transfers r->e, u->e,
+        r->y and u->y are reduced once.
+        """
+        input_blocks = [b for b in blocks if b.block_type == 'input']
+        output_blocks = [b for b in blocks if b.block_type == 'output']
+        if not input_blocks or not output_blocks:
+            raise ValueError("No input or output blocks found")
+        if TransferFunctionCalculator.diagram_sample_time(blocks) is not None:
+            raise ValueError("PID tuning supports continuous diagrams only")
+
+        graph, ids = TransferFunctionCalculator.build_signal_flow_graph(
+            blocks, connections, open_blocks=[controller])
+        e = ids[controller]
+        u = len(blocks)
+        graph.add_node(u)
+        for dst, gain in list(graph.succ[e].items()):
+            del graph.succ[e][dst]
+            del graph.pred[dst][e]
+            graph.add_edge(u, dst, gain)
+
+        r = ids[input_blocks[0]]
+        y = ids[output_blocks[0]]
+
+        def transfer(src, dst):
+            num, den = reduce_graph(graph.copy(), src, dst, parallel=False)
+            tf = control.minreal(control.tf(num, den), verbose=False)
+            return TransferFunctionCalculator.tf_coefficients(tf)
+
+        h_er, h_eu = transfer(r, e), transfer(u, e)
+        h_yr, h_yu = transfer(r, y), transfer(u, y)
+        forward = control.minreal(control.tf(*rat_mul(h_yu, h_er)), verbose=False)
+        loop = (-h_eu[0], h_eu[1])
+        return LoopModel(TransferFunctionCalculator.tf_coefficients(forward), loop, direct=h_yr,
+                         reference=h_er)
+
+    @staticmethod
+    def loop_analysis(blocks, connections, controller):
+        """L, S, T and the controller effort U/R around a controller block
+
+        All of them come from one product of the controller and the loop
+        model seen by it, see ``SystemAnalysis.loop_functions``.
+        """
+        model = TransferFunctionCalculator.controller_loop_model(blocks, connections, controller)
+        c = pid_coefficients(controller.kp, controller.ki, controller.kd, controller.filter_n)
+        functions = {name: (num[0], den[0]) for name, (num, den) in loop_functions(c, model.loop).items()}
+        # loop_functions sees the controller input as the reference; add r -> e
+        functions['effort'] = rat_mul(functions['effort'], model.reference)
+        return {name: control.minreal(control.tf(*functions[name]), verbose=False)
+                for name in ('loop', 'sensitivity', 'complementary', 'effort')}
+
+    @staticmethod
+    def _reaches(graph, source, sink, removed):
+        """Whether sink is reachable from source without passing through ``removed``"""
+        seen = {source}
+        stack = [source]
+        while stack:
+            node = stack.pop()
+            if node == sink:
+                return True
+            for dst in graph.succ[node]:
+                if dst != removed and dst not in seen:
+                    seen.add(dst)
+                    stack.append(dst)
+        return False
+
+    @staticmethod
+    def simulation_model(blocks, connections):
+        """Transfer function and exact dead time to use for time simulation
+
+        Delay blocks outside every loop that all input-output paths go through
+        are factored out as a pure dead time, which the simulator applies
+        exactly with a ring buffer.  Otherwise the Pade model is returned with
+        zero dead time.
+        """
+        tf, status = TransferFunctionCalculator.calculate_overall_tf(blocks, connections)
+        delays = [b for b in blocks if b.block_type == 'delay']
+        if tf is None or not delays or TransferFunctionCalculator.diagram_sample_time(blocks) is not None:
+            return tf, 0.0, status
+
+        graph, ids = TransferFunctionCalculator.build_signal_flow_graph(
+            blocks, connections, open_blocks=delays)
+        source = ids[[b for b in blocks if b.block_type == 'input'][0]]
+        sink = ids[[b for b in blocks if b.block_type == 'output'][0]]
+        loops = {n for c in strong_components(graph) if len(c) > 1 for n in c}
+        for delay in delays:
+            node = ids[delay]
+            in_loop = node in loops or node in graph.succ[node]
+            if in_loop or TransferFunctionCalculator._reaches(graph, source, sink, node):
+                return tf, 0.0, status
+
+        num, den = reduce_graph(graph, source, sink)
+        rational = control.minreal(control.tf(num, den), verbose=False)
+        return rational, sum(d.delay_time for d in delays), status
+
+    @staticmethod
+    def calculate_overall_tf(blocks, connections, cache=None, zpk=False):
+        """Calculate the overall transfer function of the system
+
+        ``zpk`` reduces with factored gains, which keeps long cascades linear
+        in their order; it runs in-process since worker payloads are
+        coefficient arrays.
+        """
         try:
             # Find input and output blocks
             input_blocks = [b for b in blocks if b.block_type == 'input']
             output_blocks = [b for b in blocks if b.block_type == 'output']
-            
+
             if not input_blocks or not output_blocks:
                 return None, "No input or output blocks found"
-                
-            # For now, return a simple calculation
-            # In a full implementation, this would trace through the entire diagram
-            s = control.TransferFunction.s
-            
-            # Example: if we have a gain block connected to an integrator
-            gain_blocks = [b for b in blocks if b.block_type == 'gain']
-            integrator_blocks = [b for b in blocks if b.block_type == 'integrator']
-            
-            if gain_blocks and integrator_blocks:
-                gain_tf = gain_blocks[0].get_effective_transfer_function()
-                integrator_tf = integrator_blocks[0].get_effective_transfer_function()
-                overall_tf = control.series(gain_tf, integrator_tf)
-                return overall_tf, "Success"
-            else:
-                return 1, "Simple system"
-                
+
+            dt = TransferFunctionCalculator.diagram_sample_time(blocks)
+            graph, ids = TransferFunctionCalculator.build_signal_flow_graph(blocks, connections, dt,
+                                                                           zpk=zpk)
+            num, den = reduce_graph(graph, ids[input_blocks[0]], ids[output_blocks[0]],
+                                    parallel=not zpk, cache=cache)
+            overall_tf = control.tf(num, den) if dt is None else control.tf(num, den, dt)
+            overall_tf = control.minreal(overall_tf, verbose=False)
+            return overall_tf, "Success"
+
         except Exception as e:
             return None, f"Error calculating transfer function: {str(e)}"
 
+    @staticmethod
+    def parametric_transfer(blocks, connections):
+        """Input-output transfer function in the diagram's named parameters
+
+        The diagram is reduced once with symbolic parameters; the returned
+        ``ParametricTransfer`` evaluates it for whole arrays of values.
+        """
+        input_blocks = [b for b in blocks if b.block_type == 'input']
+        output_blocks = [b for b in blocks if b.block_type == 'output']
+        if not input_blocks or not output_blocks:
+            raise ValueError("No input or output blocks found")
+        if TransferFunctionCalculator.diagram_sample_time(blocks) is not None:
+            raise ValueError("Parameter sweeps support continuous diagrams only")
+        parameters = sorted({name for b in blocks for name in b.parameters})
+        if not parameters:
+            raise ValueError("No block uses a named parameter")
+        graph, ids = TransferFunctionCalculator.build_signal_flow_graph(
+            blocks, connections, parameters=parameters)
+        return reduce_parametric(graph, ids[input_blocks[0]], ids[output_blocks[0]], parameters)
+
+    @staticmethod
+    def block_frequency_response(block, x):
+        """Response of one continuous block at the evaluation points s = jw"""
+        if block.block_type == 'delay':
+            # Exact dead time; no Pade approximant is needed in frequency
+            return np.exp(-x * block.delay_time)
+        return rational_response(*TransferFunctionCalculator.edge_gain(block, 0), x)
+
+    @staticmethod
+    def frequency_response(blocks, connections, solver):
+        """Responses from the first input block to every output block on the solver's grid
+
+        Block responses come from the solver's cache, so only blocks whose
+        structure hash changed are evaluated again; the diagram is then
+        solved frequency by frequency without forming its transfer function.
+        A discrete diagram is sampled edge by edge from its z-domain graph,
+        whose held continuous parts are discretized as a whole.
+        Returns (output blocks, responses with one row per output).
+        """
+        input_blocks = [b for b in blocks if b.block_type == 'input']
+        output_blocks = sorted((b for b in blocks if b.block_type == 'output'), key=lambda b: b.name)
+        if not input_blocks or not output_blocks:
+            raise ValueError("No input or output blocks found")
+        dt = TransferFunctionCalculator.diagram_sample_time(blocks)
+        if dt != solver.dt:
+            raise ValueError("The frequency grid was built for another sample time")
+
+        if dt is not None:
+            graph, ids = TransferFunctionCalculator.build_signal_flow_graph(blocks, connections, dt)
+            edges = [(src, dst, rational_response(*gain, solver.x)) for src, dst, gain in graph.edges()]
+            return output_blocks, solver.solve(len(blocks), edges, ids[input_blocks[0]],
+                                               [ids[b] for b in output_blocks])
+
+        TransferFunctionCalculator.check_evaluated(blocks)
+        ids = {block: index for index, block in enumerate(blocks)}
+        solver.retain(block.uid for block in blocks)
+        edges = []
+        for connection in connections:
+            source, target, port_index = TransferFunctionCalculator.connection_endpoints(connection)
+            if source not in ids or target not in ids or target.block_type == 'input':
+                continue
+            response = solver.response(
+                target.uid, target.structure_hash(),
+                lambda x, block=target: TransferFunctionCalculator.block_frequency_response(block, x))
+            if target.block_type == 'subtract' and port_index == 1:
+                response = -response
+            edges.append((ids[source], ids[target], response))
+        responses = solver.solve(len(blocks), edges, ids[input_blocks[0]],
+                                 [ids[b] for b in output_blocks])
+        return output_blocks, responses
+
+    @staticmethod
+    def calculate_transfer_matrix(blocks, connections):
+        """Transfer matrix from every input block to every output block
+
+        Returns ((inputs, outputs, rows), status) where rows[i][j] is the
+        transfer function from inputs[j] to outputs[i], or (None, message).
+        """
+        try:
+            input_blocks = sorted((b for b in blocks if b.block_type == 'input'),
+                                  key=lambda b: b.name)
+            output_blocks = sorted((b for b in blocks if b.block_type == 'output'),
+                                   key=lambda b: b.name)
+            if not input_blocks or not output_blocks:
+                return None, "No input or output blocks found"
+
+            dt = TransferFunctionCalculator.diagram_sample_time(blocks)
+            graph, ids = TransferFunctionCalculator.build_signal_flow_graph(blocks, connections, dt)
+            gains = reduce_matrix(graph, [ids[b] for b in input_blocks],
+                                  [ids[b] for b in output_blocks])
+            rows = []
+            for row in gains:
+                tfs = [control.tf(num, den) if dt is None else control.tf(num, den, dt)
+                       for num, den in row]
+                rows.append([control.minreal(tf, verbose=False) for tf in tfs])
+            return (input_blocks, output_blocks, rows), "Success"
+
+        except Exception as e:
+            return None, f"Error calculating transfer matrix: {str(e)}"
+
 class BlockLibrary(QWidget):
     """Enhanced block library with more block types"""
     block_selected = pyqtSignal(str)
@@ -406,6 +1093,13 @@ class BlockLibrary(QWidget):
             ("Dynamic Blocks", [
                 ("Integrator", "integrator", "1/s block"),
                 ("Transfer Function", "transfer_function", "Custom TF block"),
+                ("PID Controller", "pid", "PID with filtered derivative"),
+                ("Transport Delay", "delay", "Dead time e^(-sT)"),
+            ]),
+            ("Discrete Blocks", [
+                ("Unit Delay", "unit_delay", "1/z block"),
+                ("Discrete TF", "discrete_tf", "Custom TF block in z"),
+                ("Zero-Order Hold", "zoh", "Samples the continuous signal"),
             ]),
             ("System Blocks", [
                 ("Input", "input", "System input"),
@@ -463,7 +1157,7 @@ class BlockPropertiesDialog(QDialog):
             # Create a more comprehensive transfer function input
             tf_layout = QVBoxLayout()
             
-            self.tf_edit = QLineEdit("1 / (s + 1)")
+            self.tf_edit = QLineEdit(self.block_item.expression or "1 / (s + 1)")
             self.tf_edit.setPlaceholderText("Enter transfer function (e.g., 1/(s+1), s/(s^2+2*s+1))")
             tf_layout.addWidget(self.tf_edit)
             
@@ -473,12 +1167,37 @@ class BlockPropertiesDialog(QDialog):
             examples_label.setStyleSheet("color: #666;")
             tf_layout.addWidget(examples_label)
             
-            examples_text = QLabel("• 1/(s+1)\n• s/(s^2+2*s+1)\n• 10/(s^2+3*s+2)\n• (s+1)/(s+2)")
+            examples_text = QLabel("• 1/(s+1)\n• s/(s^2+2*s+1)\n• 10/(s^2+3*s+2)\n• (s+1)/(s+2)\n"
+                                   "• K/(tau*s+1)   (named parameters)")
             examples_text.setFont(QFont("Consolas", 8))
             examples_text.setStyleSheet("color: #888; background: #f5f5f5; padding: 5px; border-radius: 3px;")
             tf_layout.addWidget(examples_text)
             
             layout.addRow("Transfer Function:", tf_layout)
+        elif self.block_item.block_type == 'pid':
+            self.kp_edit = QLineEdit(str(self.block_item.kp))
+            self.ki_edit = QLineEdit(str(self.block_item.ki))
+            self.kd_edit = QLineEdit(str(self.block_item.kd))
+            self.filter_edit = QLineEdit(str(self.block_item.filter_n))
+            layout.addRow("Kp:", self.kp_edit)
+            layout.addRow("Ki:", self.ki_edit)
+            layout.addRow("Kd:", self.kd_edit)
+            layout.addRow("Derivative filter N:", self.filter_edit)
+        elif self.block_item.block_type == 'delay':
+            self.delay_edit = QLineEdit(str(self.block_item.delay_time))
+            layout.addRow("Delay T (s):", self.delay_edit)
+            self.pade_combo = QComboBox()
+            self.pade_combo.addItems([str(order) for order in range(1, 11)])
+            self.pade_combo.setCurrentText(str(self.block_item.pade_order))
+            layout.addRow("Pade order:", self.pade_combo)
+        elif self.block_item.block_type == 'discrete_tf':
+            self.tf_edit = QLineEdit("1 / (z - 0.5)")
+            self.tf_edit.setPlaceholderText("Enter transfer function in z (e.g., 0.5/(z-0.5))")
+            layout.addRow("Transfer Function:", self.tf_edit)
+
+        if self.block_item.block_type in DISCRETE_BLOCK_TYPES:
+            self.sample_time_edit = QLineEdit(str(self.block_item.sample_time))
+            layout.addRow("Sample Time (s):", self.sample_time_edit)
             
         # Buttons
         buttons = QDialogButtonBox(QDialogButtonBox.Ok | QDialogButtonBox.Cancel)
@@ -488,6 +1207,24 @@ class BlockPropertiesDialog(QDialog):
         
         self.setLayout(layout)
         
+    def accept(self):
+        """Refuse to close while the transfer function expression does not parse"""
+        if self.block_item.block_type in ['transfer_function', 'discrete_tf']:
+            text = self.tf_edit.text()
+            variable = 'z' if self.block_item.block_type == 'discrete_tf' else 's'
+            try:
+                if variable == 's':
+                    parse_parametric(text, free_parameters(text), variable)
+                else:
+                    parse_coefficients(text, variable)
+            except ExpressionError as e:
+                self.tf_edit.setFocus()
+                self.tf_edit.setCursorPosition(e.position)
+                QMessageBox.warning(self, "Invalid Transfer Function",
+                                    f"{e}\n\n{e.pointer(text)}")
+                return
+        super().accept()
+
     def get_properties(self):
         """Get the edited properties"""
         properties = {'name': self.name_edit.text()}
@@ -497,13 +1234,264 @@ class BlockPropertiesDialog(QDialog):
                 properties['gain'] = float(self.gain_edit.text())
             except ValueError:
                 properties['gain'] = 1.0
-        elif self.block_item.block_type == 'transfer_function':
+        elif self.block_item.block_type in ['transfer_function', 'discrete_tf']:
             properties['transfer_function'] = self.tf_edit.text()
+        elif self.block_item.block_type == 'delay':
+            try:
+                properties['delay_time'] = max(float(self.delay_edit.text()), 0.0)
+            except ValueError:
+                properties['delay_time'] = self.block_item.delay_time
+            properties['pade_order'] = int(self.pade_combo.currentText())
+        elif self.block_item.block_type == 'pid':
+            edits = [('kp', self.kp_edit), ('ki', self.ki_edit), ('kd', self.kd_edit),
+                     ('filter_n', self.filter_edit)]
+            for key, edit in edits:
+                try:
+                    properties[key] = float(edit.text())
+                except ValueError:
+                    properties[key] = getattr(self.block_item, key)
+
+        if self.block_item.block_type in DISCRETE_BLOCK_TYPES:
+            try:
+                sample_time = float(self.sample_time_edit.text())
+                if sample_time > 0:
+                    properties['sample_time'] = sample_time
+            except ValueError:
+                pass
             
         return properties
 
+# Positions of the parameter sweep slider
+SWEEP_SLIDER_STEPS = 200
+
+
+class ParameterSweepDialog(QDialog):
+    """Sweeps and a live slider over the named parameters of a diagram
+
+    The diagram was reduced once into ``system``; a sweep or a slider move
+    only evaluates its compiled closed form.
+    """
+    def __init__(self, system, view, parent=None):
+        super().__init__(parent)
+        self.system = system
+        self.view = view
+        self.setup_ui()
+
+    def setup_ui(self):
+        self.setWindowTitle("Parameter Sweep")
+        self.resize(560, 600)
+        layout = QVBoxLayout()
+
+        values_group = QGroupBox("Parameter Values")
+        values_layout = QFormLayout()
+        self.value_edits = {}
+        for name in self.system.parameters:
+            value = self.view.parameter_values.get(name, DEFAULT_PARAMETER_VALUE)
+            self.value_edits[name] = QLineEdit(str(value))
+            values_layout.addRow(f"{name}:", self.value_edits[name])
+        apply_button = QPushButton("Apply to Diagram")
+        apply_button.clicked.connect(self.apply_values)
+        values_layout.addRow(apply_button)
+        values_group.setLayout(values_layout)
+        layout.addWidget(values_group)
+
+        sweep_group = QGroupBox("Sweep")
+        sweep_layout = QFormLayout()
+        self.parameter_combo = QComboBox()
+        self.parameter_combo.addItems(self.system.parameters)
+        sweep_layout.addRow("Parameter:", self.parameter_combo)
+        self.start_edit = QLineEdit("0.1")
+        self.stop_edit = QLineEdit("10")
+        self.steps_edit = QLineEdit("50")
+        sweep_layout.addRow("From:", self.start_edit)
+        sweep_layout.addRow("To:", self.stop_edit)
+        sweep_layout.addRow("Steps:", self.steps_edit)
+        run_button = QPushButton("Run Sweep")
+        run_button.clicked.connect(self.run_sweep)
+        sweep_layout.addRow(run_button)
+        self.slider = QSlider(Qt.Horizontal)
+        self.slider.setRange(0, SWEEP_SLIDER_STEPS)
+        self.slider.valueChanged.connect(self.slider_moved)
+        sweep_layout.addRow("Slider:", self.slider)
+        sweep_group.setLayout(sweep_layout)
+        layout.addWidget(sweep_group)
+
+        self.output = QTextEdit()
+        self.output.setReadOnly(True)
+        self.output.setFont(QFont("Consolas", 10))
+        layout.addWidget(self.output)
+        self.setLayout(layout)
+
+    def parameter_values(self):
+        """Typed value of every parameter"""
+        values = {}
+        for name, edit in self.value_edits.items():
+            try:
+                values[name] = float(edit.text())
+            except ValueError:
+                raise ValueError(f"Bad value for {name}: '{edit.text()}'")
+        return values
+
+    def sweep_range(self):
+        try:
+            start, stop = float(self.start_edit.text()), float(self.stop_edit.text())
+            steps = int(self.steps_edit.text())
+        except ValueError:
+            raise ValueError("The sweep range must be numbers")
+        if steps < 2:
+            raise ValueError("A sweep needs at least 2 steps")
+        return start, stop, steps
+
+    def analyse(self, values):
+        """Evaluated (nums, dens), stability and step metrics for a batch of values"""
+        nums, dens = self.system.evaluate(values)
+        stable, rhp = routh_hurwitz(dens)
+        metrics = {key: np.full(len(dens), np.nan) for key, _, _ in METRIC_LABELS}
+        if stable.any():
+            # Unstable rows have no step figures anyway
+            found = step_metrics(nums[stable], dens[stable])
+            for key in metrics:
+                metrics[key][stable] = found[key]
+        return nums, dens, stable, rhp, metrics
+
+    def run_sweep(self):
+        """Stability and step figures over the sweep range, in one evaluation"""
+        name = self.parameter_combo.currentText()
+        try:
+            values = self.parameter_values()
+            start, stop, steps = self.sweep_range()
+            values[name] = np.linspace(start, stop, steps)
+            _, _, stable, rhp, metrics = self.analyse(values)
+        except Exception as e:
+            self.output.setPlainText(f"Sweep failed: {str(e)}")
+            return
+        columns = [('overshoot', "Overshoot %"), ('settling_time', "Settling s"),
+                   ('steady_state_error', "SS error")]
+        lines = [f"{name:>10}  {'Stable':>10}" + "".join(f"  {label:>11}" for _, label in columns)]
+        for i, value in enumerate(values[name]):
+            status = "yes" if stable[i] else f"no ({rhp[i]} RHP)"
+            figures = ["n/a" if np.isnan(metrics[key][i]) else f"{metrics[key][i]:.4g}"
+                       for key, _ in columns]
+            lines.append(f"{value:>10.4g}  {status:>10}" + "".join(f"  {f:>11}" for f in figures))
+        self.output.setPlainText("\n".join(lines))
+
+    def slider_moved(self, position):
+        """Show the system at the slider's point of the sweep range"""
+        name = self.parameter_combo.currentText()
+        try:
+            start, stop, _ = self.sweep_range()
+            values = self.parameter_values()
+            values[name] = start + (stop - start) * position / SWEEP_SLIDER_STEPS
+            nums, dens, stable, rhp, metrics = self.analyse(values)
+        except Exception as e:
+            self.output.setPlainText(f"Evaluation failed: {str(e)}")
+            return
+        self.value_edits[name].setText(f"{values[name]:.6g}")
+        lines = [f"{name} = {values[name]:.6g}", str(control.tf(*rat(nums[0], dens[0])))]
+        if stable[0]:
+            lines.append("Stability (Routh-Hurwitz): stable")
+        else:
+            lines.append(f"Stability (Routh-Hurwitz): not stable, {rhp[0]} pole(s) "
+                         f"in the right half-plane")
+        lines += format_metrics(metrics)
+        self.output.setPlainText("\n".join(lines))
+
+    def apply_values(self):
+        """Use the typed values as the diagram's parameter values"""
+        try:
+            self.view.set_parameter_values(self.parameter_values())
+        except ValueError as e:
+            QMessageBox.warning(self, "Parameter Sweep", str(e))
+
+class BodePlotWindow(QWidget):
+    """Bode plot of the diagram, solved on the block graph frequency by frequency
+
+    The solver and its per-block response cache live as long as the window,
+    so a refresh after an edit only re-evaluates the blocks that changed.
+    """
+    def __init__(self, view):
+        super().__init__()
+        self.view = view
+        self.solver = None
+        self.setup_ui()
+        self.refresh()
+
+    def setup_ui(self):
+        self.setWindowTitle("Frequency Response")
+        self.resize(800, 600)
+        layout = QVBoxLayout()
+
+        controls = QHBoxLayout()
+        controls.addWidget(QLabel("From (rad/s):"))
+        self.start_edit = QLineEdit("0.01")
+        controls.addWidget(self.start_edit)
+        controls.addWidget(QLabel("To (rad/s):"))
+        self.stop_edit = QLineEdit("100")
+        controls.addWidget(self.stop_edit)
+        refresh_button = QPushButton("Refresh")
+        refresh_button.clicked.connect(self.refresh)
+        controls.addWidget(refresh_button)
+        controls.addStretch()
+        layout.addLayout(controls)
+
+        self.figure = Figure(figsize=(8, 6))
+        self.canvas = FigureCanvas(self.figure)
+        self.magnitude_axes = self.figure.add_subplot(211)
+        self.phase_axes = self.figure.add_subplot(212, sharex=self.magnitude_axes)
+        layout.addWidget(self.canvas)
+
+        self.status_label = QLabel()
+        layout.addWidget(self.status_label)
+        self.setLayout(layout)
+
+    def grid_solver(self, dt):
+        """The cached solver, or a new one when the grid or the sample time changed"""
+        try:
+            start, stop = float(self.start_edit.text()), float(self.stop_edit.text())
+        except ValueError:
+            raise ValueError("The frequency range must be numbers")
+        if not 0 < start < stop:
+            raise ValueError("The frequency range must satisfy 0 < from < to")
+        if dt is not None:
+            stop = min(stop, np.pi / dt)
+        w = np.logspace(np.log10(start), np.log10(stop), FREQUENCY_POINTS)
+        if self.solver is None or self.solver.dt != dt or not np.array_equal(self.solver.w, w):
+            self.solver = FrequencyResponseSolver(w, dt)
+        return self.solver
+
+    def refresh(self):
+        """Re-solve the diagram as it is now and redraw the plot"""
+        blocks = self.view.get_all_blocks()
+        try:
+            solver = self.grid_solver(TransferFunctionCalculator.diagram_sample_time(blocks))
+            evaluations = solver.evaluations
+            outputs, responses = TransferFunctionCalculator.frequency_response(
+                blocks, self.view.get_all_connections(), solver)
+        except Exception as e:
+            self.status_label.setText(f"Cannot compute the frequency response: {str(e)}")
+            return
+
+        magnitude, phase = bode_data(responses)
+        self.magnitude_axes.clear()
+        self.phase_axes.clear()
+        for output, mag, ph in zip(outputs, magnitude, phase):
+            self.magnitude_axes.semilogx(solver.w, mag, label=output.name)
+            self.phase_axes.semilogx(solver.w, ph, label=output.name)
+        self.magnitude_axes.set_ylabel("Magnitude (dB)")
+        self.phase_axes.set_ylabel("Phase (deg)")
+        self.phase_axes.set_xlabel("Frequency (rad/s)")
+        for axes in (self.magnitude_axes, self.phase_axes):
+            axes.grid(True, which='both', alpha=0.3)
+        if len(outputs) > 1:
+            self.magnitude_axes.legend()
+        self.canvas.draw_idle()
+        self.status_label.setText(f"{len(blocks)} blocks, {solver.evaluations - evaluations} "
+                                  f"block response(s) evaluated, {len(solver.w)} frequencies")
+
 class BlockDiagramView(QGraphicsView):
     """Enhanced graphics view with transfer function calculation"""
+    validation_changed = pyqtSignal()
+
     def __init__(self):
         super().__init__()
         self.scene = QGraphicsScene()
@@ -512,6 +1500,15 @@ class BlockDiagramView(QGraphicsView):
         
         # Set up the scene
         self.scene.setSceneRect(-1000, -1000, 2000, 2000)
+
+        # Wires are routed around blocks and re-routed incrementally on moves
+        self.router = ConnectorRouter()
+        # Structural hash of the diagram, updated by the items themselves
+        self.fingerprint = DiagramFingerprint()
+        # Per-block structural issues, also updated by the items
+        self.validator = DiagramValidator(self.validation_changed.emit)
+        # Values of the named parameters used by transfer function blocks
+        self.parameter_values = {}
         
         # Connection state
         self.connecting = False
@@ -570,14 +1567,24 @@ class BlockDiagramView(QGraphicsView):
         """Edit block properties"""
         dialog = BlockPropertiesDialog(block)
         if dialog.exec_() == QDialog.Accepted:
-            props = dialog.get_properties()
-            block.name = props['name']
-            if 'gain' in props:
-                block.gain_value = props['gain']
-                block.update_transfer_function()
-            elif 'transfer_function' in props:
-                block.transfer_function = props['transfer_function']
-                block.update_transfer_function()
+            self.apply_block_properties(block, dialog.get_properties())
+
+    def apply_block_properties(self, block, props):
+        """Apply the properties returned by BlockPropertiesDialog to a block"""
+        block.name = props['name']
+        if 'sample_time' in props:
+            block.sample_time = props['sample_time']
+        for key in ['kp', 'ki', 'kd', 'filter_n', 'delay_time', 'pade_order']:
+            if key in props:
+                setattr(block, key, props[key])
+        if 'gain' in props:
+            block.gain_value = props['gain']
+        elif 'transfer_function' in props:
+            block.transfer_function = props['transfer_function']
+        # New blocks and edited ones alike: the dialog hands back raw text
+        # and parameters, which only become a transfer function here
+        block.update_transfer_function()
+        block.update()
                 
     def delete_block(self, block):
         """Delete a specific block"""
@@ -614,7 +1621,7 @@ class BlockDiagramView(QGraphicsView):
         self.start_port = port
         
         # Create temporary line for visual feedback
-        start_pos = port.scenePos()
+        start_pos = port.center()
         self.temp_line = TempConnectionLine(start_pos)
         self.scene.addItem(self.temp_line)
         
@@ -649,11 +1656,10 @@ class BlockDiagramView(QGraphicsView):
         
     def check_existing_connection(self, start_port, end_port):
         """Check if a connection already exists between two ports"""
-        for item in self.scene.items():
-            if isinstance(item, ConnectionItem):
-                if ((item.start_port == start_port and item.end_port == end_port) or
-                    (item.start_port == end_port and item.end_port == start_port)):
-                    return True
+        for item in start_port.connections:
+            if ((item.start_port == start_port and item.end_port == end_port) or
+                (item.start_port == end_port and item.end_port == start_port)):
+                return True
         return False
         
     def cancel_connection(self):
@@ -683,23 +1689,17 @@ class BlockDiagramView(QGraphicsView):
                 self.remove_block_connections(item)
                 # Remove the block from scene
                 self.scene.removeItem(item)
-            elif isinstance(item, ConnectionItem):
-                # Remove the connection
+            elif isinstance(item, ConnectionItem) and item.scene() is self.scene:
+                # Remove the connection, unless a deleted block already took it
                 self.scene.removeItem(item)
                 
     def remove_block_connections(self, block):
         """Remove all connections related to a block"""
-        # Get all connections in the scene
-        all_connections = []
-        for item in self.scene.items():
-            if isinstance(item, ConnectionItem):
-                all_connections.append(item)
-                
-        # Remove connections that involve this block
-        for connection in all_connections:
-            if (connection.start_port.parent_block == block or 
-                connection.end_port.parent_block == block):
-                self.scene.removeItem(connection)
+        # Ports know their wires, so this only touches the block's own connections
+        for port in block.input_ports + block.output_ports:
+            for connection in list(port.connections):
+                if connection.scene() is self.scene:
+                    self.scene.removeItem(connection)
         
     def add_block(self, block_type, position=None):
         """Add a new block to the diagram"""
@@ -712,17 +1712,11 @@ class BlockDiagramView(QGraphicsView):
             self.scene.addItem(block)
             
             # Show properties dialog for certain block types
-            if block_type in ['gain', 'transfer_function']:
+            if block_type in ['gain', 'transfer_function', 'pid', 'delay'] + DISCRETE_BLOCK_TYPES:
                 try:
                     dialog = BlockPropertiesDialog(block)
                     if dialog.exec_() == QDialog.Accepted:
-                        props = dialog.get_properties()
-                        block.name = props['name']
-                        if 'gain' in props:
-                            block.gain_value = props['gain']
-                            block.update_transfer_function()
-                        elif 'transfer_function' in props:
-                            block.transfer_function = props['transfer_function']
+                        self.apply_block_properties(block, dialog.get_properties())
                 except Exception as e:
                     print(f"Error in properties dialog: {e}")
                     # Continue with default values
@@ -749,6 +1743,105 @@ class BlockDiagramView(QGraphicsView):
                 connections.append(item)
         return connections
 
+    def apply_layout(self, positions):
+        """Move blocks to new positions in one batched scene update"""
+        self.setUpdatesEnabled(False)
+        # Rebuilding the BSP index once is far cheaper than once per move
+        self.scene.setItemIndexMethod(QGraphicsScene.NoIndex)
+        # Incremental re-routing is pointless when everything moves
+        router, self.router = self.router, None
+        try:
+            for block, (x, y) in positions.items():
+                block.setPos(x, y)
+        finally:
+            self.router = router
+            self.reroute_all()
+            self.scene.setItemIndexMethod(QGraphicsScene.BspTreeIndex)
+            self.setUpdatesEnabled(True)
+        rect = self.scene.itemsBoundingRect().adjusted(-200, -200, 200, 200)
+        self.scene.setSceneRect(self.scene.sceneRect().united(rect))
+        self.viewport().update()
+
+    def import_netlist(self, path):
+        """Build the blocks and connections of a netlist file in bulk
+
+        Returns (blocks, errors); malformed lines are skipped and reported
+        as NetlistError with their line number.  Blocks are placed on a
+        plain grid, meant to be followed by an automatic layout.
+        """
+        errors = []
+        blocks = {}
+        wired = set()
+        self.setUpdatesEnabled(False)
+        self.scene.setItemIndexMethod(QGraphicsScene.NoIndex)
+        router, self.router = self.router, None
+        try:
+            with open(path) as f:
+                for record in parse_netlist(f, BLOCK_TYPES, errors):
+                    if record[0] == 'block':
+                        _, line_number, name, block_type, params = record
+                        if name in blocks:
+                            errors.append(NetlistError(line_number, f"duplicate block '{name}'"))
+                            continue
+                        block = BlockItem(block_type, name)
+                        for attribute, value in params.items():
+                            setattr(block, attribute, value)
+                        if params:
+                            block.update_transfer_function()
+                        index = len(blocks)
+                        block.setPos((index % 50) * 160, (index // 50) * 120)
+                        self.scene.addItem(block)
+                        blocks[name] = block
+                    else:
+                        _, line_number, source, target, port = record
+                        missing = [n for n in (source, target) if n not in blocks]
+                        if missing:
+                            errors.append(NetlistError(line_number, f"unknown block '{missing[0]}'"))
+                            continue
+                        inputs = blocks[target].input_ports
+                        if not 0 <= port < len(inputs):
+                            errors.append(NetlistError(line_number,
+                                                       f"'{target}' has no input {port}"))
+                            continue
+                        if (source, target, port) in wired:
+                            errors.append(NetlistError(line_number, "duplicate connection"))
+                            continue
+                        wired.add((source, target, port))
+                        self.scene.addItem(ConnectionItem(blocks[source].output_ports[0],
+                                                          inputs[port]))
+        finally:
+            self.router = router
+            self.scene.setItemIndexMethod(QGraphicsScene.BspTreeIndex)
+            self.setUpdatesEnabled(True)
+        return list(blocks.values()), errors
+
+    def set_parameter_values(self, values):
+        """Change named parameter values and re-evaluate the blocks using them
+
+        Raises ValueError, changing nothing, when a block's expression cannot
+        be evaluated at the new values.
+        """
+        merged = dict(self.parameter_values, **values)
+        affected = [b for b in self.get_all_blocks() if set(b.parameters) & set(values)]
+        for block in affected:
+            try:
+                block.expression_transfer_function(merged)
+            except (ExpressionError, ValueError) as e:
+                raise ValueError(f"{block.name}: cannot evaluate '{block.expression}' "
+                                 f"at these values: {e}")
+        self.parameter_values = merged
+        for block in affected:
+            block.update_transfer_function()
+            block.update()
+
+    def reroute_all(self):
+        """Rebuild the routing indexes and route every wire from scratch"""
+        self.router.clear()
+        for block in self.get_all_blocks():
+            self.router.set_obstacle(block, rect_tuple(block.sceneBoundingRect()))
+        for connection in self.get_all_connections():
+            connection.update_route()
+
 class ResultsPanel(QWidget):
     """Panel to display calculation results"""
     def __init__(self):
@@ -783,12 +1876,93 @@ class ResultsPanel(QWidget):
         else:
             self.results_text.append("Could not calculate transfer function")
 
+        if isinstance(transfer_function, control.TransferFunction) and transfer_function.isctime():
+            stable, rhp = routh_hurwitz(transfer_function.den[0][0])
+            if stable[0]:
+                self.results_text.append("\nStability (Routh-Hurwitz): stable")
+            else:
+                self.results_text.append(f"\nStability (Routh-Hurwitz): not stable, "
+                                         f"{rhp[0]} pole(s) in the right half-plane")
+
+        if isinstance(transfer_function, control.TransferFunction):
+            self.show_step_metrics(transfer_function)
+            self.show_margins(transfer_function, "Stability Margins (as a loop gain)")
+
+    def update_matrix_results(self, matrix, status):
+        """Display the transfer matrix of a diagram with several inputs or outputs"""
+        self.results_text.clear()
+        self.results_text.append(f"Status: {status}\n")
+        self.results_text.append("=" * 50)
+        if matrix is None:
+            self.results_text.append("\nCould not calculate transfer matrix")
+            return
+        inputs, outputs, rows = matrix
+        self.results_text.append(f"\nTransfer Matrix ({len(outputs)} outputs x {len(inputs)} inputs):")
+        for output_block, row in zip(outputs, rows):
+            for input_block, tf in zip(inputs, row):
+                self.results_text.append(f"\n{output_block.name} / {input_block.name}:")
+                self.results_text.append(str(tf))
+
+    def update_loop_results(self, controller, functions):
+        """Display the loop functions around a controller block"""
+        labels = [('loop', "Loop gain L(s)"), ('sensitivity', "Sensitivity S(s) = 1/(1 + L)"),
+                  ('complementary', "Complementary sensitivity T(s) = L/(1 + L)"),
+                  ('effort', "Controller effort U(s)/R(s)")]
+        self.results_text.clear()
+        self.results_text.append(f"Loop Analysis around {controller.name}\n")
+        self.results_text.append("=" * 50)
+        for key, label in labels:
+            self.results_text.append(f"\n{label}:")
+            self.results_text.append(str(functions[key]))
+        self.show_margins(functions['loop'], "Stability Margins of L(s)")
+
+    def show_step_metrics(self, transfer_function):
+        """Append the unit step response figures of merit"""
+        try:
+            if transfer_function.isctime():
+                metrics = step_metrics(*tf_batch([transfer_function]))
+            else:
+                metrics = discrete_step_metrics(transfer_function)
+        except Exception as e:
+            self.results_text.append(f"\nStep response metrics unavailable: {str(e)}")
+            return
+        self.results_text.append("\nStep Response:")
+        for line in format_metrics(metrics):
+            self.results_text.append(f"  {line}")
+
+    def show_margins(self, transfer_function, heading):
+        """Append the gain, phase and delay margins of a system taken as a loop gain"""
+        try:
+            dt = None if transfer_function.isctime() else float(transfer_function.dt)
+            margins = stability_margins(*tf_batch([transfer_function]), dt=dt)
+        except Exception as e:
+            self.results_text.append(f"\nStability margins unavailable: {str(e)}")
+            return
+        self.results_text.append(f"\n{heading}:")
+        for line in format_margins(margins):
+            self.results_text.append(f"  {line}")
+
 class BlockDiagramEditor(QMainWindow):
     """Enhanced main window for the block diagram editor"""
     def __init__(self):
         super().__init__()
         self.setWindowTitle("Advanced Block Diagram Editor - Control Systems")
         self.setGeometry(100, 100, 1400, 900)
+        self.last_transfer_function = None
+        # (fingerprint, transfer function, status) of the last calculation
+        self.last_calculation = None
+        # Reduce with zero-pole-gain edges instead of coefficients
+        self.zpk_reduction = False
+        self.stream_window = None
+        self.sweep_dialog = None
+        self.bode_window = None
+        try:
+            # Reductions done in earlier sessions are reused from disk
+            self.reduction_cache = ReductionCache()
+        except Exception as e:
+            print(f"Reduction cache disabled: {e}")
+            self.reduction_cache = None
+        self.layout_worker = None
         
         self.setup_ui()
         
@@ -844,6 +2018,12 @@ class BlockDiagramEditor(QMainWindow):
         
         # Toolbar
         self.create_toolbar()
+
+        # Live validation summary
+        self.validation_label = QLabel()
+        self.statusBar().addPermanentWidget(self.validation_label)
+        self.diagram_view.validation_changed.connect(self.update_validation_status)
+        self.update_validation_status()
         
     def create_menu_bar(self):
         """Create the menu bar"""
@@ -855,6 +2035,10 @@ class BlockDiagramEditor(QMainWindow):
         new_action = QAction('New', self)
         new_action.triggered.connect(self.new_diagram)
         file_menu.addAction(new_action)
+
+        import_action = QAction('Import Netlist...', self)
+        import_action.triggered.connect(self.import_netlist)
+        file_menu.addAction(import_action)
         
         # Tools menu
         tools_menu = menubar.addMenu('Tools')
@@ -862,6 +2046,34 @@ class BlockDiagramEditor(QMainWindow):
         calculate_action = QAction('Calculate Transfer Function', self)
         calculate_action.triggered.connect(self.calculate_transfer_function)
         tools_menu.addAction(calculate_action)
+
+        tune_action = QAction('Auto-Tune PID', self)
+        tune_action.triggered.connect(self.auto_tune_pid)
+        tools_menu.addAction(tune_action)
+
+        loop_action = QAction('Loop Analysis', self)
+        loop_action.triggered.connect(self.loop_analysis)
+        tools_menu.addAction(loop_action)
+
+        bode_action = QAction('Frequency Response', self)
+        bode_action.triggered.connect(self.open_frequency_response)
+        tools_menu.addAction(bode_action)
+
+        sweep_action = QAction('Parameter Sweep...', self)
+        sweep_action.triggered.connect(self.parameter_sweep)
+        tools_menu.addAction(sweep_action)
+
+        stream_action = QAction('Streaming Simulation', self)
+        stream_action.triggered.connect(self.open_streaming_simulation)
+        tools_menu.addAction(stream_action)
+
+        zpk_action = QAction('Zero-Pole-Gain Reduction', self, checkable=True)
+        zpk_action.toggled.connect(self.set_zpk_reduction)
+        tools_menu.addAction(zpk_action)
+
+        layout_action = QAction('Auto Layout', self)
+        layout_action.triggered.connect(self.auto_layout)
+        tools_menu.addAction(layout_action)
         
     def create_toolbar(self):
         """Create the toolbar"""
@@ -925,8 +2137,35 @@ class BlockDiagramEditor(QMainWindow):
     def new_diagram(self):
         """Clear the current diagram"""
         self.diagram_view.scene.clear()
+        self.diagram_view.router.clear()
+        self.diagram_view.fingerprint.clear()
+        self.diagram_view.validator.clear()
+        self.diagram_view.parameter_values.clear()
         self.results_panel.results_text.clear()
         
+    def import_netlist(self):
+        """Load a text netlist into the diagram and lay it out"""
+        path, _ = QFileDialog.getOpenFileName(self, "Import Netlist", "",
+                                              "Netlists (*.net *.txt);;All files (*)")
+        if not path:
+            return
+        QApplication.setOverrideCursor(Qt.WaitCursor)
+        try:
+            blocks, errors = self.diagram_view.import_netlist(path)
+        except OSError as e:
+            QMessageBox.critical(self, "Import Netlist", f"Cannot read netlist: {str(e)}")
+            return
+        finally:
+            QApplication.restoreOverrideCursor()
+
+        if errors:
+            shown = '\n'.join(str(e) for e in errors[:20])
+            more = f"\n... and {len(errors) - 20} more" if len(errors) > 20 else ""
+            QMessageBox.warning(self, "Import Netlist",
+                                f"Skipped {len(errors)} malformed line(s):\n{shown}{more}")
+        if blocks:
+            self.auto_layout()
+
     def calculate_transfer_function(self):
         """Calculate the overall transfer function of the diagram"""
         try:
@@ -937,15 +2176,190 @@ class BlockDiagramEditor(QMainWindow):
                 QMessageBox.information(self, "No Blocks", "Please add some blocks to the diagram first!")
                 return
                 
-            # Calculate transfer function
-            tf, status = TransferFunctionCalculator.calculate_overall_tf(blocks, connections)
+            # Several inputs or outputs give a transfer matrix instead
+            inputs = sum(1 for b in blocks if b.block_type == 'input')
+            outputs = sum(1 for b in blocks if b.block_type == 'output')
+            mimo = inputs > 1 or outputs > 1
+
+            # Calculate transfer function, unless the structure is unchanged
+            fingerprint = self.diagram_view.fingerprint.value
+            if self.last_calculation is not None and self.last_calculation[0] == fingerprint:
+                result, status = self.last_calculation[1:]
+            elif mimo:
+                result, status = TransferFunctionCalculator.calculate_transfer_matrix(
+                    blocks, connections)
+                self.last_calculation = (fingerprint, result, status)
+            else:
+                result, status = TransferFunctionCalculator.calculate_overall_tf(
+                    blocks, connections, self.reduction_cache, zpk=self.zpk_reduction)
+                self.last_calculation = (fingerprint, result, status)
             
             # Update results panel
-            self.results_panel.update_results(tf, status)
+            if mimo:
+                self.results_panel.update_matrix_results(result, status)
+                self.last_transfer_function = None
+            else:
+                self.results_panel.update_results(result, status)
+                self.last_transfer_function = result
         except Exception as e:
             print(f"Error calculating transfer function: {e}")
             QMessageBox.critical(self, "Calculation Error", f"Failed to calculate transfer function: {str(e)}")
 
+    def update_validation_status(self):
+        """Show the validator's running summary in the status bar"""
+        validator = self.diagram_view.validator
+        self.validation_label.setText(validator.summary())
+        worst = validator.worst_level()
+        colors = {OK: "#2e7d32", WARNING: "#e68a00", ERROR: "#c00000"}
+        self.validation_label.setStyleSheet(f"color: {colors[worst]};")
+
+    def set_zpk_reduction(self, enabled):
+        """Switch the reduction between coefficient and zero-pole-gain edges"""
+        self.zpk_reduction = enabled
+        self.last_calculation = None
+
+    def auto_tune_pid(self):
+        """Tune the selected (or first) PID block against the rest of the diagram"""
+        blocks = self.diagram_view.get_all_blocks()
+        pid_blocks = [b for b in blocks if b.block_type == 'pid']
+        if not pid_blocks:
+            QMessageBox.information(self, "Auto-Tune PID", "Please add a PID block to the diagram first!")
+            return
+        selected = [b for b in pid_blocks if b.isSelected()]
+        controller = (selected or pid_blocks)[0]
+
+        objectives = ['ITAE', 'Overshoot limit', 'Bandwidth']
+        choice, ok = QInputDialog.getItem(self, "Auto-Tune PID", "Objective:", objectives, 0, False)
+        if not ok:
+            return
+        options = {}
+        if choice == 'ITAE':
+            objective = 'itae'
+        elif choice == 'Overshoot limit':
+            objective = 'overshoot'
+            limit, ok = QInputDialog.getDouble(self, "Auto-Tune PID", "Maximum overshoot (%):",
+                                               5.0, 0.0, 100.0, 1)
+            if not ok:
+                return
+            options['overshoot_limit'] = limit
+        else:
+            objective = 'bandwidth'
+            bandwidth, ok = QInputDialog.getDouble(self, "Auto-Tune PID", "Target bandwidth (rad/s):",
+                                                   1.0, 1e-6, 1e6, 3)
+            if not ok:
+                return
+            options['bandwidth'] = bandwidth
+
+        try:
+            model = TransferFunctionCalculator.controller_loop_model(
+                blocks, self.diagram_view.get_all_connections(), controller)
+            QApplication.setOverrideCursor(Qt.WaitCursor)
+            try:
+                result = PIDTuner(model, objective, filter_n=controller.filter_n, **options).tune()
+            finally:
+                QApplication.restoreOverrideCursor()
+        except Exception as e:
+            QMessageBox.critical(self, "Auto-Tune PID", f"Tuning failed: {str(e)}")
+            return
+
+        controller.kp, controller.ki, controller.kd = result['kp'], result['ki'], result['kd']
+        controller.update_transfer_function()
+        controller.update()
+        self.calculate_transfer_function()
+
+    def loop_analysis(self):
+        """Show L, S, T and the controller effort around the selected (or first) PID block"""
+        blocks = self.diagram_view.get_all_blocks()
+        pid_blocks = [b for b in blocks if b.block_type == 'pid']
+        if not pid_blocks:
+            QMessageBox.information(self, "Loop Analysis", "Please add a PID block to the diagram first!")
+            return
+        selected = [b for b in pid_blocks if b.isSelected()]
+        controller = (selected or pid_blocks)[0]
+        try:
+            functions = TransferFunctionCalculator.loop_analysis(
+                blocks, self.diagram_view.get_all_connections(), controller)
+        except Exception as e:
+            QMessageBox.critical(self, "Loop Analysis", f"Loop analysis failed: {str(e)}")
+            return
+        self.results_panel.update_loop_results(controller, functions)
+
+    def parameter_sweep(self):
+        """Reduce the diagram once in its named parameters and open the sweep dialog"""
+        try:
+            system = TransferFunctionCalculator.parametric_transfer(
+                self.diagram_view.get_all_blocks(), self.diagram_view.get_all_connections())
+        except Exception as e:
+            QMessageBox.critical(self, "Parameter Sweep", f"Cannot sweep this diagram: {str(e)}")
+            return
+        if self.sweep_dialog is not None:
+            self.sweep_dialog.close()
+        self.sweep_dialog = ParameterSweepDialog(system, self.diagram_view, self)
+        self.sweep_dialog.show()
+
+    def open_frequency_response(self):
+        """Show the Bode plot of the diagram, reusing the open window and its cache"""
+        if self.bode_window is not None and self.bode_window.isVisible():
+            self.bode_window.refresh()
+            self.bode_window.raise_()
+            return
+        self.bode_window = BodePlotWindow(self.diagram_view)
+        self.bode_window.show()
+
+    def open_streaming_simulation(self):
+        """Open a live plot that streams the calculated system in real time"""
+        system, dead_time, status = TransferFunctionCalculator.simulation_model(
+            self.diagram_view.get_all_blocks(), self.diagram_view.get_all_connections())
+        if not isinstance(system, control.TransferFunction):
+            QMessageBox.information(self, "Streaming Simulation",
+                                    f"Cannot simulate this diagram: {status}")
+            return
+        if self.stream_window is not None:
+            self.stream_window.close()
+        try:
+            self.stream_window = LivePlotWidget(system, delay=dead_time)
+        except ValueError as e:
+            self.stream_window = None
+            QMessageBox.information(self, "Streaming Simulation",
+                                    f"Cannot simulate this diagram: {e}")
+            return
+        self.stream_window.show()
+
+    def auto_layout(self):
+        """Arrange the blocks in signal-flow layers on a worker thread"""
+        if self.layout_worker is not None and self.layout_worker.isRunning():
+            return
+        blocks = self.diagram_view.get_all_blocks()
+        if not blocks:
+            return
+        ids = {block: i for i, block in enumerate(blocks)}
+        edges = []
+        for connection in self.diagram_view.get_all_connections():
+            source, target, _ = TransferFunctionCalculator.connection_endpoints(connection)
+            edges.append((ids[source], ids[target]))
+
+        self.layout_worker = LayoutWorker(range(len(blocks)), edges, self)
+        self.layout_worker.layout_ready.connect(
+            lambda positions: self.apply_layout_result(blocks, positions))
+        self.layout_worker.layout_failed.connect(
+            lambda message: QMessageBox.critical(self, "Auto Layout", f"Layout failed: {message}"))
+        self.layout_worker.start()
+
+    def apply_layout_result(self, blocks, positions):
+        """Move the blocks a layout was computed for, skipping any removed meanwhile"""
+        scene = self.diagram_view.scene
+        # A new diagram deletes the old items outright; a removed block leaves the scene
+        self.diagram_view.apply_layout({blocks[i]: pos for i, pos in positions.items()
+                                        if not sip.isdeleted(blocks[i]) and
+                                        blocks[i].scene() is scene})
+
+    def closeEvent(self, event):
+        if self.reduction_cache is not None:
+            # Writes the pending last_used updates of cache hits
+            self.reduction_cache.close()
+            self.reduction_cache = None
+        super().closeEvent(event)
+
 def main():
     app = QApplication(sys.argv)
     
@@ -0,0 +1,96 @@
+"""Command-line batch analysis of transfer functions.
+
+Reads one transfer function per line (optionally ``name: expression``, with
+``s`` as the Laplace variable and ``^`` for powers) and prints stability,
+step-response figures and the stability margins of each system taken as a
+loop gain, all computed in vectorized passes over the whole batch.
+
+    python BatchAnalysis.py systems.txt
+    python BatchAnalysis.py systems.txt --csv > results.csv
+"""
+import argparse
+import sys
+
+import control
+
+from ExpressionParser import parse_coefficients
+from SystemAnalysis import (routh_hurwitz, stability_margins, step_metrics, tf_batch,
+                            MARGIN_LABELS, METRIC_LABELS, STEP_SAMPLES)
+
+
+def parse_system(expr):
+    """Transfer function of an expression in s"""
+    return control.tf(*parse_coefficients(expr))
+
+
+def load_systems(path):
+    """Read (names, systems) from a text file, reporting bad lines by number"""
+    names = []
+    systems = []
+    with open(path) as f:
+        for line_number, line in enumerate(f, 1):
+            line = line.strip()
+            if not line or line.startswith('#'):
+                continue
+            name, _, expr = line.rpartition(':')
+            try:
+                systems.append(parse_system(expr))
+            except Exception as e:
+                raise ValueError(f"{path}:{line_number}: cannot parse '{line}': {e}")
+            names.append(name.strip() or f"G{len(systems)}")
+    return names, systems
+
+
+def analyse(systems, n_samples=STEP_SAMPLES):
+    """Stability, step metrics and margins for a list of continuous systems"""
+    nums, dens = tf_batch(systems)
+    stable, rhp = routh_hurwitz(dens)
+    results = step_metrics(nums, dens, n_samples)
+    results.update(stability_margins(nums, dens))
+    results['stable'] = stable
+    results['rhp_poles'] = rhp
+    return results
+
+
+def format_table(names, results, csv=False):
+    """Render the batch results as an aligned table or as CSV"""
+    keys = [key for key, _, _ in METRIC_LABELS + MARGIN_LABELS]
+    headers = ['name', 'stable', 'rhp_poles'] + keys
+    rows = []
+    for i, name in enumerate(names):
+        row = [name, 'yes' if results['stable'][i] else 'no', str(results['rhp_poles'][i])]
+        row += [f"{results[key][i]:.6g}" for key in keys]
+        rows.append(row)
+    if csv:
+        return '\n'.join(','.join(row) for row in [headers] + rows)
+    widths = [max(len(r[c]) for r in [headers] + rows) for c in range(len(headers))]
+    lines = ['  '.join(h.ljust(w) for h, w in zip(headers, widths))]
+    lines.append('  '.join('-' * w for w in widths))
+    for row in rows:
+        lines.append('  '.join(v.ljust(w) for v, w in zip(row, widths)).rstrip())
+    return '\n'.join(lines)
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Batch stability and step-response analysis")
+    parser.add_argument('input', help="file with one transfer function per line")
+    parser.add_argument('--csv', action='store_true', help="print CSV instead of a table")
+    parser.add_argument('--samples', type=int, default=STEP_SAMPLES,
+                        help="samples per step response")
+    args = parser.parse_args(argv)
+
+    try:
+        names, systems = load_systems(args.input)
+    except (OSError, ValueError) as e:
+        print(f"Error: {e}", file=sys.stderr)
+        return 1
+    if not systems:
+        print("Error: no transfer functions found", file=sys.stderr)
+        return 1
+
+    print(format_table(names, analyse(systems, args.samples), args.csv))
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
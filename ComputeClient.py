@@ -0,0 +1,241 @@
+"""Client for the local computation service (``ComputeService.py``).
+
+Only the standard library is imported here, so scripts that just forward
+work to a running service start without paying for NumPy or python-control.
+
+    with ComputeClient() as client:
+        result = client.request('associate', g1='10/(s^2+2s+10)', g2='5/(s^2+5)')
+        results = client.request_many([('analyse', {'system': '1/(s+1)'}),
+                                       ('analyse', {'system': '1/(s^2+s+1)'})])
+
+``request_many`` writes every request before reading any answer, so the
+service sees them together and can batch them.
+
+With ``autostart`` (the default) a missing service is started in the
+background with an idle timeout, so repeated short invocations all reuse
+one warm process.  From the shell:
+
+    python ComputeClient.py associate "10/(s^2+2s+10)" "5/(s^2+5)"
+    python ComputeClient.py analyse "1/(s+1)" "1/(s^2+s+1)" --json
+    python ComputeClient.py shutdown
+"""
+import argparse
+import getpass
+import itertools
+import json
+import os
+import socket
+import subprocess
+import sys
+import tempfile
+import time
+
+DEFAULT_SOCKET = os.path.join(tempfile.gettempdir(),
+                              f"block-diagram-compute-{getpass.getuser()}.sock")
+# Used instead of the socket file where Unix sockets are unavailable
+DEFAULT_PORT = 8765
+# A service started on demand exits after this many seconds without clients
+DEFAULT_IDLE_TIMEOUT = 600.0
+# How long to wait for a freshly started service to accept connections
+STARTUP_TIMEOUT = 30.0
+SERVICE_SCRIPT = os.path.join(os.path.dirname(os.path.abspath(__file__)), 'ComputeService.py')
+
+
+class ComputeError(RuntimeError):
+    """A request the service answered with an error"""
+
+
+def connect(path=DEFAULT_SOCKET, port=None, timeout=None):
+    """Socket connected to the service on a Unix socket or a localhost port"""
+    if port is None and not hasattr(socket, 'AF_UNIX'):
+        port = DEFAULT_PORT
+    if port is not None:
+        return socket.create_connection(('127.0.0.1', port), timeout=timeout)
+    sock = socket.socket(socket.AF_UNIX, socket.SOCK_STREAM)
+    sock.settimeout(timeout)
+    try:
+        sock.connect(path)
+    except OSError:
+        sock.close()
+        raise
+    return sock
+
+
+def start_service(path=DEFAULT_SOCKET, port=None, idle_timeout=DEFAULT_IDLE_TIMEOUT):
+    """Launch the service as a detached background process"""
+    command = [sys.executable, SERVICE_SCRIPT, '--idle-timeout', str(idle_timeout)]
+    command += ['--port', str(port)] if port is not None else ['--socket', path]
+    options = {}
+    if os.name == 'posix':
+        options['start_new_session'] = True
+    else:
+        options['creationflags'] = getattr(subprocess, 'DETACHED_PROCESS', 0)
+    return subprocess.Popen(command, stdin=subprocess.DEVNULL, stdout=subprocess.DEVNULL,
+                            stderr=subprocess.DEVNULL, close_fds=True, **options)
+
+
+def connect_or_start(path=DEFAULT_SOCKET, port=None, timeout=None,
+                     idle_timeout=DEFAULT_IDLE_TIMEOUT):
+    """Connected socket, starting the service first if nothing is listening"""
+    try:
+        return connect(path, port, timeout)
+    except OSError:
+        pass
+    process = start_service(path, port, idle_timeout)
+    deadline = time.monotonic() + STARTUP_TIMEOUT
+    while True:
+        try:
+            return connect(path, port, timeout)
+        except OSError:
+            # Another client may have started a service first; ours then exits
+            if time.monotonic() > deadline or (process.poll() is not None and
+                                               process.returncode != 1):
+                raise ConnectionError("compute service did not start")
+            time.sleep(0.02)
+
+
+class ComputeClient:
+    """Blocking client speaking the service's JSON-lines protocol"""
+    def __init__(self, path=DEFAULT_SOCKET, port=None, timeout=30.0, autostart=True,
+                 idle_timeout=DEFAULT_IDLE_TIMEOUT):
+        self.path = path
+        self.port = port
+        self.timeout = timeout
+        self.autostart = autostart
+        self.idle_timeout = idle_timeout
+        self.sock = None
+        self.stream = None
+        self.ids = itertools.count(1)
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
+
+    def open(self):
+        if self.sock is None:
+            if self.autostart:
+                self.sock = connect_or_start(self.path, self.port, self.timeout, self.idle_timeout)
+            else:
+                self.sock = connect(self.path, self.port, self.timeout)
+            self.stream = self.sock.makefile('rwb')
+
+    def close(self):
+        if self.sock is not None:
+            self.stream.close()
+            self.sock.close()
+        self.sock = None
+        self.stream = None
+
+    def request(self, op, **fields):
+        """Send one request and return its result"""
+        return self.request_many([(op, fields)])[0]
+
+    def request_many(self, requests):
+        """Results of several (op, fields) requests, in order
+
+        Raises ``ComputeError`` for the first request that failed.
+        """
+        self.open()
+        ids = []
+        for op, fields in requests:
+            ids.append(next(self.ids))
+            message = dict(fields, id=ids[-1], op=op)
+            self.stream.write(json.dumps(message).encode() + b'\n')
+        self.stream.flush()
+
+        answers = {}
+        while len(answers) < len(ids):
+            line = self.stream.readline()
+            if not line:
+                self.close()
+                raise ConnectionError("compute service closed the connection")
+            answer = json.loads(line)
+            answers[answer.get('id')] = answer
+        results = []
+        for request_id in ids:
+            answer = answers[request_id]
+            if not answer.get('ok'):
+                raise ComputeError(answer.get('error', "unknown error"))
+            results.append(answer['result'])
+        return results
+
+
+def format_poly(coefficients, variable='s'):
+    """Polynomial text such as ``10 s^2 + 50``"""
+    degree = len(coefficients) - 1
+    terms = []
+    for power, c in zip(range(degree, -1, -1), coefficients):
+        if c == 0:
+            continue
+        sign = '-' if c < 0 else '+'
+        magnitude = f"{abs(c):.4g}"
+        if power > 0:
+            magnitude = '' if magnitude == '1' else magnitude + ' '
+            magnitude += variable if power == 1 else f"{variable}^{power}"
+        terms.append((sign, magnitude))
+    if not terms:
+        return '0'
+    text = ('-' if terms[0][0] == '-' else '') + terms[0][1]
+    return text + ''.join(f" {sign} {term}" for sign, term in terms[1:])
+
+
+def format_tf(tf, variable='s'):
+    """Numerator over denominator, centred on a dash line"""
+    num = format_poly(tf['num'], variable)
+    den = format_poly(tf['den'], variable)
+    width = max(len(num), len(den)) + 2
+    return '\n'.join([num.center(width).rstrip(), '-' * width, den.center(width).rstrip()])
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Thin client for the local computation service")
+    parser.add_argument('op', choices=['associate', 'loop', 'analyse', 'stats', 'shutdown'])
+    parser.add_argument('systems', nargs='*',
+                        help="associate: G1 G2; loop: plant [controller [sensor]]; "
+                             "analyse: one or more systems")
+    parser.add_argument('--socket', default=DEFAULT_SOCKET, help="Unix socket path")
+    parser.add_argument('--port', type=int, help="use this localhost TCP port instead")
+    parser.add_argument('--json', action='store_true', help="print the raw JSON results")
+    args = parser.parse_args(argv)
+
+    expected = {'associate': (2, 2), 'loop': (1, 3), 'analyse': (1, None),
+                'stats': (0, 0), 'shutdown': (0, 0)}[args.op]
+    if len(args.systems) < expected[0] or (expected[1] is not None and
+                                           len(args.systems) > expected[1]):
+        parser.error(f"wrong number of systems for '{args.op}'")
+    if args.op == 'associate':
+        requests = [('associate', {'g1': args.systems[0], 'g2': args.systems[1]})]
+    elif args.op == 'loop':
+        fields = dict(zip(['plant', 'controller', 'sensor'], args.systems))
+        requests = [('loop', fields)]
+    elif args.op == 'analyse':
+        requests = [('analyse', {'system': system}) for system in args.systems]
+    else:
+        requests = [(args.op, {})]
+
+    try:
+        # Stopping a service that is not running should not start one
+        with ComputeClient(args.socket, args.port, autostart=args.op != 'shutdown') as client:
+            results = client.request_many(requests)
+    except (OSError, ComputeError) as e:
+        print(f"Error: {e}", file=sys.stderr)
+        return 1
+
+    if args.json or args.op in ('stats', 'shutdown'):
+        print(json.dumps(results if len(results) > 1 else results[0]))
+    elif args.op == 'analyse':
+        for system, result in zip(args.systems, results):
+            print(f"{system}: " + ', '.join(f"{k}={v:.6g}" if isinstance(v, float) else f"{k}={v}"
+                                            for k, v in result.items()))
+    else:
+        for name, tf in results[0].items():
+            print(f"{name}:")
+            print(format_tf(tf))
+            print()
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
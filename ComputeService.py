@@ -0,0 +1,407 @@
+"""Local asyncio service for transfer-function algebra and analysis.
+
+Tools that cannot drive a Qt window send requests over a Unix socket (or a
+localhost TCP port).  The protocol is one JSON object per line each way:
+
+    {"id": 1, "op": "associate", "g1": "10/(s^2+2s+10)", "g2": "5/(s^2+5)"}
+    {"id": 1, "ok": true, "result": {"series": {"num": [50.0], "den": [...]}, ...}}
+
+Systems are expressions in s (see ``ExpressionParser``) or
+``{"num": [...], "den": [...]}`` objects.  Operations:
+
+    associate  g1, g2                       series, parallel and feedback
+    loop       plant [, controller, sensor]  L, S, T, closed loop and effort
+    analyse    system                       Routh-Hurwitz stability, step metrics and
+                                            margins of the system as a loop gain
+    reduce     edges, source, sink          transfer of a signal-flow graph given
+                                            as [src, dst, gain] edges
+    stats                                   request and batch counters
+    shutdown                                stop the service
+
+Answers on a connection are written as they complete, tagged with the
+request id.  Concurrent requests of one kind, from any number of clients,
+are collected for a couple of milliseconds and run through the vectorized
+kernels of ``SystemAnalysis`` as one batch, off the event loop.  ``ComputeClient``
+is a matching standard-library client.
+
+Run as a warm daemon, the service pays the NumPy and kernel start-up cost
+once; ``ComputeClient`` starts it on demand with an idle timeout, after which
+it exits by itself.
+
+    python ComputeService.py                  # default Unix socket
+    python ComputeService.py --port 8765      # localhost TCP instead
+    python ComputeService.py --idle-timeout 600
+"""
+import argparse
+import asyncio
+import json
+import os
+import socket
+import sys
+import time
+from contextlib import contextmanager
+
+try:
+    import fcntl
+except ImportError:  # no Unix sockets here either; the TCP port is used instead
+    fcntl = None
+
+from ComputeClient import DEFAULT_PORT, DEFAULT_SOCKET, connect
+from DiagramReducer import SignalFlowGraph, rat, reduce_graph
+from ExpressionParser import parse_coefficients
+from SystemAnalysis import (associations, loop_functions, pad_coefficients, routh_hurwitz,
+                            stability_margins, step_metrics, MARGIN_LABELS, METRIC_LABELS)
+
+# How long the first request of a batch waits for others, and the batch cap
+BATCH_WINDOW = 0.002
+MAX_BATCH = 512
+
+
+class RequestError(ValueError):
+    """A request that cannot be understood"""
+
+
+def parse_system(spec, field='system'):
+    """(num, den) of an expression or a {"num", "den"} object"""
+    if isinstance(spec, str):
+        return rat(*parse_coefficients(spec))
+    if isinstance(spec, dict) and 'num' in spec and 'den' in spec:
+        return rat(spec['num'], spec['den'])
+    raise RequestError(f"'{field}' must be an expression or an object with 'num' and 'den'")
+
+
+def _field(message, name):
+    if name not in message:
+        raise RequestError(f"missing field '{name}'")
+    return message[name]
+
+
+def _encode(num, den):
+    num, den = rat(num, den)
+    return {'num': num.tolist(), 'den': den.tolist()}
+
+
+def _rows(functions, names):
+    """Per-row {name: {num, den}} dicts from a dict of (nums, dens) batches"""
+    count = len(next(iter(functions.values()))[1])
+    return [{name: _encode(functions[name][0][i], functions[name][1][i]) for name in names}
+            for i in range(count)]
+
+
+def _stack(systems):
+    return (pad_coefficients([num for num, _ in systems]),
+            pad_coefficients([den for _, den in systems]))
+
+
+# Request parsers (run on the event loop, so bad requests fail alone) and
+# batch kernels (run in a worker thread on the list of parsed requests)
+
+def parse_associate(message):
+    return parse_system(_field(message, 'g1'), 'g1'), parse_system(_field(message, 'g2'), 'g2')
+
+
+def associate_batch(items):
+    g1 = _stack([g1 for g1, _ in items])
+    g2 = _stack([g2 for _, g2 in items])
+    return _rows(associations(g1, g2), ('series', 'parallel', 'feedback'))
+
+
+def parse_loop(message):
+    unity = ((1.0,), (1.0,))
+    controller = parse_system(message['controller'], 'controller') if 'controller' in message else unity
+    sensor = parse_system(message['sensor'], 'sensor') if 'sensor' in message else unity
+    return controller, parse_system(_field(message, 'plant'), 'plant'), sensor
+
+
+def loop_batch(items):
+    controllers, plants, sensors = zip(*items)
+    functions = loop_functions(_stack(controllers), _stack(plants), _stack(sensors))
+    return _rows(functions, ('loop', 'sensitivity', 'complementary', 'closed_loop', 'effort'))
+
+
+def parse_analyse(message):
+    num, den = parse_system(_field(message, 'system'))
+    if len(num) > len(den):
+        raise RequestError("improper transfer function has no step response")
+    return num, den
+
+
+def analyse_batch(items):
+    nums, dens = _stack(items)
+    stable, rhp = routh_hurwitz(dens)
+    metrics = step_metrics(nums, dens)
+    metrics.update(stability_margins(nums, dens))
+    keys = [key for key, _, _ in METRIC_LABELS + MARGIN_LABELS]
+    return [dict({key: float(metrics[key][i]) for key in keys},
+                 stable=bool(stable[i]), rhp_poles=int(rhp[i]))
+            for i in range(len(items))]
+
+
+def parse_reduce(message):
+    edges = []
+    for edge in _field(message, 'edges'):
+        if not isinstance(edge, list) or len(edge) != 3:
+            raise RequestError("edges must be [source, target, gain] triples")
+        src, dst, gain = edge
+        edges.append((src, dst, parse_system(gain, 'gain')))
+    return edges, _field(message, 'source'), _field(message, 'sink')
+
+
+def reduce_batch(items):
+    # Graph reductions do not vectorize; the batch only saves thread hops
+    results = []
+    for edges, source, sink in items:
+        graph = SignalFlowGraph()
+        for src, dst, gain in edges:
+            graph.add_edge(src, dst, gain)
+        for node in (source, sink):
+            if node not in graph.succ:
+                raise RequestError(f"node {node!r} is not in the graph")
+        results.append(_encode(*reduce_graph(graph, source, sink, parallel=False)))
+    return results
+
+
+OPERATIONS = {
+    'associate': (parse_associate, associate_batch),
+    'loop': (parse_loop, loop_batch),
+    'analyse': (parse_analyse, analyse_batch),
+    'reduce': (parse_reduce, reduce_batch),
+}
+
+
+def warm_up():
+    """Run every kernel once so the first real request finds everything loaded"""
+    g = rat([1.0], [1.0, 1.0])
+    associate_batch([(g, g)])
+    loop_batch([(g, g, g)])
+    analyse_batch([g])
+    reduce_batch([([(0, 1, g)], 0, 1)])
+
+
+def _run_each(kernel, items):
+    """(result, error) per item, running the kernel on one item at a time"""
+    outcomes = []
+    for item in items:
+        try:
+            outcomes.append((kernel([item])[0], None))
+        except Exception as e:
+            outcomes.append((None, e))
+    return outcomes
+
+
+def file_identity(path):
+    """(device, inode, change time) of a file; the inode alone is reused at once"""
+    status = os.stat(path)
+    return status.st_dev, status.st_ino, status.st_ctime_ns
+
+
+@contextmanager
+def startup_lock(path):
+    """Exclusive lock, shared by every service starting on ``path``, held for the block"""
+    fd = os.open(path + '.lock', os.O_RDWR | os.O_CREAT, 0o600)
+    try:
+        # The lock file itself is never removed: unlinking it would let a
+        # later starter lock a fresh file while another still holds the old one
+        fcntl.flock(fd, fcntl.LOCK_EX)
+        yield
+    finally:
+        os.close(fd)
+
+
+class MicroBatcher:
+    """Collects concurrent requests of one kind and runs them as one batch"""
+    def __init__(self, kernel, window=BATCH_WINDOW, max_batch=MAX_BATCH):
+        self.kernel = kernel
+        self.window = window
+        self.max_batch = max_batch
+        self.pending = []
+        self.timer = None
+        self.batches = 0
+        # The loop only keeps weak references to tasks; hold running batches here
+        self.running = set()
+
+    def submit(self, item):
+        """Future for the result of one item"""
+        loop = asyncio.get_running_loop()
+        future = loop.create_future()
+        self.pending.append((item, future))
+        if len(self.pending) >= self.max_batch:
+            self.flush()
+        elif self.timer is None:
+            self.timer = loop.call_later(self.window, self.flush)
+        return future
+
+    def flush(self):
+        if self.timer is not None:
+            self.timer.cancel()
+            self.timer = None
+        batch, self.pending = self.pending, []
+        if batch:
+            self.batches += 1
+            task = asyncio.ensure_future(self._run(batch))
+            self.running.add(task)
+            task.add_done_callback(self.running.discard)
+
+    async def _run(self, batch):
+        loop = asyncio.get_running_loop()
+        items = [item for item, _ in batch]
+        try:
+            results = await loop.run_in_executor(None, self.kernel, items)
+            outcomes = [(result, None) for result in results]
+        except Exception:
+            # One bad item must not fail the rest: redo them one at a time
+            outcomes = await loop.run_in_executor(None, _run_each, self.kernel, items)
+        for (_, future), (result, error) in zip(batch, outcomes):
+            if future.done():
+                continue
+            if error is None:
+                future.set_result(result)
+            else:
+                future.set_exception(error)
+
+
+class ComputeService:
+    """Dispatches protocol messages to the micro-batchers"""
+    def __init__(self, window=BATCH_WINDOW, max_batch=MAX_BATCH):
+        self.batchers = {op: MicroBatcher(kernel, window, max_batch)
+                         for op, (_, kernel) in OPERATIONS.items()}
+        self.requests = 0
+        self.connections = 0
+        self.last_active = time.monotonic()
+        self.stopping = asyncio.Event()
+        self.socket_identity = None
+
+    def stats(self):
+        return {'requests': self.requests,
+                'batches': {op: b.batches for op, b in self.batchers.items()}}
+
+    async def handle(self, message):
+        """Response dict for one request message"""
+        request_id = message.get('id') if isinstance(message, dict) else None
+        try:
+            if not isinstance(message, dict):
+                raise RequestError("request must be a JSON object")
+            self.requests += 1
+            op = message.get('op')
+            if op == 'stats':
+                result = self.stats()
+            elif op == 'shutdown':
+                self.stopping.set()
+                result = None
+            elif op in OPERATIONS:
+                parse, _ = OPERATIONS[op]
+                result = await self.batchers[op].submit(parse(message))
+            else:
+                raise RequestError(f"unknown op {op!r}")
+        except Exception as e:
+            return {'id': request_id, 'ok': False, 'error': str(e)}
+        return {'id': request_id, 'ok': True, 'result': result}
+
+    async def serve_connection(self, reader, writer):
+        tasks = set()
+        self.connections += 1
+
+        async def answer(message):
+            response = await self.handle(message)
+            writer.write(json.dumps(response).encode() + b'\n')
+
+        try:
+            while True:
+                line = await reader.readline()
+                if not line:
+                    break
+                try:
+                    message = json.loads(line)
+                except ValueError as e:
+                    writer.write(json.dumps({'id': None, 'ok': False,
+                                             'error': f"bad JSON: {e}"}).encode() + b'\n')
+                    continue
+                task = asyncio.ensure_future(answer(message))
+                tasks.add(task)
+                task.add_done_callback(tasks.discard)
+            if tasks:
+                await asyncio.gather(*tasks)
+            await writer.drain()
+        except ConnectionError:
+            pass
+        finally:
+            writer.close()
+            self.connections -= 1
+            self.last_active = time.monotonic()
+
+    async def wait_stopped(self, idle_timeout=None):
+        """Return on a shutdown request, or once idle for ``idle_timeout`` seconds"""
+        while True:
+            try:
+                await asyncio.wait_for(self.stopping.wait(), timeout=1.0)
+                return
+            except asyncio.TimeoutError:
+                pass
+            idle = time.monotonic() - self.last_active
+            if idle_timeout is not None and self.connections == 0 and idle >= idle_timeout:
+                return
+
+    async def start(self, path=DEFAULT_SOCKET, port=None):
+        """Listening asyncio server on a Unix socket, or on localhost when ``port`` is given"""
+        if port is None and not hasattr(socket, 'AF_UNIX'):
+            port = DEFAULT_PORT
+        if port is not None:
+            return await asyncio.start_server(self.serve_connection, '127.0.0.1', port)
+        # Probing for a live service and binding must be one step, or two
+        # services starting together can both find the path free
+        with startup_lock(path):
+            if os.path.exists(path):
+                try:
+                    connect(path).close()
+                except OSError:
+                    # A leftover socket file from a service that did not exit cleanly
+                    os.unlink(path)
+                else:
+                    raise RuntimeError(f"a compute service is already listening on {path}")
+            server = await asyncio.start_unix_server(self.serve_connection, path)
+            self.socket_identity = file_identity(path)
+        return server
+
+    def remove_socket(self, path):
+        """Unlink the socket file, unless it now belongs to another service"""
+        try:
+            if file_identity(path) == self.socket_identity:
+                os.unlink(path)
+        except FileNotFoundError:
+            pass
+
+
+async def serve(path=DEFAULT_SOCKET, port=None, window=BATCH_WINDOW, idle_timeout=None):
+    """Run the service until a shutdown request or ``idle_timeout`` seconds without clients"""
+    service = ComputeService(window)
+    await asyncio.get_running_loop().run_in_executor(None, warm_up)
+    server = await service.start(path, port)
+    try:
+        async with server:
+            await service.wait_stopped(idle_timeout)
+    finally:
+        if service.socket_identity is not None:
+            service.remove_socket(path)
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Local transfer-function computation service")
+    parser.add_argument('--socket', default=DEFAULT_SOCKET, help="Unix socket path")
+    parser.add_argument('--port', type=int, help="serve on this localhost TCP port instead")
+    parser.add_argument('--window', type=float, default=BATCH_WINDOW * 1000,
+                        help="batching window in milliseconds")
+    parser.add_argument('--idle-timeout', type=float,
+                        help="exit after this many seconds without clients")
+    args = parser.parse_args(argv)
+    try:
+        asyncio.run(serve(args.socket, args.port, args.window / 1000, args.idle_timeout))
+    except KeyboardInterrupt:
+        pass
+    except RuntimeError as e:
+        print(f"Error: {e}", file=sys.stderr)
+        return 1
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,274 @@
+"""Obstacle-avoiding orthogonal routing for diagram connections.
+
+Block rectangles live in a uniform grid index, so collision checks only look
+at the blocks near a segment.  Routes are indexed the same way, which lets
+the editor find the few wires crossing a block's old or new bounds when it
+moves and re-route only those, independent of the total wire count.
+
+Geometry is plain ``(x0, y0, x1, y1)`` rectangles and ``(x, y)`` points, so
+this module does not depend on Qt.
+"""
+import heapq
+import math
+
+# Grid index cell size and the routing step used for detour offsets (scene units)
+INDEX_CELL = 100
+ROUTE_STEP = 10
+# Clearance kept around blocks and length of the straight stub leaving a port
+CLEARANCE = 8
+PORT_STUB = 20
+# Extra cost of a bend, in routing steps, so routes prefer few corners
+BEND_PENALTY = 4
+# Route search gives up after this many expansions and falls back to a Z route
+MAX_EXPANSIONS = 20000
+# Search window around the wire's bounding box (scene units); the wider
+# window is only tried when the narrow one has no route
+SEARCH_MARGINS = (300, 1500)
+
+
+def _inflate(rect, margin):
+    x0, y0, x1, y1 = rect
+    return x0 - margin, y0 - margin, x1 + margin, y1 + margin
+
+
+def _segment_hits(a, b, rect):
+    """True when the axis-aligned segment a-b passes through the rect interior"""
+    x0, y0, x1, y1 = rect
+    if a[1] == b[1]:
+        low, high = sorted((a[0], b[0]))
+        return y0 < a[1] < y1 and low < x1 and high > x0
+    low, high = sorted((a[1], b[1]))
+    return x0 < a[0] < x1 and low < y1 and high > y0
+
+
+class GridIndex:
+    """Uniform grid mapping cells to the keys whose rectangles overlap them"""
+    def __init__(self, cell=INDEX_CELL):
+        self.cell = cell
+        self.cells = {}
+        self.keys = {}
+
+    def _cells(self, rect):
+        x0, y0, x1, y1 = rect
+        c = self.cell
+        for i in range(math.floor(x0 / c), math.floor(x1 / c) + 1):
+            for j in range(math.floor(y0 / c), math.floor(y1 / c) + 1):
+                yield i, j
+
+    def insert(self, key, rects):
+        """Register a key covering one or more rectangles"""
+        self.remove(key)
+        covered = set()
+        for rect in rects:
+            covered.update(self._cells(rect))
+        for cell in covered:
+            self.cells.setdefault(cell, set()).add(key)
+        self.keys[key] = covered
+
+    def remove(self, key):
+        for cell in self.keys.pop(key, ()):
+            members = self.cells[cell]
+            members.discard(key)
+            if not members:
+                del self.cells[cell]
+
+    def query(self, rect):
+        """Keys registered in any cell overlapped by the rect"""
+        found = set()
+        for cell in self._cells(rect):
+            found.update(self.cells.get(cell, ()))
+        return found
+
+    def clear(self):
+        self.cells.clear()
+        self.keys.clear()
+
+
+def simplify(points):
+    """Drop repeated and collinear points from an orthogonal polyline"""
+    result = []
+    for p in points:
+        if result and p == result[-1]:
+            continue
+        if len(result) >= 2:
+            a, b = result[-2], result[-1]
+            if (a[0] == b[0] == p[0]) or (a[1] == b[1] == p[1]):
+                result[-1] = p
+                continue
+        result.append(p)
+    return result
+
+
+class ConnectorRouter:
+    """Routes wires around block rectangles and tracks which wires cross where"""
+    def __init__(self, clearance=CLEARANCE, step=ROUTE_STEP):
+        self.clearance = clearance
+        self.step = step
+        self.obstacles = {}
+        self.obstacle_index = GridIndex()
+        self.routes = {}
+        self.route_index = GridIndex()
+
+    def clear(self):
+        self.obstacles.clear()
+        self.obstacle_index.clear()
+        self.routes.clear()
+        self.route_index.clear()
+
+    # Obstacles
+
+    def set_obstacle(self, key, rect):
+        """Add or move an obstacle; returns the wires crossing its old or new bounds"""
+        rect = _inflate(rect, self.clearance)
+        old = self.obstacles.get(key)
+        self.obstacles[key] = rect
+        self.obstacle_index.insert(key, [rect])
+        affected = self.wires_crossing(rect)
+        if old is not None:
+            # Wires detouring around the old position run along its edges
+            affected |= self.wires_crossing(_inflate(old, self.clearance))
+        return affected
+
+    def remove_obstacle(self, key):
+        """Remove an obstacle; returns the wires that were routed around it"""
+        old = self.obstacles.pop(key, None)
+        self.obstacle_index.remove(key)
+        if old is None:
+            return set()
+        return self.wires_crossing(_inflate(old, self.clearance))
+
+    def _blocked(self, a, b):
+        x0, x1 = sorted((a[0], b[0]))
+        y0, y1 = sorted((a[1], b[1]))
+        for key in self.obstacle_index.query((x0, y0, x1, y1)):
+            if _segment_hits(a, b, self.obstacles[key]):
+                return True
+        return False
+
+    def _path_clear(self, points):
+        return not any(self._blocked(a, b) for a, b in zip(points, points[1:]))
+
+    # Wires
+
+    def wires_crossing(self, rect):
+        """Wires with a route segment through the rect"""
+        found = set()
+        for wire in self.route_index.query(rect):
+            points = self.routes[wire]
+            if any(_segment_hits(a, b, rect) for a, b in zip(points, points[1:])):
+                found.add(wire)
+        return found
+
+    def remove_wire(self, wire):
+        self.routes.pop(wire, None)
+        self.route_index.remove(wire)
+
+    def route(self, wire, start, end):
+        """Route a wire from an output port at ``start`` to an input port at ``end``"""
+        first = (start[0] + PORT_STUB, start[1])
+        last = (end[0] - PORT_STUB, end[1])
+        middle = self._fast_route(first, last)
+        for margin in SEARCH_MARGINS:
+            if middle is None:
+                middle = self._channel_route(first, last, margin)
+        if middle is None:
+            middle = self._z_route(first, last, (first[0] + last[0]) / 2)
+        points = simplify([tuple(start)] + middle + [tuple(end)])
+        self.routes[wire] = points
+        self.route_index.insert(wire, [(min(a[0], b[0]), min(a[1], b[1]),
+                                        max(a[0], b[0]), max(a[1], b[1]))
+                                       for a, b in zip(points, points[1:])])
+        return points
+
+    @staticmethod
+    def _z_route(first, last, x):
+        return [first, (x, first[1]), (x, last[1]), last]
+
+    @staticmethod
+    def _u_route(first, last, y):
+        return [first, (first[0], y), (last[0], y), last]
+
+    def _fast_route(self, first, last):
+        """Try the usual Z and U shaped routes before searching"""
+        if first[0] <= last[0]:
+            mid = (first[0] + last[0]) / 2
+            span = (last[0] - first[0]) / 2
+            offsets = [0.0]
+            for k in range(1, 4):
+                offsets += [k * span / 4, -k * span / 4]
+            candidates = [self._z_route(first, last, mid + d) for d in offsets]
+        else:
+            # Feedback wire: go around above or below everything in between
+            x0, x1 = last[0], first[0]
+            y0, y1 = sorted((first[1], last[1]))
+            nearby = [self.obstacles[k] for k in self.obstacle_index.query((x0, y0, x1, y1))]
+            top = min([y0] + [r[1] for r in nearby]) - self.step
+            bottom = max([y1] + [r[3] for r in nearby]) + self.step
+            candidates = [self._u_route(first, last, bottom), self._u_route(first, last, top)]
+        for points in candidates:
+            if self._path_clear(points):
+                return points
+        return None
+
+    def _channel_route(self, first, last, margin):
+        """A* over the lines running along nearby obstacle edges, penalizing bends
+
+        Shortest orthogonal routes around rectangles can always be drawn on
+        the lines through the obstacle edges and the two endpoints, so the
+        search graph only has a few nodes per nearby block.
+        """
+        x0, x1 = sorted((first[0], last[0]))
+        y0, y1 = sorted((first[1], last[1]))
+        window = (x0 - margin, y0 - margin, x1 + margin, y1 + margin)
+        xs = {first[0], last[0], window[0], window[2]}
+        ys = {first[1], last[1], window[1], window[3]}
+        for key in self.obstacle_index.query(window):
+            r = self.obstacles[key]
+            xs.update((r[0], r[2]))
+            ys.update((r[1], r[3]))
+        xs = sorted(x for x in xs if window[0] <= x <= window[2])
+        ys = sorted(y for y in ys if window[1] <= y <= window[3])
+        column = {x: i for i, x in enumerate(xs)}
+        row = {y: j for j, y in enumerate(ys)}
+        start = (column[first[0]], row[first[1]])
+        goal = (column[last[0]], row[last[1]])
+        bend = BEND_PENALTY * self.step
+
+        def point(node):
+            return xs[node[0]], ys[node[1]]
+
+        def heuristic(node):
+            p = point(node)
+            return abs(p[0] - last[0]) + abs(p[1] - last[1])
+
+        queue = [(heuristic(start), 0.0, start, None)]
+        best = {(start, None): 0.0}
+        parent = {}
+        expansions = 0
+        while queue and expansions < MAX_EXPANSIONS:
+            _, cost, node, direction = heapq.heappop(queue)
+            if node == goal:
+                path = [node]
+                state = (node, direction)
+                while state in parent:
+                    state = parent[state]
+                    path.append(state[0])
+                return [point(n) for n in reversed(path)]
+            if cost > best.get((node, direction), math.inf):
+                continue
+            expansions += 1
+            for move in ((1, 0), (-1, 0), (0, 1), (0, -1)):
+                nxt = (node[0] + move[0], node[1] + move[1])
+                if not (0 <= nxt[0] < len(xs) and 0 <= nxt[1] < len(ys)):
+                    continue
+                a, b = point(node), point(nxt)
+                if self._blocked(a, b):
+                    continue
+                new_cost = cost + abs(a[0] - b[0]) + abs(a[1] - b[1])
+                if direction not in (None, move):
+                    new_cost += bend
+                if new_cost < best.get((nxt, move), math.inf):
+                    best[(nxt, move)] = new_cost
+                    parent[(nxt, move)] = (node, direction)
+                    heapq.heappush(queue, (new_cost + heuristic(nxt), new_cost, nxt, move))
+        return None
@@ -0,0 +1,250 @@
+"""Structural fingerprints of block diagrams for skipping redundant work.
+
+A diagram fingerprint is the sum (mod 2**128) of one hash per block and per
+connection.  Blocks hash their type and parameters, connections hash the
+blocks and input port they join; positions never take part.  Because the
+sum is order independent, every edit only adds or subtracts the hashes of
+the elements it touches.
+
+Reduction results also persist across sessions in a small SQLite cache,
+keyed by content hashes of the coefficient graphs being reduced (the whole
+diagram and the subsystems shipped to worker processes).  Entries are plain
+NumPy arrays, evicted least recently used first once the cache grows past
+its size bound, and dropped wholesale when ``CACHE_VERSION`` changes.
+Cache hits only note the time; the ``last_used`` updates are written in
+batches.  The cache is best effort: a database error (another editor holding
+the lock, a full disk) is reported and treated as a miss.
+"""
+import hashlib
+import io
+import os
+import sqlite3
+import sys
+import time
+
+import numpy as np
+
+_MODULUS = 1 << 128
+
+# Bump whenever the reduction or the stored layout changes meaning
+CACHE_VERSION = 1
+DEFAULT_CACHE_PATH = os.path.join(os.path.expanduser('~'), '.cache', 'block-diagram-editor',
+                                  'reductions.sqlite')
+DEFAULT_CACHE_BYTES = 64 * 1024 * 1024
+# Cache hits whose last_used update is held back before one batched write
+TOUCH_BATCH = 64
+# Seconds to wait for another process's lock before giving up
+LOCK_TIMEOUT = 0.5
+
+
+def element_hash(*parts):
+    """128-bit hash of a tuple of plain values (str, numbers, bytes)"""
+    digest = hashlib.blake2b(repr(parts).encode(), digest_size=16).digest()
+    return int.from_bytes(digest, 'big')
+
+
+class DiagramFingerprint:
+    """Order-independent structural hash maintained incrementally"""
+    def __init__(self):
+        self.value = 0
+        self.elements = {}
+
+    def set(self, key, digest):
+        """Add an element, or replace the hash of one already present"""
+        self.discard(key)
+        self.elements[key] = digest
+        self.value = (self.value + digest) % _MODULUS
+
+    def discard(self, key):
+        digest = self.elements.pop(key, None)
+        if digest is not None:
+            self.value = (self.value - digest) % _MODULUS
+
+    def clear(self):
+        self.value = 0
+        self.elements.clear()
+
+    def hexdigest(self):
+        return f"{self.value:032x}"
+
+
+def _gain_bytes(gain):
+    if hasattr(gain, 'poles'):
+        # Factored (zero-pole-gain) edge
+        return (b'zpk:' + np.asarray(gain.zeros, dtype=complex).tobytes() + b'/' +
+                np.asarray(gain.poles, dtype=complex).tobytes() + b'/' +
+                np.float64(gain.gain).tobytes())
+    num, den = gain
+    return np.asarray(num, dtype=float).tobytes() + b'/' + np.asarray(den, dtype=float).tobytes()
+
+
+def graph_key(graph, source, sink):
+    """Content key of the source-to-sink transfer of a signal-flow graph
+
+    Only nodes on some source-to-sink path can change the result, so the
+    rest is left out.  Nodes are relabeled in breadth-first order from the
+    source (ties broken by edge gains), which makes the key independent of
+    block ids; the key still spells out every remaining edge, so equal keys
+    always mean equal graphs.
+    """
+    forward = _reachable(graph.succ, source)
+    backward = _reachable(graph.pred, sink)
+    live = forward & backward
+    label = {source: 0}
+    queue = [source]
+    for node in queue:
+        children = [dst for dst in graph.succ[node] if dst in live and dst not in label]
+        children.sort(key=lambda dst: _gain_bytes(graph.succ[node][dst]))
+        for dst in children:
+            label[dst] = len(label)
+            queue.append(dst)
+    digest = hashlib.sha256(f"reduce:{CACHE_VERSION}:{label.get(sink)}".encode())
+    edges = sorted((label[src], label[dst], _gain_bytes(gain))
+                   for src in label for dst, gain in graph.succ[src].items() if dst in label)
+    for src, dst, gain in edges:
+        digest.update(f"{src}>{dst}:".encode())
+        digest.update(gain)
+    return digest.hexdigest()
+
+
+def _reachable(adjacency, start):
+    seen = {start}
+    stack = [start]
+    while stack:
+        for other in adjacency[stack.pop()]:
+            if other not in seen:
+                seen.add(other)
+                stack.append(other)
+    return seen
+
+
+def group_key(nodes, edges):
+    """Content key of a subsystem payload, plus its node relabeling
+
+    Nodes are numbered by first appearance in the payload, so the same
+    subsystem built in the same order hits the cache across sessions.
+    """
+    label = {}
+    for src, dst, _, _ in edges:
+        label.setdefault(src, len(label))
+        label.setdefault(dst, len(label))
+    digest = hashlib.sha256(f"group:{CACHE_VERSION}:".encode())
+    digest.update(repr(sorted(label[n] for n in nodes)).encode())
+    for src, dst, num, den in edges:
+        digest.update(f"{label[src]}>{label[dst]}:".encode())
+        digest.update(_gain_bytes((num, den)))
+    return digest.hexdigest(), label
+
+
+def encode_arrays(arrays):
+    buffer = io.BytesIO()
+    np.savez(buffer, *arrays)
+    return buffer.getvalue()
+
+
+def decode_arrays(blob):
+    with np.load(io.BytesIO(blob), allow_pickle=False) as data:
+        return [data[f"arr_{i}"] for i in range(len(data.files))]
+
+
+class ReductionCache:
+    """Size-bounded, least-recently-used SQLite store of NumPy results"""
+    def __init__(self, path=DEFAULT_CACHE_PATH, max_bytes=DEFAULT_CACHE_BYTES):
+        self.path = path
+        self.max_bytes = max_bytes
+        if path != ':memory:':
+            os.makedirs(os.path.dirname(os.path.abspath(path)), exist_ok=True)
+        self.db = sqlite3.connect(path, timeout=LOCK_TIMEOUT)
+        self.touched = {}
+        self.db.executescript("""
+            CREATE TABLE IF NOT EXISTS meta (name TEXT PRIMARY KEY, value TEXT);
+            CREATE TABLE IF NOT EXISTS entries (
+                key TEXT PRIMARY KEY, kind TEXT, value BLOB,
+                size INTEGER, last_used REAL);
+            CREATE INDEX IF NOT EXISTS entries_lru ON entries (last_used);
+        """)
+        row = self.db.execute("SELECT value FROM meta WHERE name = 'version'").fetchone()
+        if row is None or row[0] != str(CACHE_VERSION):
+            # Results from another version may mean something else: drop them all
+            self.db.execute("DELETE FROM entries")
+            self.db.execute("INSERT OR REPLACE INTO meta VALUES ('version', ?)",
+                            (str(CACHE_VERSION),))
+            self.db.commit()
+
+    def _failed(self, operation, error):
+        """Report a database error and leave no transaction open"""
+        print(f"Reduction cache {operation} failed, continuing uncached: {error}", file=sys.stderr)
+        try:
+            self.db.rollback()
+        except sqlite3.Error:
+            pass
+
+    def get(self, kind, key):
+        """Stored arrays for a key, or None"""
+        try:
+            row = self.db.execute("SELECT value FROM entries WHERE key = ? AND kind = ?",
+                                  (key, kind)).fetchone()
+            if row is None:
+                return None
+            arrays = decode_arrays(row[0])
+        except (sqlite3.Error, ValueError, OSError) as e:
+            self._failed('read', e)
+            return None
+        self.touched[key] = time.time()
+        if len(self.touched) >= TOUCH_BATCH:
+            self.flush()
+        return arrays
+
+    def put(self, kind, key, arrays):
+        """Store a list of arrays, evicting the least recently used entries if needed"""
+        blob = encode_arrays(arrays)
+        try:
+            self._write_touches()
+            self.db.execute("INSERT OR REPLACE INTO entries VALUES (?, ?, ?, ?, ?)",
+                            (key, kind, blob, len(blob), time.time()))
+            self.evict()
+            self.db.commit()
+        except sqlite3.Error as e:
+            self._failed('write', e)
+
+    def _write_touches(self):
+        touched, self.touched = self.touched, {}
+        self.db.executemany("UPDATE entries SET last_used = ? WHERE key = ?",
+                            [(when, key) for key, when in touched.items()])
+
+    def flush(self):
+        """Write the pending last_used updates"""
+        if not self.touched:
+            return
+        try:
+            self._write_touches()
+            self.db.commit()
+        except sqlite3.Error as e:
+            self._failed('update', e)
+
+    def evict(self):
+        total = self.db.execute("SELECT COALESCE(SUM(size), 0) FROM entries").fetchone()[0]
+        if total <= self.max_bytes:
+            return
+        # Trim to 90% of the bound so eviction does not run on every insert
+        target = total - int(self.max_bytes * 0.9)
+        freed = 0
+        doomed = []
+        for key, size in self.db.execute("SELECT key, size FROM entries ORDER BY last_used"):
+            if freed >= target:
+                break
+            doomed.append((key,))
+            freed += size
+        self.db.executemany("DELETE FROM entries WHERE key = ?", doomed)
+
+    def clear(self):
+        self.touched.clear()
+        try:
+            self.db.execute("DELETE FROM entries")
+            self.db.commit()
+        except sqlite3.Error as e:
+            self._failed('clear', e)
+
+    def close(self):
+        self.flush()
+        self.db.close()
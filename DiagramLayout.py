@@ -0,0 +1,190 @@
+"""Layered (Sugiyama-style) automatic layout for block diagrams.
+
+The layout itself only sees plain node ids and (source, target) pairs, so it
+can run on a worker thread while the scene stays untouched; the editor
+applies the returned positions in one batched update.
+
+Steps: break cycles by reversing DFS back edges, assign layers by longest
+path, insert dummy nodes on edges that span several layers, reduce crossings
+with alternating barycenter sweeps (keeping the ordering with the fewest
+crossings seen), then place layers left to right in
+signal-flow order.
+"""
+from bisect import bisect_right, insort
+
+from PyQt5.QtCore import QThread, pyqtSignal
+
+# Distance between layers (x) and between blocks in a layer (y)
+LAYER_SPACING = 220
+NODE_SPACING = 130
+BARYCENTER_SWEEPS = 6
+
+
+def remove_cycles(nodes, edges):
+    """Edges with DFS back edges reversed, so the graph becomes acyclic"""
+    succ = {n: [] for n in nodes}
+    for src, dst in edges:
+        if src != dst:
+            succ[src].append(dst)
+    state = {}
+    back = set()
+    for root in nodes:
+        if root in state:
+            continue
+        state[root] = 'active'
+        stack = [(root, iter(succ[root]))]
+        while stack:
+            node, children = stack[-1]
+            for child in children:
+                if state.get(child) == 'active':
+                    back.add((node, child))
+                elif child not in state:
+                    state[child] = 'active'
+                    stack.append((child, iter(succ[child])))
+                    break
+            else:
+                state[node] = 'done'
+                stack.pop()
+    dag = []
+    for src, dst in edges:
+        if src == dst:
+            continue
+        dag.append((dst, src) if (src, dst) in back else (src, dst))
+    return dag
+
+
+def assign_layers(nodes, dag_edges):
+    """Longest-path layering: every edge points to a later layer"""
+    succ = {n: [] for n in nodes}
+    indegree = {n: 0 for n in nodes}
+    for src, dst in dag_edges:
+        succ[src].append(dst)
+        indegree[dst] += 1
+    layer = {n: 0 for n in nodes}
+    ready = [n for n in nodes if indegree[n] == 0]
+    while ready:
+        node = ready.pop()
+        for dst in succ[node]:
+            layer[dst] = max(layer[dst], layer[node] + 1)
+            indegree[dst] -= 1
+            if indegree[dst] == 0:
+                ready.append(dst)
+    return layer
+
+
+def build_layers(nodes, dag_edges, layer):
+    """Layer lists plus up/down neighbour maps, with dummies on long edges"""
+    up = {n: [] for n in nodes}
+    down = {n: [] for n in nodes}
+    layer = dict(layer)
+    dummies = []
+    for src, dst in dag_edges:
+        previous = src
+        for level in range(layer[src] + 1, layer[dst]):
+            node = ('dummy', len(dummies))
+            dummies.append(node)
+            layer[node] = level
+            up[node] = []
+            down[node] = []
+            down[previous].append(node)
+            up[node].append(previous)
+            previous = node
+        down[previous].append(dst)
+        up[dst].append(previous)
+
+    layers = [[] for _ in range(max(layer.values(), default=-1) + 1)]
+    for node in nodes + dummies:
+        layers[layer[node]].append(node)
+    return layers, up, down
+
+
+def order_layers(layers, up, down, sweeps=BARYCENTER_SWEEPS):
+    """Reorder every layer by the barycenter of its neighbours, sweeping both ways
+
+    A sweep can make things worse, so the ordering with the fewest crossings
+    is kept, and sweeping stops once there are none.
+    """
+    position = {}
+    for nodes in layers:
+        for index, node in enumerate(nodes):
+            position[node] = index
+
+    def reorder(nodes, neighbours):
+        def key(node):
+            adjacent = neighbours[node]
+            if not adjacent:
+                return position[node]
+            return sum(position[n] for n in adjacent) / len(adjacent)
+        nodes.sort(key=key)
+        for index, node in enumerate(nodes):
+            position[node] = index
+
+    best = count_crossings(layers, down)
+    best_layers = [list(nodes) for nodes in layers]
+    for sweep in range(sweeps):
+        if best == 0:
+            break
+        if sweep % 2 == 0:
+            for nodes in layers[1:]:
+                reorder(nodes, up)
+        else:
+            for nodes in reversed(layers[:-1]):
+                reorder(nodes, down)
+        crossings = count_crossings(layers, down)
+        if crossings < best:
+            best = crossings
+            best_layers = [list(nodes) for nodes in layers]
+    layers[:] = best_layers
+    return layers
+
+
+def count_crossings(layers, down):
+    """Number of edge crossings between consecutive layers"""
+    crossings = 0
+    for upper, lower in zip(layers, layers[1:]):
+        position = {node: index for index, node in enumerate(lower)}
+        targets = []
+        for node in upper:
+            targets.extend(sorted(position[n] for n in down[node] if n in position))
+        # Crossings are the inversions of the target sequence
+        seen = []
+        for target in targets:
+            crossings += len(seen) - bisect_right(seen, target)
+            insort(seen, target)
+    return crossings
+
+
+def layered_layout(nodes, edges, layer_spacing=LAYER_SPACING, node_spacing=NODE_SPACING):
+    """Positions {node: (x, y)} laying the diagram out in signal-flow layers"""
+    nodes = list(nodes)
+    if not nodes:
+        return {}
+    dag = remove_cycles(nodes, edges)
+    layer = assign_layers(nodes, dag)
+    layers, up, down = build_layers(nodes, dag, layer)
+    order_layers(layers, up, down)
+
+    positions = {}
+    for level, members in enumerate(layers):
+        offset = (len(members) - 1) * node_spacing / 2
+        for index, node in enumerate(members):
+            if node in layer:
+                positions[node] = (level * layer_spacing, index * node_spacing - offset)
+    return positions
+
+
+class LayoutWorker(QThread):
+    """Computes a layered layout off the GUI thread"""
+    layout_ready = pyqtSignal(object)
+    layout_failed = pyqtSignal(str)
+
+    def __init__(self, nodes, edges, parent=None):
+        super().__init__(parent)
+        self.nodes = list(nodes)
+        self.edges = list(edges)
+
+    def run(self):
+        try:
+            self.layout_ready.emit(layered_layout(self.nodes, self.edges))
+        except Exception as e:
+            self.layout_failed.emit(str(e))
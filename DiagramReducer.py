@@ -0,0 +1,500 @@
+"""Signal-flow graph reduction for the block diagram editors.
+
+The reduction works only on plain NumPy coefficient arrays so it can run in
+worker processes without importing Qt or python-control.  Every edge gain is
+a rational function stored as a ``(num, den)`` pair of coefficient arrays,
+highest power first (the same convention as ``np.polymul`` and ``control.tf``).
+
+Gains may instead be ``Zpk`` objects (zeros, poles and a gain factor).  Series
+products of two of them only concatenate roots, so long cascades stay linear
+in their order and keep their roots exact; coefficients are expanded only
+where a sum or a loop closure needs them, and for the final result.
+"""
+import os
+from concurrent.futures import ProcessPoolExecutor
+
+import numpy as np
+
+from DiagramCache import graph_key, group_key
+
+# Graphs with fewer eliminable nodes than this are reduced in-process, the
+# pool round trip costs more than the work itself
+PARALLEL_MIN_NODES = 64
+# Groups smaller than this are never shipped to a worker on their own
+PARALLEL_MIN_GROUP = 4
+
+_pool = None
+_pool_workers = None
+
+
+def poly_trim(p):
+    """Strip leading zero coefficients, keeping at least one coefficient"""
+    p = np.atleast_1d(np.asarray(p, dtype=float))
+    nonzero = np.flatnonzero(p)
+    if len(nonzero) == 0:
+        return np.zeros(1)
+    return p[nonzero[0]:]
+
+
+def rat(num, den=1.0):
+    """Build a normalized rational gain from coefficient sequences"""
+    num = poly_trim(num)
+    den = poly_trim(den)
+    if not den.any():
+        raise ValueError("Transfer function with zero denominator")
+    lead = den[0]
+    return num / lead, den / lead
+
+
+# Relative distance under which a zero and a pole of a product cancel
+ZPK_CANCEL_TOL = 1e-9
+
+
+class Zpk:
+    """Rational gain kept factored as zeros, poles and a gain factor"""
+    def __init__(self, zeros, poles, gain):
+        self.zeros = np.asarray(zeros, dtype=complex)
+        self.poles = np.asarray(poles, dtype=complex)
+        self.gain = float(gain)
+
+    @classmethod
+    def from_rat(cls, g):
+        num, den = rat(*g)
+        if not num.any():
+            return cls([], [], 0.0)
+        return cls(np.roots(num), np.roots(den), num[0])
+
+
+def as_rat(g):
+    """Coefficient form of a gain, expanding a ``Zpk`` if needed"""
+    if not isinstance(g, Zpk):
+        return g
+    return rat(g.gain * np.real(np.poly(g.zeros)), np.real(np.poly(g.poles)))
+
+
+def _cancel(zeros, poles):
+    """Drop zero/pole pairs that coincide"""
+    if not len(zeros) or not len(poles):
+        return zeros, poles
+    distance = np.abs(zeros[:, None] - poles[None, :])
+    close = distance <= ZPK_CANCEL_TOL * np.maximum(1.0, np.abs(poles))[None, :]
+    if not close.any():
+        return zeros, poles
+    keep_zeros = np.ones(len(zeros), dtype=bool)
+    keep_poles = np.ones(len(poles), dtype=bool)
+    for i, j in zip(*np.nonzero(close)):
+        if keep_zeros[i] and keep_poles[j]:
+            keep_zeros[i] = keep_poles[j] = False
+    return zeros[keep_zeros], poles[keep_poles]
+
+
+def zpk_mul(a, b):
+    """Series product of two ``Zpk`` gains, cancelling shared zeros and poles"""
+    if a.gain == 0 or b.gain == 0:
+        return Zpk([], [], 0.0)
+    # Like rat_mul, only cross pairs cancel: a loop closure puts one factor's
+    # denominator into the other's numerator
+    a_zeros, b_poles = _cancel(a.zeros, b.poles)
+    b_zeros, a_poles = _cancel(b.zeros, a.poles)
+    return Zpk(np.concatenate([a_zeros, b_zeros]), np.concatenate([a_poles, b_poles]),
+               a.gain * b.gain)
+
+
+def rat_is_zero(g):
+    if isinstance(g, Zpk):
+        return g.gain == 0
+    return not g[0].any()
+
+
+def _proportional(p, q):
+    """True when two nonzero polynomials differ only by a constant factor"""
+    if len(p) != len(q) or len(p) < 2 or not p[0] or not q[0]:
+        return False
+    return np.allclose(p * (q[0] / p[0]), q, rtol=1e-12, atol=0.0)
+
+
+def rat_mul(a, b):
+    """Series product of two rational gains
+
+    A denominator that reappears as the other factor's numerator is cancelled
+    right away, which is what happens every time a loop is closed.
+    """
+    if isinstance(a, Zpk) and isinstance(b, Zpk):
+        return zpk_mul(a, b)
+    a, b = as_rat(a), as_rat(b)
+    if _proportional(a[1], b[0]):
+        return rat(a[0] * (b[0][0] / a[1][0]), b[1])
+    if _proportional(b[1], a[0]):
+        return rat(b[0] * (a[0][0] / b[1][0]), a[1])
+    return rat(np.polymul(a[0], b[0]), np.polymul(a[1], b[1]))
+
+
+def rat_add(a, b):
+    """Sum of two rational gains, reusing the denominator when it is shared"""
+    if rat_is_zero(a):
+        return b
+    if rat_is_zero(b):
+        return a
+    a, b = as_rat(a), as_rat(b)
+    if len(a[1]) == len(b[1]) and np.array_equal(a[1], b[1]):
+        return rat(np.polyadd(a[0], b[0]), a[1])
+    num = np.polyadd(np.polymul(a[0], b[1]), np.polymul(b[0], a[1]))
+    return rat(num, np.polymul(a[1], b[1]))
+
+
+def rat_loop(g):
+    """Closed form of a self loop: 1 / (1 - g)"""
+    g = as_rat(g)
+    den = np.polysub(g[1], g[0])
+    if not poly_trim(den).any():
+        raise ValueError("Algebraic loop with unity loop gain cannot be solved")
+    return rat(g[1], den)
+
+
+class SignalFlowGraph:
+    """Directed graph of signals with rational edge gains
+
+    The gain algebra is looked up on the class, so a subclass can reduce
+    graphs of another kind of gain with the same elimination.
+    """
+    add_gains = staticmethod(rat_add)
+    mul_gains = staticmethod(rat_mul)
+    close_loop = staticmethod(rat_loop)
+
+    def __init__(self):
+        self.succ = {}
+        self.pred = {}
+
+    def add_node(self, node):
+        self.succ.setdefault(node, {})
+        self.pred.setdefault(node, {})
+
+    def add_edge(self, src, dst, gain):
+        """Add a gain between two nodes, merging with any parallel edge"""
+        self.add_node(src)
+        self.add_node(dst)
+        if dst in self.succ[src]:
+            gain = self.add_gains(self.succ[src][dst], gain)
+        self.succ[src][dst] = gain
+        self.pred[dst][src] = gain
+
+    def remove_node(self, node):
+        for dst in self.succ.pop(node, {}):
+            if dst != node:
+                del self.pred[dst][node]
+        for src in self.pred.pop(node, {}):
+            if src != node:
+                del self.succ[src][node]
+
+    def copy(self):
+        """Independent copy of the graph structure (gains are never mutated)"""
+        other = type(self)()
+        other.succ = {node: dict(out) for node, out in self.succ.items()}
+        other.pred = {node: dict(inc) for node, inc in self.pred.items()}
+        return other
+
+    def nodes(self):
+        return list(self.succ)
+
+    def edges(self):
+        return [(src, dst, gain) for src, out in self.succ.items()
+                for dst, gain in out.items()]
+
+    def zero_gain(self):
+        return np.zeros(1), np.ones(1)
+
+    def gain(self, src, dst):
+        gain = self.succ.get(src, {}).get(dst)
+        return self.zero_gain() if gain is None else gain
+
+    def eliminate(self, node):
+        """Remove a node, rerouting every in/out path pair through it"""
+        loop = self.succ[node].get(node)
+        incoming = [(src, g) for src, g in self.pred[node].items() if src != node]
+        outgoing = [(dst, g) for dst, g in self.succ[node].items() if dst != node]
+        self.remove_node(node)
+
+        factor = self.close_loop(loop) if loop is not None else None
+        for src, g_in in incoming:
+            if factor is not None:
+                g_in = self.mul_gains(g_in, factor)
+            for dst, g_out in outgoing:
+                self.add_edge(src, dst, self.mul_gains(g_in, g_out))
+
+    def eliminate_all(self, keep):
+        """Eliminate every node outside ``keep``, cheapest fill-in first"""
+        keep = set(keep)
+        remaining = [n for n in self.succ if n not in keep]
+        while remaining:
+            node = min(remaining, key=lambda n: len(self.pred[n]) * len(self.succ[n]))
+            remaining.remove(node)
+            self.eliminate(node)
+
+
+def _components(graph, candidates):
+    """Connected groups of candidate nodes, ignoring edge direction"""
+    candidates = set(candidates)
+    seen = set()
+    groups = []
+    for start in candidates:
+        if start in seen:
+            continue
+        seen.add(start)
+        group = [start]
+        stack = [start]
+        while stack:
+            node = stack.pop()
+            for other in list(graph.succ[node]) + list(graph.pred[node]):
+                if other in candidates and other not in seen:
+                    seen.add(other)
+                    group.append(other)
+                    stack.append(other)
+        groups.append(group)
+    return groups
+
+
+def strong_components(graph):
+    """Tarjan's strongly connected components (iterative)"""
+    index = {}
+    low = {}
+    on_stack = set()
+    stack = []
+    result = []
+    counter = 0
+    for root in graph.succ:
+        if root in index:
+            continue
+        work = [(root, iter(graph.succ[root]))]
+        index[root] = low[root] = counter
+        counter += 1
+        stack.append(root)
+        on_stack.add(root)
+        while work:
+            node, children = work[-1]
+            advanced = False
+            for child in children:
+                if child not in index:
+                    index[child] = low[child] = counter
+                    counter += 1
+                    stack.append(child)
+                    on_stack.add(child)
+                    work.append((child, iter(graph.succ[child])))
+                    advanced = True
+                    break
+                if child in on_stack:
+                    low[node] = min(low[node], index[child])
+            if advanced:
+                continue
+            work.pop()
+            if work:
+                parent = work[-1][0]
+                low[parent] = min(low[parent], low[node])
+            if low[node] == index[node]:
+                component = []
+                while True:
+                    member = stack.pop()
+                    on_stack.discard(member)
+                    component.append(member)
+                    if member == node:
+                        break
+                result.append(component)
+    return result
+
+
+def branch_groups(graph, keep):
+    """Independent series branches: runs of single-input single-output nodes"""
+    keep = set(keep)
+    chain = [n for n in graph.succ if n not in keep
+             and len(graph.pred[n]) <= 1 and len(graph.succ[n]) <= 1]
+    return _components(graph, chain)
+
+
+def subsystem_groups(graph, keep):
+    """Independent subsystems: loop interiors that only touch their own loop"""
+    keep = set(keep)
+    interior = []
+    for component in strong_components(graph):
+        if len(component) < 2:
+            continue
+        members = set(component)
+        for node in component:
+            if node in keep:
+                continue
+            neighbours = set(graph.succ[node]) | set(graph.pred[node])
+            if neighbours <= members:
+                interior.append(node)
+    return _components(graph, interior)
+
+
+def _group_payload(graph, group):
+    """Compact coefficient payload of the edges touching a node group"""
+    members = set(group)
+    edges = []
+    for node in group:
+        for dst, gain in graph.succ[node].items():
+            edges.append((node, dst, *as_rat(gain)))
+        for src, gain in graph.pred[node].items():
+            if src not in members:
+                edges.append((src, node, *as_rat(gain)))
+    return list(group), edges
+
+
+def eliminate_group(nodes, edges):
+    """Worker task: eliminate ``nodes`` and return the boundary edges left over"""
+    sub = SignalFlowGraph()
+    for src, dst, num, den in edges:
+        sub.add_edge(src, dst, (num, den))
+    boundary = set(sub.succ) - set(nodes)
+    sub.eliminate_all(boundary)
+    return [(src, dst, num, den) for src, dst, (num, den) in sub.edges()]
+
+
+def pack_edges(edges, label):
+    """Encode (src, dst, num, den) edges as two arrays for the result cache"""
+    index = np.array([(label[src], label[dst], len(num), len(den))
+                      for src, dst, num, den in edges], dtype=np.int64).reshape(-1, 4)
+    coefficients = [np.concatenate([num, den]) for _, _, num, den in edges]
+    return [index, np.concatenate(coefficients) if coefficients else np.zeros(0)]
+
+
+def unpack_edges(arrays, nodes):
+    """Inverse of ``pack_edges``, mapping labels back through ``nodes``"""
+    index, coefficients = arrays
+    edges = []
+    offset = 0
+    for src, dst, n_num, n_den in index.tolist():
+        num = coefficients[offset:offset + n_num]
+        den = coefficients[offset + n_num:offset + n_num + n_den]
+        offset += n_num + n_den
+        edges.append((nodes[src], nodes[dst], num, den))
+    return edges
+
+
+def _warm_worker():
+    """Pool initializer: pay the NumPy import and first-call cost up front"""
+    np.polymul(np.ones(2), np.ones(2))
+
+
+def get_pool(max_workers=None):
+    """Shared pool of warm reduction workers, created on first use"""
+    global _pool, _pool_workers
+    if max_workers is None:
+        max_workers = os.cpu_count() or 1
+    if _pool is None or _pool_workers != max_workers:
+        shutdown_pool()
+        _pool = ProcessPoolExecutor(max_workers=max_workers, initializer=_warm_worker)
+        _pool_workers = max_workers
+    return _pool
+
+
+def shutdown_pool():
+    global _pool, _pool_workers
+    if _pool is not None:
+        _pool.shutdown(wait=False, cancel_futures=True)
+    _pool = None
+    _pool_workers = None
+
+
+class ParallelReducer:
+    """Reduces independent branches and subsystems concurrently
+
+    Groups of eliminable nodes that share no edge with each other can be
+    eliminated independently; their contributions to the boundary edges simply
+    add up.  Each round finds such groups, ships their coefficients to the pool
+    and merges the returned boundary edges back into the graph.
+    """
+    def __init__(self, max_workers=None, min_nodes=PARALLEL_MIN_NODES, cache=None):
+        self.max_workers = max_workers
+        self.min_nodes = min_nodes
+        self.cache = cache
+
+    def reduce(self, graph, keep):
+        keep = set(keep)
+        workers = self.max_workers or os.cpu_count() or 1
+        if len(graph.succ) - len(keep) >= self.min_nodes and workers > 1:
+            for find_groups in (branch_groups, subsystem_groups):
+                groups = [g for g in find_groups(graph, keep) if len(g) >= PARALLEL_MIN_GROUP]
+                if len(groups) > 1:
+                    self._run_round(graph, groups)
+        graph.eliminate_all(keep)
+        return graph
+
+    def _run_round(self, graph, groups):
+        payloads = [_group_payload(graph, group) for group in groups]
+        pool = None
+        results = []
+        for nodes, edges in payloads:
+            key, label = group_key(nodes, edges) if self.cache is not None else (None, None)
+            cached = self.cache.get('group', key) if key is not None else None
+            if cached is not None:
+                results.append((unpack_edges(cached, list(label)), None, None))
+                continue
+            pool = pool or get_pool(self.max_workers)
+            results.append((None, pool.submit(eliminate_group, nodes, edges), (key, label)))
+
+        for (nodes, _), (boundary_edges, future, cache_entry) in zip(payloads, results):
+            if future is not None:
+                boundary_edges = future.result()
+                key, label = cache_entry
+                if key is not None:
+                    self.cache.put('group', key, pack_edges(boundary_edges, label))
+            # Only edges touching the group were shipped, so what comes back
+            # is purely the group's contribution to the boundary
+            for node in nodes:
+                graph.remove_node(node)
+            for src, dst, num, den in boundary_edges:
+                graph.add_edge(src, dst, (num, den))
+
+
+def reduce_graph(graph, source, sink, parallel=True, max_workers=None, cache=None):
+    """Transfer function from ``source`` to ``sink`` as a ``(num, den)`` pair
+
+    With a ``ReductionCache`` the whole graph and every subsystem sent to the
+    workers are looked up first and stored afterwards.
+    """
+    key = None
+    if cache is not None:
+        key = graph_key(graph, source, sink)
+        cached = cache.get('transfer', key)
+        if cached is not None:
+            return tuple(cached)
+    gain = _reduce(graph, source, sink, parallel, max_workers, cache)
+    if key is not None:
+        cache.put('transfer', key, list(gain))
+    return gain
+
+
+def _reduce(graph, source, sink, parallel, max_workers, cache):
+    if parallel:
+        ParallelReducer(max_workers, cache=cache).reduce(graph, {source, sink})
+    else:
+        graph.eliminate_all({source, sink})
+    gain = graph.gain(source, sink)
+    loop = graph.succ.get(sink, {}).get(sink)
+    if loop is not None:
+        gain = graph.mul_gains(gain, graph.close_loop(loop))
+    return as_rat(gain)
+
+
+def reduce_matrix(graph, sources, sinks, parallel=True, max_workers=None):
+    """Transfer functions from every source to every sink, in one elimination
+
+    Each sink gets a probe node fed by a unity edge, then every node except
+    the sources and probes is eliminated once, so all pairs share the same
+    factorization and loop closures.  Signals fed back into a source are
+    ignored, as in ``reduce_graph``.  Returns rows of ``(num, den)`` pairs,
+    one row per sink.
+    """
+    for source in sources:
+        for src in list(graph.pred[source]):
+            del graph.succ[src][source]
+        graph.pred[source] = {}
+    probes = [('probe', sink) for sink in sinks]
+    for sink, probe in zip(sinks, probes):
+        graph.add_edge(sink, probe, rat([1.0]))
+    keep = set(sources) | set(probes)
+    if parallel:
+        ParallelReducer(max_workers).reduce(graph, keep)
+    else:
+        graph.eliminate_all(keep)
+    return [[as_rat(graph.gain(source, probe)) for source in sources] for probe in probes]
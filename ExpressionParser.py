@@ -0,0 +1,291 @@
+"""Transfer function expressions parsed straight to polynomial coefficients.
+
+Expressions are rational functions of one variable (``s``, or ``z`` for
+discrete blocks) written with ``+ - * /``, ``^`` or ``**`` powers and
+parentheses.  Multiplication may be implicit (``2s``, ``3(s+1)``,
+``(s+1)(s+2)``), numbers may use scientific notation (``1e-3``) and
+imaginary literals (``2j``) so complex-conjugate factors can be written out.
+Two functions build a system from coefficient lists:
+
+    tf([1, 2], [1, 3, 2])               numerator and denominator, highest power first
+    zpk([-1], [-2, -3+1j, -3-1j], 5)    zeros, poles and gain
+
+The tokenizer makes one pass over the text and the recursive-descent parser
+one pass over the tokens.  Values are (num, den) NumPy arrays combined with
+polynomial products, so there is no Python ``eval`` and no intermediate
+TransferFunction per operator.  Errors carry the offset of the bad token.
+"""
+import re
+
+import numpy as np
+
+_TOKEN = re.compile(r"""
+    (?P<number>(?:\d+\.?\d*|\.\d+)(?:[eE][+-]?\d+)?j?)
+  | (?P<name>[A-Za-z_]\w*)
+  | (?P<op>\*\*|[-+*/^()\[\],])
+""", re.VERBOSE)
+
+# Imaginary parts below this (relative to the largest coefficient) are rounding
+IMAG_TOL = 1e-9
+
+_ONE = np.ones(1)
+
+
+class ExpressionError(ValueError):
+    """A malformed expression, with the 0-based offset of the problem"""
+    def __init__(self, position, message):
+        super().__init__(f"column {position + 1}: {message}")
+        self.position = position
+
+    def pointer(self, text):
+        """The expression with a caret line under the offending character"""
+        return f"{text}\n{' ' * self.position}^"
+
+
+def tokenize(text):
+    """List of (kind, value, position) tokens ending with an 'end' token"""
+    tokens = []
+    position = 0
+    length = len(text)
+    while True:
+        while position < length and text[position].isspace():
+            position += 1
+        if position == length:
+            break
+        match = _TOKEN.match(text, position)
+        if match is None:
+            raise ExpressionError(position, f"unexpected character '{text[position]}'")
+        tokens.append((match.lastgroup, match.group(), position))
+        position = match.end()
+    tokens.append(('end', None, length))
+    return tokens
+
+
+def _trim(p):
+    nonzero = np.flatnonzero(p)
+    return p[nonzero[0]:] if len(nonzero) else p[-1:]
+
+
+def _constant(value):
+    return np.array([value]), _ONE
+
+
+# np.convolve and padded sums instead of np.polymul/np.polyadd, which wrap
+# every operand in a poly1d and dominate the cost on long expressions
+def _polyadd(a, b):
+    if len(a) < len(b):
+        a, b = b, a
+    total = a.astype(np.result_type(a, b))
+    total[len(a) - len(b):] += b
+    return total
+
+
+def _add(a, b):
+    if len(a[1]) == len(b[1]) and np.array_equal(a[1], b[1]):
+        return _trim(_polyadd(a[0], b[0])), a[1]
+    return (_trim(_polyadd(np.convolve(a[0], b[1]), np.convolve(b[0], a[1]))),
+            np.convolve(a[1], b[1]))
+
+
+def _mul(a, b):
+    return np.convolve(a[0], b[0]), np.convolve(a[1], b[1])
+
+
+class ExpressionParser:
+    """Recursive descent over the token list; one method per precedence level
+
+    Values are combined only through the arithmetic methods below, so a
+    subclass can parse into another kind of value.
+    """
+    def __init__(self, text, variable):
+        self.text = text
+        self.variable = variable
+        self.tokens = tokenize(text)
+        self.index = 0
+
+    def add(self, a, b):
+        return _add(a, b)
+
+    def mul(self, a, b):
+        return _mul(a, b)
+
+    def negate(self, value):
+        return -value[0], value[1]
+
+    def invert(self, value):
+        return value[1], value[0]
+
+    def is_zero(self, value):
+        return not np.any(value[0])
+
+    def one(self):
+        return _ONE, _ONE
+
+    def number(self, text):
+        return _constant(complex(text) if text.endswith('j') else float(text))
+
+    def symbol(self, text, position):
+        """Value of a name that is not a function call"""
+        if text == self.variable:
+            return np.array([1.0, 0.0]), _ONE
+        raise ExpressionError(position, f"unknown name '{text}' (the variable is "
+                                        f"'{self.variable}')")
+
+    def peek(self):
+        return self.tokens[self.index]
+
+    def take(self):
+        token = self.tokens[self.index]
+        self.index += 1
+        return token
+
+    def expect(self, value):
+        kind, text, position = self.take()
+        if text != value:
+            raise ExpressionError(position, f"expected '{value}'" +
+                                  (f", found '{text}'" if kind != 'end' else ""))
+
+    def unexpected(self, token):
+        kind, text, position = token
+        if kind == 'end':
+            return ExpressionError(position, "unexpected end of expression")
+        return ExpressionError(position, f"unexpected '{text}'")
+
+    def parse(self):
+        value = self.expression()
+        if self.peek()[0] != 'end':
+            raise self.unexpected(self.peek())
+        return value
+
+    def expression(self):
+        value = self.term()
+        while self.peek()[1] in ('+', '-'):
+            sign = self.take()[1]
+            other = self.term()
+            value = self.add(value, other if sign == '+' else self.negate(other))
+        return value
+
+    def term(self):
+        value = self.unary()
+        while True:
+            kind, text, position = self.peek()
+            if text in ('*', '/'):
+                self.take()
+                other = self.unary()
+                if text == '/':
+                    if self.is_zero(other):
+                        raise ExpressionError(position, "division by zero")
+                    other = self.invert(other)
+                value = self.mul(value, other)
+            elif kind == 'name' or text == '(':
+                # Implicit multiplication: 2s, s(s+1), (s+1)(s+2)
+                value = self.mul(value, self.unary())
+            else:
+                return value
+
+    def unary(self):
+        if self.peek()[1] in ('+', '-'):
+            sign = self.take()[1]
+            value = self.unary()
+            return value if sign == '+' else self.negate(value)
+        return self.power()
+
+    def power(self):
+        base = self.atom()
+        if self.peek()[1] not in ('^', '**'):
+            return base
+        position = self.take()[2] + 1
+        exponent = self.constant(self.unary(), position)
+        if exponent.imag != 0 or exponent.real != int(exponent.real):
+            raise ExpressionError(position, "exponent must be an integer")
+        exponent = int(exponent.real)
+        if exponent < 0:
+            if self.is_zero(base):
+                raise ExpressionError(position, "division by zero")
+            base, exponent = self.invert(base), -exponent
+        result = self.one()
+        for _ in range(exponent):
+            result = self.mul(result, base)
+        return result
+
+    def atom(self):
+        kind, text, position = self.take()
+        if kind == 'number':
+            return self.number(text)
+        if text == '(':
+            value = self.expression()
+            self.expect(')')
+            return value
+        if kind == 'name':
+            if text == 'tf' and self.peek()[1] == '(':
+                return self.tf_call()
+            if text == 'zpk' and self.peek()[1] == '(':
+                return self.zpk_call()
+            return self.symbol(text, position)
+        raise self.unexpected((kind, text, position))
+
+    def constant(self, value, position):
+        """Scalar of a value that must not depend on the variable"""
+        num, den = value
+        if len(num) > 1 or len(den) > 1:
+            raise ExpressionError(position, f"expected a constant, not a function of "
+                                            f"'{self.variable}'")
+        return complex(num[0] / den[0])
+
+    def coefficient(self, value, position):
+        """List entry of tf() or zpk(); a constant here"""
+        return self.constant(value, position)
+
+    def number_list(self):
+        self.expect('[')
+        values = []
+        if self.peek()[1] == ']':
+            self.take()
+            return values
+        while True:
+            position = self.peek()[2]
+            values.append(self.coefficient(self.expression(), position))
+            kind, text, position = self.take()
+            if text == ']':
+                return values
+            if text != ',':
+                raise ExpressionError(position, "expected ',' or ']'")
+
+    def tf_call(self):
+        self.expect('(')
+        num = np.array(self.number_list())
+        self.expect(',')
+        position = self.peek()[2]
+        den = np.array(self.number_list())
+        self.expect(')')
+        if not np.any(den):
+            raise ExpressionError(position, "denominator is zero")
+        return _trim(num) if len(num) else np.zeros(1), _trim(den)
+
+    def zpk_call(self):
+        self.expect('(')
+        zeros = self.number_list()
+        self.expect(',')
+        poles = self.number_list()
+        self.expect(',')
+        position = self.peek()[2]
+        gain = self.constant(self.expression(), position)
+        self.expect(')')
+        return gain * np.atleast_1d(np.poly(zeros)), np.atleast_1d(np.poly(poles))
+
+
+def _real(p):
+    p = np.asarray(p)
+    if np.iscomplexobj(p):
+        scale = max(np.abs(p).max(), 1.0)
+        if np.abs(p.imag).max() > IMAG_TOL * scale:
+            raise ExpressionError(0, "coefficients are not real; complex roots "
+                                     "must come in conjugate pairs")
+        p = p.real
+    return np.asarray(p, dtype=float)
+
+
+def parse_coefficients(text, variable='s'):
+    """(num, den) float arrays, highest power first, of an expression in ``variable``"""
+    num, den = ExpressionParser(text, variable).parse()
+    return _real(num), _real(den)
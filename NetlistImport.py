@@ -0,0 +1,111 @@
+"""Plain-text netlist format for machine-generated block diagrams.
+
+One statement per line; blank lines and ``#`` comments are ignored:
+
+    block <name> <type> [key=value ...]
+    connect <source> <target>[:input]
+
+Parameter values must not contain spaces.  Known keys are ``gain``, ``tf``
+(an expression in s, which may use named parameters, or in z for
+discrete_tf), ``ts`` (sample time), ``kp``, ``ki``, ``kd``, ``n``
+(derivative filter), ``delay`` and ``order`` (Pade order).  Inputs are
+numbered from 0; subtract blocks negate input 1.  A block must be declared
+before it is connected.  ``tf`` expressions are parsed as they are read, so
+a malformed one is reported with its line like any other bad field.
+
+    block r input
+    block e subtract
+    block G transfer_function tf=1/(s*(s+2))
+    block y output
+    connect r e
+    connect e G
+    connect G y
+    connect G e:1
+
+The parser is a generator over lines, so arbitrarily large files are read
+in one pass without holding the text in memory.
+"""
+from ExpressionParser import parse_coefficients
+from ParametricSystems import free_parameters, parse_parametric
+
+# Netlist key -> (block attribute, value converter)
+BLOCK_PARAMETERS = {
+    'gain': ('gain_value', float),
+    'tf': ('transfer_function', str),
+    'ts': ('sample_time', float),
+    'kp': ('kp', float),
+    'ki': ('ki', float),
+    'kd': ('kd', float),
+    'n': ('filter_n', float),
+    'delay': ('delay_time', float),
+    'order': ('pade_order', int),
+}
+
+
+def check_expression(block_type, text):
+    """Raise ExpressionError unless ``text`` parses as the block's transfer function"""
+    if block_type == 'discrete_tf':
+        parse_coefficients(text, 'z')
+    else:
+        parse_parametric(text, free_parameters(text))
+
+
+class NetlistError(ValueError):
+    """A malformed netlist line"""
+    def __init__(self, line_number, message):
+        super().__init__(f"line {line_number}: {message}")
+        self.line_number = line_number
+
+
+def parse_line(line_number, line, block_types):
+    """Parse one line into a ('block', ...) or ('connect', ...) record, or None"""
+    fields = line.split('#', 1)[0].split()
+    if not fields:
+        return None
+    keyword = fields[0].lower()
+    if keyword == 'block':
+        if len(fields) < 3:
+            raise NetlistError(line_number, "expected 'block <name> <type> [key=value ...]'")
+        name, block_type = fields[1], fields[2]
+        if block_type not in block_types:
+            raise NetlistError(line_number, f"unknown block type '{block_type}'")
+        params = {}
+        for field in fields[3:]:
+            key, sep, value = field.partition('=')
+            if not sep or key not in BLOCK_PARAMETERS:
+                raise NetlistError(line_number, f"bad parameter '{field}'")
+            attribute, convert = BLOCK_PARAMETERS[key]
+            try:
+                params[attribute] = convert(value)
+            except ValueError:
+                raise NetlistError(line_number, f"bad value for '{key}': '{value}'")
+            if key == 'tf':
+                try:
+                    check_expression(block_type, value)
+                except ValueError as e:
+                    raise NetlistError(line_number, f"bad expression for 'tf' '{value}': {e}")
+        return 'block', line_number, name, block_type, params
+    if keyword == 'connect':
+        if len(fields) != 3:
+            raise NetlistError(line_number, "expected 'connect <source> <target>[:input]'")
+        target, sep, port = fields[2].partition(':')
+        try:
+            port = int(port) if sep else 0
+        except ValueError:
+            raise NetlistError(line_number, f"bad input index '{port}'")
+        return 'connect', line_number, fields[1], target, port
+    raise NetlistError(line_number, f"unknown statement '{fields[0]}'")
+
+
+def parse_netlist(lines, block_types, errors=None):
+    """Yield records for every line; bad lines go to ``errors`` (or raise)"""
+    for line_number, line in enumerate(lines, 1):
+        try:
+            record = parse_line(line_number, line, block_types)
+        except NetlistError as e:
+            if errors is None:
+                raise
+            errors.append(e)
+            continue
+        if record is not None:
+            yield record
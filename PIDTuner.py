@@ -0,0 +1,231 @@
+"""PID controller coefficients and a parallel PID auto-tuner.
+
+The tuner sees the rest of the diagram as a fixed loop model around the
+controller C(s):
+
+    T(s) = Hyr(s) + C(s) A(s) / (1 + C(s) L(s))
+
+where A is the path from the reference through the controller to the output
+and L is the loop gain seen by the controller (for a unity feedback loop
+around a plant G, Hyr = 0 and A = L = G).  Candidate gains are evaluated in
+chunks on worker processes; each chunk is screened with Routh-Hurwitz and
+simulated as one batch of step responses.
+"""
+import os
+
+import numpy as np
+
+from DiagramReducer import get_pool
+from SystemAnalysis import (batch_polymul, batch_polyadd, routh_hurwitz,
+                            batch_step_response, metrics_from_response)
+
+# Derivative filter coefficient N in Kd*N*s/(s + N)
+PID_DEFAULT_FILTER = 100.0
+
+OBJECTIVES = ['itae', 'overshoot', 'bandwidth']
+
+# Search space for log-uniform sampling of (Kp, Ki, Kd)
+DEFAULT_BOUNDS = ((1e-2, 1e2), (1e-3, 1e2), (1e-3, 1e1))
+
+# Candidates below this count are evaluated in-process
+PARALLEL_MIN_CANDIDATES = 256
+
+_trapezoid = getattr(np, 'trapezoid', None) or np.trapz
+
+
+def pid_coefficients(kp, ki, kd, n=PID_DEFAULT_FILTER):
+    """(num, den) of Kp + Ki/s + Kd*N*s/(s + N), without unused poles"""
+    if kd == 0 and ki == 0:
+        return np.array([float(kp)]), np.array([1.0])
+    if kd == 0:
+        return np.array([kp, ki], dtype=float), np.array([1.0, 0.0])
+    if ki == 0:
+        return np.array([kp + kd * n, kp * n], dtype=float), np.array([1.0, n])
+    return np.array([kp + kd * n, kp * n + ki, ki * n], dtype=float), np.array([1.0, n, 0.0])
+
+
+def pid_batch(gains, n=PID_DEFAULT_FILTER):
+    """Coefficient batches for an array of (Kp, Ki, Kd) rows, full PID form"""
+    kp, ki, kd = np.asarray(gains, dtype=float).T
+    nums = np.column_stack([kp + kd * n, kp * n + ki, ki * n])
+    dens = np.tile([1.0, n, 0.0], (len(kp), 1))
+    return nums, dens
+
+
+def _trim(p):
+    p = np.atleast_1d(np.asarray(p, dtype=float))
+    nonzero = np.flatnonzero(p)
+    return p[nonzero[0]:] if len(nonzero) else np.zeros(1)
+
+
+def _normalized(g):
+    num, den = _trim(g[0]), _trim(g[1])
+    return num / den[0], den / den[0]
+
+
+class LoopModel:
+    """Fixed parts of the closed loop around the controller, as coefficients"""
+    def __init__(self, forward, loop, direct=None, reference=None):
+        self.forward = _normalized(forward)
+        self.loop = _normalized(loop)
+        # Transfer from the reference to the controller input (unity if omitted)
+        self.reference = _normalized(reference if reference is not None else ((1.0,), (1.0,)))
+        self.direct = None
+        if direct is not None and _trim(direct[0]).any():
+            self.direct = _normalized(direct)
+        # A and L usually share the plant denominator, which then cancels
+        self.shared = (len(self.forward[1]) == len(self.loop[1]) and
+                       np.allclose(self.forward[1], self.loop[1]))
+
+        fixed_den = np.ones(1)
+        if not self.shared:
+            fixed_den = np.polymul(fixed_den, self.forward[1])
+        if self.direct is not None:
+            fixed_den = np.polymul(fixed_den, self.direct[1])
+        self.fixed_stable = bool(routh_hurwitz(fixed_den)[0][0])
+
+    @classmethod
+    def unity_feedback(cls, num, den):
+        """Loop model of C in series with a plant G under unity negative feedback"""
+        return cls((num, den), (num, den))
+
+    def payload(self):
+        """Compact picklable form for worker processes"""
+        return self.forward, self.loop, self.direct, self.shared, self.fixed_stable
+
+    def time_scale(self):
+        """Rough horizon for step responses, from the plant poles"""
+        poles = np.roots(self.loop[1])
+        magnitudes = np.abs(poles[np.abs(poles) > 1e-9])
+        slowest = magnitudes.min() if len(magnitudes) else 1.0
+        return 20.0 / slowest
+
+
+def closed_loop_batch(payload, c_nums, c_dens):
+    """Closed-loop (nums, dens, characteristic polynomials) for controller batches"""
+    (n_a, d_a), (n_l, d_l), direct, shared, _ = payload
+    char = batch_polyadd(batch_polymul(c_dens, d_l), batch_polymul(c_nums, n_l))
+    if shared:
+        nums = batch_polymul(c_nums, n_a)
+        dens = char
+    else:
+        nums = batch_polymul(batch_polymul(c_nums, n_a), d_l)
+        dens = batch_polymul(char, d_a)
+    if direct is not None:
+        n_d, d_d = direct
+        nums = batch_polyadd(batch_polymul(dens, n_d), batch_polymul(nums, d_d))
+        dens = batch_polymul(dens, d_d)
+    return nums, dens, char
+
+
+def batch_bandwidth(nums, dens, w):
+    """-3 dB bandwidth of each system, evaluated on the frequency grid ``w``"""
+    jw = 1j * np.asarray(w)
+    num_val = np.zeros((len(nums), len(w)), dtype=complex)
+    den_val = np.zeros((len(dens), len(w)), dtype=complex)
+    for column in nums.T:
+        num_val = num_val * jw + column[:, None]
+    for column in dens.T:
+        den_val = den_val * jw + column[:, None]
+    mag = np.abs(num_val / den_val)
+    dc = np.abs(nums[:, -1] / np.where(dens[:, -1] != 0, dens[:, -1], np.nan))
+    below = mag < dc[:, None] / np.sqrt(2)
+    idx = below.argmax(axis=1)
+    return np.where(below.any(axis=1), np.asarray(w)[idx], np.nan)
+
+
+def evaluate_candidates(payload, gains, settings):
+    """Worker task: objective value for every (Kp, Ki, Kd) row (inf = rejected)"""
+    filter_n = settings['filter_n']
+    c_nums, c_dens = pid_batch(gains, filter_n)
+    nums, dens, char = closed_loop_batch(payload, c_nums, c_dens)
+
+    scores = np.full(len(gains), np.inf)
+    stable = routh_hurwitz(char)[0] & payload[4]
+    if not stable.any():
+        return scores
+    nums, dens = nums[stable], dens[stable]
+    t, y, _ = batch_step_response(nums, dens, settings['n_samples'], settings['t_final'])
+    ones = np.ones(len(y), dtype=bool)
+    metrics = metrics_from_response(t, y, np.ones(len(y)), ones)
+
+    error = np.abs(1.0 - y)
+    itae = _trapezoid(t * error, t, axis=1)
+    objective = settings['objective']
+    if objective == 'itae':
+        value = itae
+    elif objective == 'overshoot':
+        value = metrics['settling_time'] + 1e-6 * itae
+    else:
+        bandwidth = batch_bandwidth(nums, dens, settings['frequencies'])
+        value = np.abs(np.log(bandwidth / settings['bandwidth'])) + 1e-6 * itae
+
+    limit = settings['overshoot_limit']
+    if limit is not None:
+        value = np.where(metrics['overshoot'] <= limit, value, np.inf)
+    scores[stable] = np.where(np.isfinite(value), value, np.inf)
+    return scores
+
+
+class PIDTuner:
+    """Random search over PID gains, evaluated in parallel batches"""
+    def __init__(self, loop_model, objective='itae', overshoot_limit=None, bandwidth=None,
+                 filter_n=PID_DEFAULT_FILTER, t_final=None, n_samples=800,
+                 bounds=DEFAULT_BOUNDS, max_workers=None, seed=0):
+        if objective not in OBJECTIVES:
+            raise ValueError(f"Unknown objective '{objective}', expected one of {OBJECTIVES}")
+        if objective == 'overshoot' and overshoot_limit is None:
+            overshoot_limit = 5.0
+        if objective == 'bandwidth' and not bandwidth:
+            raise ValueError("The bandwidth objective needs a target bandwidth (rad/s)")
+        self.loop_model = loop_model
+        self.bounds = np.log10(np.array(bounds, dtype=float))
+        self.max_workers = max_workers or os.cpu_count() or 1
+        self.rng = np.random.default_rng(seed)
+        t_final = t_final or loop_model.time_scale()
+        self.settings = {
+            'objective': objective,
+            'overshoot_limit': overshoot_limit,
+            'bandwidth': bandwidth,
+            'filter_n': filter_n,
+            'n_samples': n_samples,
+            't_final': t_final,
+            'frequencies': np.logspace(-3, 3, 400) * (bandwidth or 1.0),
+        }
+
+    def evaluate(self, gains):
+        """Scores for an array of (Kp, Ki, Kd) rows, split across the worker pool"""
+        payload = self.loop_model.payload()
+        if self.max_workers < 2 or len(gains) < PARALLEL_MIN_CANDIDATES:
+            return evaluate_candidates(payload, gains, self.settings)
+        pool = get_pool(self.max_workers)
+        chunks = np.array_split(gains, self.max_workers)
+        futures = [pool.submit(evaluate_candidates, payload, chunk, self.settings)
+                   for chunk in chunks if len(chunk)]
+        return np.concatenate([future.result() for future in futures])
+
+    def tune(self, n_candidates=2000, rounds=3):
+        """Search the gains; returns a dict with kp, ki, kd and the best score"""
+        low, high = self.bounds[:, 0], self.bounds[:, 1]
+        log_gains = self.rng.uniform(low, high, (n_candidates, 3))
+        best = None
+        best_score = np.inf
+        spread = (high - low) / 4
+        for _ in range(rounds):
+            scores = self.evaluate(10.0 ** log_gains)
+            index = int(np.argmin(scores))
+            if scores[index] < best_score:
+                best, best_score = log_gains[index], scores[index]
+            if best is None:
+                # Nothing stable yet: keep sampling the whole space
+                log_gains = self.rng.uniform(low, high, (n_candidates, 3))
+                continue
+            # Next round samples around the best candidate, more tightly
+            log_gains = np.clip(best + self.rng.normal(0, spread, (n_candidates, 3)), low, high)
+            log_gains[0] = best
+            spread = spread / 2
+
+        if best is None:
+            raise ValueError("No stabilizing PID gains found in the search range")
+        kp, ki, kd = (float(g) for g in 10.0 ** best)
+        return {'kp': kp, 'ki': ki, 'kd': kd, 'score': float(best_score)}
@@ -0,0 +1,316 @@
+"""Transfer functions whose coefficients depend on named parameters.
+
+A block expression such as ``K / (tau*s + 1)`` is parsed into a numerator and
+a denominator that are polynomials in s *and* in the parameters, stored
+sparsely as ``{(s_power, monomial): coefficient}`` dicts where a monomial is
+a sorted tuple of ``(parameter_index, power)`` pairs.  Dividing by a
+parameter multiplies the denominator, so everything stays polynomial.
+
+``ParametricFlowGraph`` reduces a diagram of such gains once, with the same
+elimination as the numeric reducer.  The closed form is then compiled by
+``ParametricTransfer`` into an exponent table and two coefficient matrices:
+evaluating it for a whole array of parameter values is an elementwise power
+and a matrix product, so a sweep or a slider never reduces the graph again.
+
+Parameter names are identifiers other than the variable; implicit products
+need a separator (``K s`` or ``K*s``, since ``Ks`` is one name).  Factors
+that only cancel for particular parameter values stay in the closed form.
+"""
+from functools import lru_cache
+
+import numpy as np
+
+from DiagramReducer import SignalFlowGraph, rat, reduce_graph
+from ExpressionParser import IMAG_TOL, ExpressionError, ExpressionParser, tokenize
+
+# Value given to a parameter that was never set
+DEFAULT_PARAMETER_VALUE = 1.0
+# Sums smaller than this, relative to their terms, are cancellations
+CANCEL_TOL = 1e-12
+
+_ONE = {(0, ()): 1.0}
+
+
+def _monomial_mul(a, b):
+    if not a:
+        return b
+    if not b:
+        return a
+    powers = dict(a)
+    for index, power in b:
+        powers[index] = powers.get(index, 0) + power
+    return tuple(sorted(powers.items()))
+
+
+def _prune(terms, magnitudes):
+    return {key: c for key, c in terms.items() if abs(c) > CANCEL_TOL * magnitudes[key]}
+
+
+def poly_mul(p, q):
+    terms = {}
+    magnitudes = {}
+    for (i, m), c in p.items():
+        for (j, n), d in q.items():
+            key = (i + j, _monomial_mul(m, n))
+            terms[key] = terms.get(key, 0) + c * d
+            magnitudes[key] = magnitudes.get(key, 0) + abs(c * d)
+    return _prune(terms, magnitudes)
+
+
+def poly_add(p, q, scale=1.0):
+    """p + scale * q"""
+    terms = dict(p)
+    magnitudes = {key: abs(c) for key, c in p.items()}
+    for key, c in q.items():
+        terms[key] = terms.get(key, 0) + scale * c
+        magnitudes[key] = magnitudes.get(key, 0) + abs(scale * c)
+    return _prune(terms, magnitudes)
+
+
+def poly_scale(p, c):
+    return {key: value * c for key, value in p.items()} if c else {}
+
+
+def _ratio(p, q):
+    """Constant c with p == c * q, or None"""
+    if not q or p.keys() != q.keys():
+        return None
+    key = next(iter(q))
+    c = p[key] / q[key]
+    for key, value in q.items():
+        if abs(p[key] - c * value) > CANCEL_TOL * abs(p[key]):
+            return None
+    return c
+
+
+def param_gain(num, den=(1.0,)):
+    """Parametric form of a numeric (num, den) gain"""
+    def terms(p):
+        p = np.atleast_1d(p)
+        return {(len(p) - 1 - i, ()): float(c) for i, c in enumerate(p) if c}
+    return terms(num), terms(den)
+
+
+def param_mul(a, b):
+    """Series product, cancelling a denominator that reappears as the other numerator"""
+    if not a[0] or not b[0]:
+        return {}, _ONE
+    c = _ratio(b[0], a[1])
+    if c is not None:
+        return poly_scale(a[0], c), b[1]
+    c = _ratio(a[0], b[1])
+    if c is not None:
+        return poly_scale(b[0], c), a[1]
+    return poly_mul(a[0], b[0]), poly_mul(a[1], b[1])
+
+
+def param_add(a, b):
+    """Sum, reusing the denominator when one is a multiple of the other"""
+    if not a[0]:
+        return b
+    if not b[0]:
+        return a
+    c = _ratio(b[1], a[1])
+    if c is not None:
+        return poly_add(b[0], a[0], c), b[1]
+    return poly_add(poly_mul(a[0], b[1]), poly_mul(b[0], a[1])), poly_mul(a[1], b[1])
+
+
+def param_loop(g):
+    """Closed form of a self loop: 1 / (1 - g)"""
+    den = poly_add(g[1], g[0], -1.0)
+    if not den:
+        raise ValueError("Algebraic loop with unity loop gain cannot be solved")
+    return g[1], den
+
+
+class ParametricFlowGraph(SignalFlowGraph):
+    """Signal-flow graph of parametric gains"""
+    add_gains = staticmethod(param_add)
+    mul_gains = staticmethod(param_mul)
+    close_loop = staticmethod(param_loop)
+
+    def zero_gain(self):
+        return {}, _ONE
+
+
+class ParametricParser(ExpressionParser):
+    """Expression parser producing parametric (num, den) values"""
+    def __init__(self, text, variable, parameters):
+        super().__init__(text, variable)
+        self.parameter_index = {name: i for i, name in enumerate(parameters)}
+
+    def add(self, a, b):
+        return param_add(a, b)
+
+    def mul(self, a, b):
+        return poly_mul(a[0], b[0]), poly_mul(a[1], b[1])
+
+    def negate(self, value):
+        return poly_scale(value[0], -1.0), value[1]
+
+    def is_zero(self, value):
+        return not value[0]
+
+    def one(self):
+        return _ONE, _ONE
+
+    def number(self, text):
+        value = complex(text) if text.endswith('j') else float(text)
+        return ({(0, ()): value} if value else {}), _ONE
+
+    def symbol(self, text, position):
+        if text == self.variable:
+            return {(1, ()): 1.0}, _ONE
+        if text in self.parameter_index:
+            return {(0, ((self.parameter_index[text], 1),)): 1.0}, _ONE
+        raise ExpressionError(position, f"unknown name '{text}'")
+
+    def constant(self, value, position):
+        num, den = value
+        if any(key != (0, ()) for key in list(num) + list(den)):
+            raise ExpressionError(position, "expected a number, not a function of "
+                                            "the variable or of a parameter")
+        return complex(num.get((0, ()), 0.0) / den[(0, ())])
+
+    def coefficient(self, value, position):
+        if any(power for power, _ in list(value[0]) + list(value[1])):
+            raise ExpressionError(position, f"expected a constant, not a function of "
+                                            f"'{self.variable}'")
+        return value
+
+    def polynomial(self, coefficients):
+        """Horner form of a coefficient list, highest power first"""
+        s = self.symbol(self.variable, 0)
+        value = {}, _ONE
+        for c in coefficients:
+            value = self.add(self.mul(value, s), c)
+        return value
+
+    def from_roots(self, roots):
+        s = self.symbol(self.variable, 0)
+        value = self.one()
+        for root in roots:
+            value = self.mul(value, self.add(s, self.negate(root)))
+        return value
+
+    def tf_call(self):
+        self.expect('(')
+        num = self.polynomial(self.number_list())
+        self.expect(',')
+        position = self.peek()[2]
+        den = self.polynomial(self.number_list())
+        self.expect(')')
+        if self.is_zero(den):
+            raise ExpressionError(position, "denominator is zero")
+        return self.mul(num, self.invert(den))
+
+    def zpk_call(self):
+        self.expect('(')
+        zeros = self.from_roots(self.number_list())
+        self.expect(',')
+        poles = self.from_roots(self.number_list())
+        self.expect(',')
+        position = self.peek()[2]
+        gain = self.coefficient(self.expression(), position)
+        self.expect(')')
+        return self.mul(gain, self.mul(zeros, self.invert(poles)))
+
+
+def _real(p):
+    scale = max([abs(c) for c in p.values()] + [1.0])
+    if any(abs(np.imag(c)) > IMAG_TOL * scale for c in p.values()):
+        raise ExpressionError(0, "coefficients are not real; complex roots "
+                                 "must come in conjugate pairs")
+    return {key: float(np.real(c)) for key, c in p.items() if np.real(c)}
+
+
+def free_parameters(text, variable='s'):
+    """Names in an expression other than the variable and tf() / zpk(), in order"""
+    tokens = tokenize(text)
+    names = []
+    for (kind, value, _), following in zip(tokens, tokens[1:]):
+        if kind != 'name' or value == variable or value in names:
+            continue
+        if value in ('tf', 'zpk') and following[1] == '(':
+            continue
+        names.append(value)
+    return tuple(names)
+
+
+def parse_parametric(text, parameters, variable='s'):
+    """Parametric (num, den) of an expression in ``variable`` and ``parameters``"""
+    num, den = ParametricParser(text, variable, parameters).parse()
+    return _real(num), _real(den)
+
+
+def _coefficient_matrix(poly, rows):
+    """(monomials, degree + 1) matrix, highest power of s first"""
+    width = max((power for power, _ in poly), default=0) + 1
+    matrix = np.zeros((len(rows), width))
+    for (power, monomial), c in poly.items():
+        matrix[rows[monomial], width - 1 - power] += c
+    return matrix
+
+
+class ParametricTransfer:
+    """Closed-form rational function of s and named parameters, compiled for NumPy"""
+    def __init__(self, parameters, num, den):
+        self.parameters = tuple(parameters)
+        self.num = num
+        self.den = den
+        monomials = sorted({m for _, m in num} | {m for _, m in den})
+        self.exponents = np.zeros((len(monomials), len(self.parameters)))
+        for row, monomial in enumerate(monomials):
+            for index, power in monomial:
+                self.exponents[row, index] = power
+        rows = {monomial: row for row, monomial in enumerate(monomials)}
+        self.num_matrix = _coefficient_matrix(num, rows)
+        self.den_matrix = _coefficient_matrix(den, rows)
+
+    def monomials(self, values):
+        """(batch, monomials) table of every monomial at arrays of parameter values"""
+        missing = [name for name in self.parameters if name not in values]
+        if missing:
+            raise ValueError(f"No value for parameter '{missing[0]}'")
+        columns = np.broadcast_arrays(*[np.atleast_1d(np.asarray(values[name], dtype=float))
+                                        for name in self.parameters])
+        table = np.ones((len(columns[0]) if columns else 1, len(self.exponents)))
+        for index, column in enumerate(columns):
+            powers = self.exponents[:, index]
+            used = powers != 0
+            if used.any():
+                table[:, used] *= column[:, None] ** powers[used]
+        return table
+
+    def evaluate(self, values):
+        """Padded (nums, dens) batches, one row per set of parameter values
+
+        ``values`` maps every parameter to a scalar or a 1-D array; arrays
+        broadcast against each other.  Each row is scaled to a monic
+        denominator, ready for the ``SystemAnalysis`` kernels.
+        """
+        table = self.monomials(values)
+        nums = table @ self.num_matrix
+        dens = table @ self.den_matrix
+        nonzero = dens != 0
+        if not nonzero.any(axis=1).all():
+            raise ValueError("The denominator vanishes for some parameter values")
+        lead = dens[np.arange(len(dens)), nonzero.argmax(axis=1)]
+        return nums / lead[:, None], dens / lead[:, None]
+
+    def at(self, values):
+        """Numeric (num, den) at one set of scalar parameter values"""
+        nums, dens = self.evaluate(values)
+        return rat(nums[0], dens[0])
+
+
+@lru_cache(maxsize=256)
+def compile_expression(text, parameters, variable='s'):
+    """Memoized ``ParametricTransfer`` of one expression"""
+    return ParametricTransfer(parameters, *parse_parametric(text, parameters, variable))
+
+
+def reduce_parametric(graph, source, sink, parameters):
+    """Compiled closed-form transfer from ``source`` to ``sink`` of a ``ParametricFlowGraph``"""
+    return ParametricTransfer(parameters, *reduce_graph(graph, source, sink, parallel=False))
@@ -0,0 +1,258 @@
+"""Real-time streaming simulation with a live rolling plot.
+
+A worker thread steps the discretized system in fixed-size chunks and pushes
+the samples into a single-producer/single-consumer ring buffer.  Continuous
+systems are sampled at ``DEFAULT_STREAM_RATE`` and stepped in state-space
+form by ``DiscreteSimulator``; at that rate the poles sit within 1e-4 of
+z = 1, where a transfer-function filter would be numerically useless.  The plot
+window drains the buffer from a QTimer and redraws only the line artists
+with matplotlib blitting, decimating the rolling window to the canvas width.
+"""
+import threading
+import time
+
+import numpy as np
+from PyQt5.QtWidgets import (QWidget, QVBoxLayout, QHBoxLayout, QLabel,
+                             QPushButton, QComboBox)
+from PyQt5.QtCore import QTimer
+from matplotlib.backends.backend_qt5agg import FigureCanvasQTAgg as FigureCanvas
+from matplotlib.figure import Figure
+
+from DiscreteSimulator import DiscreteSimulator
+
+# Sample rate used when a continuous system has to be discretized for streaming
+DEFAULT_STREAM_RATE = 10000.0
+
+
+def step_input(t):
+    return np.ones_like(t)
+
+
+def square_input(t):
+    return np.where(np.sin(2 * np.pi * 0.5 * t) >= 0, 1.0, -1.0)
+
+
+def sine_input(t):
+    return np.sin(2 * np.pi * 1.0 * t)
+
+
+INPUT_SIGNALS = {
+    'Square (0.5 Hz)': square_input,
+    'Step': step_input,
+    'Sine (1 Hz)': sine_input,
+}
+
+
+class RingBuffer:
+    """Lock-free ring buffer for one producer thread and one consumer thread
+
+    The producer only advances ``write_pos`` and the consumer only advances
+    ``read_pos``; both are plain ints, so each update is atomic under the GIL.
+    All ``channels`` share the one write position, which moves only after
+    every channel of a chunk is written, so the consumer always gets the
+    channels in step.  When the consumer falls behind by more than the
+    capacity the oldest samples are dropped instead of blocking the producer.
+    """
+    def __init__(self, capacity, channels=1):
+        self.capacity = capacity
+        self.data = np.zeros((channels, capacity))
+        self.write_pos = 0
+        self.read_pos = 0
+
+    def push(self, values):
+        """Append samples, one row per channel (producer side)"""
+        values = np.atleast_2d(np.asarray(values, dtype=float))[:, -self.capacity:]
+        count = values.shape[1]
+        start = self.write_pos % self.capacity
+        first = min(count, self.capacity - start)
+        self.data[:, start:start + first] = values[:, :first]
+        self.data[:, :count - first] = values[:, first:]
+        self.write_pos += count
+
+    def pop_all(self):
+        """(channels, samples) written since the last call (consumer side)"""
+        end = self.write_pos
+        start = max(self.read_pos, end - self.capacity)
+        self.read_pos = end
+        if end == start:
+            return np.empty((len(self.data), 0))
+        idx = np.arange(start, end) % self.capacity
+        return self.data[:, idx]
+
+
+class StreamingSimulator(threading.Thread):
+    """Worker thread stepping a discrete system in real time"""
+    def __init__(self, system, input_function=square_input, chunk_size=500,
+                 dt=None, buffer_seconds=10.0, realtime=True, delay=0.0):
+        super().__init__(daemon=True)
+        self.simulator = DiscreteSimulator(system, dt or 1.0 / DEFAULT_STREAM_RATE, delay)
+        self.dt = self.simulator.dt
+        self.input_function = input_function
+        self.chunk_size = chunk_size
+        self.realtime = realtime
+        capacity = max(int(buffer_seconds / self.dt), 4 * chunk_size)
+        # Rows t, u and y, published together
+        self.buffer = RingBuffer(capacity, channels=3)
+        self.samples = 0
+        self._stop_event = threading.Event()
+
+    def run(self):
+        chunk_period = self.chunk_size * self.dt
+        started = time.perf_counter()
+        while not self._stop_event.is_set():
+            t = (self.samples + np.arange(self.chunk_size)) * self.dt
+            u = self.input_function(t)
+            y = self.simulator.step_chunk(u)
+            self.buffer.push([t, u, y])
+            self.samples += self.chunk_size
+
+            if self.realtime:
+                # Sleep until simulated time catches up with wall-clock time
+                ahead = self.samples * self.dt - (time.perf_counter() - started)
+                if ahead > 0:
+                    self._stop_event.wait(min(ahead, chunk_period))
+
+    def stop(self):
+        self._stop_event.set()
+
+
+def decimate_minmax(x, y, buckets):
+    """Min/max decimation keeping visual peaks with about 2*buckets points"""
+    n = len(y)
+    if n <= 2 * buckets:
+        return x, y
+    size = n // buckets
+    usable = size * buckets
+    xb = x[n - usable:].reshape(buckets, size)
+    yb = y[n - usable:].reshape(buckets, size)
+    rows = np.arange(buckets)
+    i_min = yb.argmin(axis=1)
+    i_max = yb.argmax(axis=1)
+    first = np.minimum(i_min, i_max)
+    second = np.maximum(i_min, i_max)
+    xd = np.column_stack([xb[rows, first], xb[rows, second]]).ravel()
+    yd = np.column_stack([yb[rows, first], yb[rows, second]]).ravel()
+    return xd, yd
+
+
+class LivePlotWidget(QWidget):
+    """Rolling plot of a streaming simulation redrawn with blitting"""
+    def __init__(self, system, window_seconds=5.0, refresh_ms=33, parent=None, delay=0.0):
+        super().__init__(parent)
+        self.system = system
+        self.delay = delay
+        self.window_seconds = window_seconds
+        self.refresh_ms = refresh_ms
+        self.stream = None
+        self.background = None
+        self.t = np.empty(0)
+        self.u = np.empty(0)
+        self.y = np.empty(0)
+        self.setup_ui()
+
+        self.timer = QTimer(self)
+        self.timer.timeout.connect(self.refresh_plot)
+
+    def setup_ui(self):
+        self.setWindowTitle("Streaming Simulation")
+        self.resize(900, 500)
+        layout = QVBoxLayout(self)
+
+        controls = QHBoxLayout()
+        controls.addWidget(QLabel("Input:"))
+        self.input_combo = QComboBox()
+        self.input_combo.addItems(list(INPUT_SIGNALS))
+        controls.addWidget(self.input_combo)
+        self.start_button = QPushButton("Start")
+        self.start_button.clicked.connect(self.toggle_stream)
+        controls.addWidget(self.start_button)
+        self.rate_label = QLabel("")
+        controls.addWidget(self.rate_label)
+        controls.addStretch()
+        layout.addLayout(controls)
+
+        self.figure = Figure(figsize=(8, 4))
+        self.canvas = FigureCanvas(self.figure)
+        self.ax = self.figure.add_subplot(111)
+        self.ax.set_xlabel("Time (s)")
+        self.ax.grid(True)
+        self.ax.set_xlim(0, self.window_seconds)
+        self.ax.set_ylim(-1.5, 1.5)
+        (self.input_line,) = self.ax.plot([], [], color='#888888', lw=1, label='u', animated=True)
+        (self.output_line,) = self.ax.plot([], [], color='#007bff', lw=1.5, label='y', animated=True)
+        self.ax.legend(loc='upper right')
+        self.canvas.mpl_connect('draw_event', self.on_draw)
+        layout.addWidget(self.canvas)
+
+    def on_draw(self, event):
+        """Cache the static background after every full redraw"""
+        self.background = self.canvas.copy_from_bbox(self.ax.bbox)
+        self.ax.draw_artist(self.input_line)
+        self.ax.draw_artist(self.output_line)
+
+    def toggle_stream(self):
+        if self.stream is None:
+            self.start_stream()
+        else:
+            self.stop_stream()
+
+    def start_stream(self):
+        self.t = self.u = self.y = np.empty(0)
+        input_function = INPUT_SIGNALS[self.input_combo.currentText()]
+        self.stream = StreamingSimulator(self.system, input_function,
+                                         buffer_seconds=2 * self.window_seconds,
+                                         delay=self.delay)
+        self.stream.start()
+        self.started = time.perf_counter()
+        self.timer.start(self.refresh_ms)
+        self.start_button.setText("Stop")
+
+    def stop_stream(self):
+        self.timer.stop()
+        if self.stream is not None:
+            self.stream.stop()
+            self.stream.join()
+            self.stream = None
+        self.start_button.setText("Start")
+
+    def refresh_plot(self):
+        stream = self.stream
+        if stream is None:
+            return
+        # Drain the ring buffer and keep only the rolling window
+        keep = int(self.window_seconds / stream.dt)
+        t, u, y = stream.buffer.pop_all()
+        self.t = np.concatenate([self.t, t])[-keep:]
+        self.u = np.concatenate([self.u, u])[-keep:]
+        self.y = np.concatenate([self.y, y])[-keep:]
+        if len(self.t) == 0:
+            return
+
+        buckets = max(self.canvas.width(), 100)
+        t_end = self.t[-1]
+        t_start = max(0.0, t_end - self.window_seconds)
+        self.input_line.set_data(*decimate_minmax(self.t, self.u, buckets))
+        self.output_line.set_data(*decimate_minmax(self.t, self.y, buckets))
+
+        # Axis changes need a full redraw; otherwise only blit the lines
+        y_low, y_high = self.ax.get_ylim()
+        data_low = min(self.u.min(), self.y.min())
+        data_high = max(self.u.max(), self.y.max())
+        x_low, x_high = self.ax.get_xlim()
+        if t_end > x_high or data_low < y_low or data_high > y_high or self.background is None:
+            margin = 0.1 * max(data_high - data_low, 1.0)
+            self.ax.set_ylim(min(y_low, data_low - margin), max(y_high, data_high + margin))
+            self.ax.set_xlim(t_start, t_start + self.window_seconds * 1.5)
+            self.canvas.draw()
+        else:
+            self.canvas.restore_region(self.background)
+            self.ax.draw_artist(self.input_line)
+            self.ax.draw_artist(self.output_line)
+            self.canvas.blit(self.ax.bbox)
+
+        elapsed = time.perf_counter() - self.started
+        self.rate_label.setText(f"{stream.samples / max(elapsed, 1e-9):,.0f} samples/s")
+
+    def closeEvent(self, event):
+        self.stop_stream()
+        super().closeEvent(event)
@@ -0,0 +1,529 @@
+"""Batch analysis tools for closed-loop systems.
+
+Everything here works on whole batches of systems at once, stored as 2-D
+NumPy arrays of polynomial coefficients (one system per row, highest power
+first, shorter polynomials left-padded with zeros).
+"""
+import numpy as np
+
+# Relative size below which a Routh pivot is treated as zero
+ROUTH_ZERO_TOL = 1e-12
+
+
+def batch_polymul(a, b):
+    """Row-wise polynomial products of two coefficient batches"""
+    a = np.atleast_2d(np.asarray(a, dtype=float))
+    b = np.atleast_2d(np.asarray(b, dtype=float))
+    rows = max(len(a), len(b))
+    out = np.zeros((rows, a.shape[1] + b.shape[1] - 1))
+    for k in range(a.shape[1]):
+        out[:, k:k + b.shape[1]] += a[:, k:k + 1] * b
+    return out
+
+
+def batch_polyadd(a, b):
+    """Row-wise polynomial sums, aligning the constant terms"""
+    a = np.atleast_2d(np.asarray(a, dtype=float))
+    b = np.atleast_2d(np.asarray(b, dtype=float))
+    width = max(a.shape[1], b.shape[1])
+    a = np.pad(a, ((0, 0), (width - a.shape[1], 0)))
+    b = np.pad(b, ((0, 0), (width - b.shape[1], 0)))
+    return a + b
+
+
+def feedback_characteristic(num_g, den_g, num_h=1.0, den_h=1.0):
+    """Characteristic polynomials den_g*den_h + num_g*num_h for a batch of loops"""
+    return batch_polyadd(batch_polymul(den_g, den_h), batch_polymul(num_g, num_h))
+
+
+def loop_functions(controller, plant, sensor=((1.0,), (1.0,))):
+    """Loop gain, sensitivities, closed loop and controller effort in one pass
+
+    For the loop r -> e -> C -> u -> P -> y with H in the negative feedback
+    path, returns a dict of (nums, dens) batches:
+
+        'loop'         L = C P H
+        'sensitivity'  S = 1 / (1 + L)
+        'complementary' T = L / (1 + L)
+        'closed_loop'  Y/R = C P / (1 + L)
+        'effort'       U/R = C / (1 + L)
+
+    The products C P, P H and the characteristic polynomial are formed once
+    and shared by all five functions, which all have the same denominator
+    except L.
+    """
+    (n_c, d_c), (n_p, d_p), (n_h, d_h) = controller, plant, sensor
+    n_cp = batch_polymul(n_c, n_p)
+    d_ph = batch_polymul(d_p, d_h)
+    n_loop = batch_polymul(n_cp, n_h)
+    d_loop = batch_polymul(d_c, d_ph)
+    char = batch_polyadd(d_loop, n_loop)
+    return {
+        'loop': (n_loop, d_loop),
+        'sensitivity': (d_loop, char),
+        'complementary': (n_loop, char),
+        'closed_loop': (batch_polymul(n_cp, d_h), char),
+        'effort': (batch_polymul(n_c, d_ph), char),
+    }
+
+
+def associations(g1, g2):
+    """Series, parallel and negative feedback of G1 and G2 from shared products
+
+    The four products N1 N2, D1 D2, N1 D2 and N2 D1 are formed once:
+
+        'series'    N1 N2 / D1 D2
+        'parallel'  (N1 D2 + N2 D1) / D1 D2
+        'feedback'  N1 D2 / (D1 D2 + N1 N2)
+
+    Returns a dict of (nums, dens) batches, like ``loop_functions``.
+    """
+    (n1, d1), (n2, d2) = g1, g2
+    nn = batch_polymul(n1, n2)
+    dd = batch_polymul(d1, d2)
+    nd = batch_polymul(n1, d2)
+    dn = batch_polymul(n2, d1)
+    return {
+        'series': (nn, dd),
+        'parallel': (batch_polyadd(nd, dn), dd),
+        'feedback': (nd, batch_polyadd(dd, nn)),
+    }
+
+
+def _routh_same_degree(coeffs):
+    """Routh test for rows that all have the same degree (nonzero leading term)"""
+    batch, width = coeffs.shape
+    degree = width - 1
+    scale = np.abs(coeffs).max(axis=1)
+    cols = degree // 2 + 1
+    upper = np.zeros((batch, cols))
+    lower = np.zeros((batch, cols))
+    upper[:, :len(coeffs[0, 0::2])] = coeffs[:, 0::2]
+    lower[:, :len(coeffs[0, 1::2])] = coeffs[:, 1::2]
+
+    first_column = [upper[:, 0]]
+    special = np.zeros(batch, dtype=bool)
+    for row in range(1, degree + 1):
+        tol = ROUTH_ZERO_TOL * scale
+        zero_row = np.all(np.abs(lower) <= tol[:, None], axis=1)
+        if zero_row.any():
+            # Whole row vanished: replace it by the derivative of the
+            # auxiliary polynomial built from the row above
+            power = degree - row + 1
+            exponents = power - 2 * np.arange(cols)
+            lower[zero_row] = upper[zero_row] * np.clip(exponents, 0, None)
+            special |= zero_row
+        zero_pivot = np.abs(lower[:, 0]) <= tol
+        if zero_pivot.any():
+            # Zero only in the first column: epsilon substitution
+            lower[zero_pivot, 0] = ROUTH_ZERO_TOL * scale[zero_pivot]
+            special |= zero_pivot
+        first_column.append(lower[:, 0].copy())
+        if row == degree:
+            break
+        pivot = lower[:, :1]
+        shifted_upper = np.pad(upper[:, 1:], ((0, 0), (0, 1)))
+        shifted_lower = np.pad(lower[:, 1:], ((0, 0), (0, 1)))
+        upper, lower = lower, (pivot * shifted_upper - upper[:, :1] * shifted_lower) / pivot
+
+    signs = np.sign(np.column_stack(first_column))
+    rhp = np.count_nonzero(signs[:, 1:] != signs[:, :-1], axis=1)
+    stable = (rhp == 0) & ~special
+    return stable, rhp
+
+
+def routh_hurwitz(polys):
+    """Vectorized Routh-Hurwitz test for a batch of characteristic polynomials
+
+    Returns ``(stable, rhp_poles)``: a boolean array that is True only for
+    asymptotically stable rows, and the number of right-half-plane roots of
+    each row.  Rows with roots on the imaginary axis are reported unstable
+    with the RHP count of their remaining roots.
+    """
+    polys = np.atleast_2d(np.asarray(polys, dtype=float))
+    batch, width = polys.shape
+    nonzero = polys != 0
+    leading = np.where(nonzero.any(axis=1), nonzero.argmax(axis=1), width)
+
+    stable = np.zeros(batch, dtype=bool)
+    rhp = np.zeros(batch, dtype=int)
+    # Rows are grouped by degree so every group is one rectangular Routh array
+    for lead in np.unique(leading):
+        members = np.flatnonzero(leading == lead)
+        if lead >= width:
+            continue  # zero polynomial: nothing to analyse, not stable
+        if lead == width - 1:
+            stable[members] = True  # nonzero constant: no roots at all
+            continue
+        stable[members], rhp[members] = _routh_same_degree(polys[members, lead:])
+    return stable, rhp
+
+
+def screen_stability(polys):
+    """Summary of a Routh-Hurwitz screening over a batch of candidates"""
+    stable, rhp = routh_hurwitz(polys)
+    return {
+        'stable': stable,
+        'rhp_poles': rhp,
+        'n_stable': int(np.count_nonzero(stable)),
+        'n_unstable': int(len(stable) - np.count_nonzero(stable)),
+    }
+
+
+# Samples per step response and the band used for the settling time
+STEP_SAMPLES = 2000
+SETTLING_BAND = 0.02
+
+
+def pad_coefficients(polys):
+    """Stack coefficient sequences into a left-padded 2-D array"""
+    polys = [np.atleast_1d(np.asarray(p, dtype=float)) for p in polys]
+    width = max(len(p) for p in polys)
+    return np.array([np.pad(p, (width - len(p), 0)) for p in polys])
+
+
+def tf_batch(systems):
+    """Padded (nums, dens) arrays from a list of SISO python-control systems"""
+    nums = pad_coefficients([sys.num[0][0] for sys in systems])
+    dens = pad_coefficients([sys.den[0][0] for sys in systems])
+    return nums, dens
+
+
+def _companion_batch(nums, dens):
+    """Controllable canonical form (A, B, C, D) for same-order proper systems"""
+    batch, width = dens.shape
+    order = width - 1
+    lead = dens[:, :1]
+    dens = dens / lead
+    nums = np.pad(nums, ((0, 0), (width - nums.shape[1], 0))) / lead
+    d = nums[:, 0]
+    # Strictly proper remainder: num - D * den
+    rem = nums[:, 1:] - d[:, None] * dens[:, 1:]
+
+    a = np.zeros((batch, order, order))
+    a[:, 0, :] = -dens[:, 1:]
+    a[:, np.arange(1, order), np.arange(order - 1)] = 1.0
+    b = np.zeros((batch, order))
+    b[:, 0] = 1.0
+    return a, b, rem, d
+
+
+def _step_same_order(nums, dens, n_samples, t_final):
+    """Step responses of same-order continuous systems, one time grid per row"""
+    from scipy.linalg import expm
+
+    batch, width = dens.shape
+    order = width - 1
+    if order == 0:
+        gain = nums[:, -1] / dens[:, -1]
+        t = np.tile(np.linspace(0, 1 if t_final is None else t_final, n_samples), (batch, 1))
+        return t, np.repeat(gain[:, None], n_samples, axis=1), np.ones(batch, dtype=bool)
+
+    a, b, c, d = _companion_batch(nums, dens)
+    poles = np.linalg.eigvals(a)
+    stable = np.all(poles.real < 0, axis=1)
+    if t_final is None:
+        # Long enough for the slowest pole to settle, with a fallback for
+        # integrators and unstable rows
+        slowest = np.where(poles.real < 0, -poles.real, np.inf).min(axis=1)
+        slowest = np.where(np.isfinite(slowest), slowest, 1.0)
+        horizon = 8.0 / slowest
+    else:
+        horizon = np.full(batch, float(t_final))
+    dt = horizon / (n_samples - 1)
+
+    # Exact zero-order-hold discretization of all rows at once
+    aug = np.zeros((batch, order + 1, order + 1))
+    aug[:, :order, :order] = a
+    aug[:, :order, order] = b
+    phi = expm(aug * dt[:, None, None])
+    ad = phi[:, :order, :order]
+    bd = phi[:, :order, order]
+
+    y = np.empty((batch, n_samples))
+    x = np.zeros((batch, order))
+    for k in range(n_samples):
+        y[:, k] = np.einsum('ij,ij->i', c, x) + d
+        x = np.einsum('bij,bj->bi', ad, x) + bd
+    t = dt[:, None] * np.arange(n_samples)
+    return t, y, stable
+
+
+def batch_step_response(nums, dens, n_samples=STEP_SAMPLES, t_final=None):
+    """Unit step responses for a batch of continuous systems
+
+    Rows are grouped by order and each group is discretized and propagated
+    as one batched state recurrence.  Returns ``(t, y, stable)`` where each
+    row of ``t`` is that system's own time grid.
+    """
+    nums = np.atleast_2d(np.asarray(nums, dtype=float))
+    dens = np.atleast_2d(np.asarray(dens, dtype=float))
+    batch = len(dens)
+    nonzero = dens != 0
+    if not nonzero.any(axis=1).all():
+        raise ValueError("Transfer function with zero denominator")
+    leading = nonzero.argmax(axis=1)
+    num_leading = np.where((nums != 0).any(axis=1), (nums != 0).argmax(axis=1), nums.shape[1])
+    if np.any(nums.shape[1] - num_leading > dens.shape[1] - leading):
+        raise ValueError("Improper transfer function has no step response")
+
+    t = np.empty((batch, n_samples))
+    y = np.empty((batch, n_samples))
+    stable = np.empty(batch, dtype=bool)
+    for lead in np.unique(leading):
+        members = np.flatnonzero(leading == lead)
+        den_group = dens[members, lead:]
+        num_group = nums[members, max(0, nums.shape[1] - den_group.shape[1]):]
+        t[members], y[members], stable[members] = _step_same_order(
+            num_group, den_group, n_samples, t_final)
+    return t, y, stable
+
+
+def metrics_from_response(t, y, final_value, stable, reference=1.0, band=SETTLING_BAND):
+    """Time-domain figures of merit for a batch of step responses
+
+    Unstable rows (or rows without a finite final value) get NaN figures.
+    """
+    t = np.atleast_2d(t)
+    y = np.atleast_2d(y)
+    final_value = np.atleast_1d(np.asarray(final_value, dtype=float))
+    valid = np.atleast_1d(stable) & np.isfinite(final_value) & (final_value != 0)
+    scale = np.where(valid, final_value, 1.0)
+    rows = np.arange(len(y))
+    norm = y / scale[:, None]
+
+    def first_crossing(level):
+        above = norm >= level
+        idx = above.argmax(axis=1)
+        found = above[rows, idx]
+        # Linear interpolation between the samples around the crossing
+        prev = np.maximum(idx - 1, 0)
+        y0 = norm[rows, prev]
+        y1 = norm[rows, idx]
+        frac = np.where(y1 != y0, (level - y0) / np.where(y1 != y0, y1 - y0, 1.0), 0.0)
+        frac = np.clip(np.where(idx > 0, frac, 0.0), 0.0, 1.0)
+        time = t[rows, prev] + frac * (t[rows, idx] - t[rows, prev])
+        return np.where(found, time, np.nan)
+
+    peak_index = norm.argmax(axis=1)
+    overshoot = np.clip(norm[rows, peak_index] - 1.0, 0.0, None) * 100.0
+    peak_time = t[rows, peak_index]
+    rise_time = first_crossing(0.9) - first_crossing(0.1)
+
+    outside = np.abs(norm - 1.0) > band
+    last_outside = y.shape[1] - 1 - outside[:, ::-1].argmax(axis=1)
+    settled_from = np.minimum(last_outside + 1, y.shape[1] - 1)
+    settling_time = np.where(outside.any(axis=1), t[rows, settled_from], 0.0)
+    settling_time = np.where(outside[:, -1], np.nan, settling_time)
+
+    nan = np.full(len(y), np.nan)
+    return {
+        'final_value': np.where(valid, final_value, nan),
+        'overshoot': np.where(valid, overshoot, nan),
+        'rise_time': np.where(valid, rise_time, nan),
+        'peak_time': np.where(valid, peak_time, nan),
+        'settling_time': np.where(valid, settling_time, nan),
+        'steady_state_error': np.where(valid, reference - final_value, nan),
+    }
+
+
+def step_metrics(nums, dens, n_samples=STEP_SAMPLES, t_final=None, band=SETTLING_BAND):
+    """Overshoot, rise, peak and settling time and steady-state error for a batch
+
+    ``nums`` and ``dens`` are padded coefficient arrays (see ``tf_batch``).
+    The steady-state error is measured against a unit step reference.
+    """
+    nums = np.atleast_2d(np.asarray(nums, dtype=float))
+    dens = np.atleast_2d(np.asarray(dens, dtype=float))
+    t, y, stable = batch_step_response(nums, dens, n_samples, t_final)
+    with np.errstate(divide='ignore', invalid='ignore'):
+        final_value = nums[:, -1] / dens[:, -1]
+    return metrics_from_response(t, y, final_value, stable, band=band)
+
+
+def discrete_step_metrics(system, n_samples=STEP_SAMPLES, band=SETTLING_BAND):
+    """Step metrics of a single discrete system, simulated as a difference equation"""
+    from DiscreteSimulator import DiscreteSimulator
+
+    simulator = DiscreteSimulator(system)
+    y = simulator.simulate(np.ones(n_samples))
+    t = simulator.time_vector(n_samples)
+    num = np.asarray(system.num[0][0], dtype=float)
+    den = np.asarray(system.den[0][0], dtype=float)
+    stable = bool(np.all(np.abs(np.roots(den)) < 1.0))
+    with np.errstate(divide='ignore', invalid='ignore'):
+        final_value = np.polyval(num, 1.0) / np.polyval(den, 1.0)
+    return metrics_from_response(t, y, final_value, stable, band=band)
+
+
+# Frequency grid of the margin search: points, and decades on each side of
+# a system's characteristic frequency
+MARGIN_POINTS = 1000
+MARGIN_DECADES = 5
+MARGIN_REFINE_STEPS = 40
+
+
+def batch_polyval(polys, x):
+    """Row-wise Horner evaluation of a coefficient batch at a matrix of points"""
+    polys = np.atleast_2d(polys)
+    value = np.zeros(x.shape, dtype=complex)
+    for k in range(polys.shape[1]):
+        value = value * x + polys[:, k:k + 1]
+    return value
+
+
+def frequency_response(nums, dens, w, dt=None):
+    """L(jw), or L(e^{jw dt}) for discrete systems, for every row and frequency"""
+    x = np.exp(1j * w * dt) if dt is not None else 1j * w
+    with np.errstate(divide='ignore', invalid='ignore'):
+        return batch_polyval(nums, x) / batch_polyval(dens, x)
+
+
+def _characteristic_frequency(polys):
+    """Per-row log of the geometric mean magnitude of the nonzero roots, and their count"""
+    nonzero = polys != 0
+    width = polys.shape[1]
+    rows = np.arange(len(polys))
+    first = nonzero.argmax(axis=1)
+    last = width - 1 - nonzero[:, ::-1].argmax(axis=1)
+    count = np.where(nonzero.any(axis=1), last - first, 0)
+    with np.errstate(divide='ignore'):
+        log_product = np.log(np.abs(polys[rows, last])) - np.log(np.abs(polys[rows, first]))
+    return np.where(count > 0, log_product, 0.0), count
+
+
+def _margin_grid(nums, dens, dt, points):
+    """Per-row log-spaced grid centred on the system's characteristic frequency"""
+    if dt is not None:
+        # Discrete responses repeat past the Nyquist frequency, so end the grid there
+        nyquist = np.log10(np.pi / dt)
+        grid = 10.0 ** np.linspace(nyquist - 2 * MARGIN_DECADES, nyquist, points)
+        return np.tile(grid, (len(dens), 1))
+    log_num, count_num = _characteristic_frequency(nums)
+    log_den, count_den = _characteristic_frequency(dens)
+    count = count_num + count_den
+    centre = np.where(count > 0, (log_num + log_den) / np.maximum(count, 1), 0.0) / np.log(10)
+    return 10.0 ** (centre[:, None] + np.linspace(-MARGIN_DECADES, MARGIN_DECADES, points))
+
+
+def _crossings(values):
+    """(row, column) of every sign change between neighbouring grid points"""
+    before, after = values[:, :-1], values[:, 1:]
+    return np.nonzero((before * after < 0) | ((after == 0) & (before != 0)))
+
+
+def _refine(nums, dens, dt, rows, low, high, criterion):
+    """Bisect brackets [low, high] in log frequency until ``criterion`` changes sign"""
+    nums, dens = nums[rows], dens[rows]
+    low, high = np.log(low), np.log(high)
+    f_low = criterion(frequency_response(nums, dens, np.exp(low)[:, None], dt)[:, 0])
+    for _ in range(MARGIN_REFINE_STEPS):
+        middle = 0.5 * (low + high)
+        f_middle = criterion(frequency_response(nums, dens, np.exp(middle)[:, None], dt)[:, 0])
+        left = f_low * f_middle <= 0
+        high = np.where(left, middle, high)
+        low = np.where(left, low, middle)
+        f_low = np.where(left, f_low, f_middle)
+    w = np.exp(0.5 * (low + high))
+    return w, frequency_response(nums, dens, w[:, None], dt)[:, 0]
+
+
+def _pick(batch, rows, key, *values):
+    """Per row, the entries of ``values`` where ``key`` is smallest (NaN if none)"""
+    picked = [np.full(batch, np.nan) for _ in values]
+    if len(rows):
+        order = np.lexsort((key, rows))
+        first_rows, first = np.unique(rows[order], return_index=True)
+        for out, value in zip(picked, values):
+            out[first_rows] = value[order][first]
+    return picked
+
+
+def stability_margins(nums, dens, dt=None, points=MARGIN_POINTS):
+    """Gain, phase and delay margins of a batch of loop gains L
+
+    Every row is evaluated on its own log-spaced grid around its
+    characteristic frequency, all rows in one array.  Sign changes of
+    |L| - 1 and of Im L bracket the crossover frequencies, and all brackets
+    of the batch are refined together by bisection.  As in python-control,
+    the reported gain and phase margins are the ones closest to instability
+    (|log GM| and |PM| smallest); the delay margin is the smallest added
+    delay that brings any gain crossover to -180 degrees.  Margins without a
+    crossover are infinite.  Returns a dict of arrays.
+    """
+    nums = np.atleast_2d(np.asarray(nums, dtype=float))
+    dens = np.atleast_2d(np.asarray(dens, dtype=float))
+    batch = len(dens)
+    w = _margin_grid(nums, dens, dt, points)
+    response = frequency_response(nums, dens, w, dt)
+
+    with np.errstate(divide='ignore', invalid='ignore'):
+        rows, cols = _crossings(np.log(np.abs(response)))
+        w_c, l_c = _refine(nums, dens, dt, rows, w[rows, cols], w[rows, cols + 1],
+                           lambda l: np.log(np.abs(l)))
+        phase_margin = np.remainder(np.angle(l_c, deg=True), 360.0) - 180.0
+        delay = np.radians(np.remainder(phase_margin, 360.0)) / w_c
+        pm, wc = _pick(batch, rows, np.abs(phase_margin), phase_margin, w_c)
+        (dm,) = _pick(batch, rows, delay, delay)
+
+        rows, cols = _crossings(response.imag)
+        w_180, l_180 = _refine(nums, dens, dt, rows, w[rows, cols], w[rows, cols + 1],
+                               lambda l: l.imag)
+        # Only crossings of the negative real axis count
+        negative = l_180.real < 0
+        rows, w_180, l_180 = rows[negative], w_180[negative], l_180[negative]
+        gain_margin = 1.0 / np.abs(l_180)
+        gm, w180 = _pick(batch, rows, np.abs(np.log(gain_margin)), gain_margin, w_180)
+
+    return {
+        'gain_margin': np.where(np.isnan(gm), np.inf, gm),
+        'phase_margin': np.where(np.isnan(pm), np.inf, pm),
+        'delay_margin': np.where(np.isnan(dm), np.inf, dm),
+        'gain_crossover': wc,
+        'phase_crossover': w180,
+    }
+
+
+METRIC_LABELS = [
+    ('overshoot', 'Overshoot', '%'),
+    ('rise_time', 'Rise time (10-90%)', 's'),
+    ('peak_time', 'Peak time', 's'),
+    ('settling_time', 'Settling time (2%)', 's'),
+    ('steady_state_error', 'Steady-state error', ''),
+]
+
+
+MARGIN_LABELS = [
+    ('gain_margin', 'Gain margin', ''),
+    ('phase_margin', 'Phase margin', 'deg'),
+    ('delay_margin', 'Delay margin', 's'),
+    ('gain_crossover', 'Gain crossover', 'rad/s'),
+    ('phase_crossover', 'Phase crossover', 'rad/s'),
+]
+
+
+def format_metrics(metrics, index=0):
+    """Readable lines describing the metrics of one system of a batch"""
+    lines = []
+    for key, label, unit in METRIC_LABELS:
+        value = metrics[key][index]
+        text = "n/a" if np.isnan(value) else f"{value:.4g} {unit}".rstrip()
+        lines.append(f"{label}: {text}")
+    return lines
+
+
+def format_margins(margins, index=0):
+    """Readable lines describing the stability margins of one system of a batch"""
+    lines = []
+    for key, label, unit in MARGIN_LABELS:
+        value = margins[key][index]
+        if np.isnan(value):
+            text = "n/a"
+        elif np.isinf(value):
+            text = "inf"
+        else:
+            text = f"{value:.4g} {unit}".rstrip()
+            if key == 'gain_margin':
+                text += f" ({20 * np.log10(value):.4g} dB)"
+        lines.append(f"{label}: {text}")
+    return lines
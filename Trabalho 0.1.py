@@ -1,4 +1,5 @@
 import sys
+import html
 from PyQt5.QtWidgets import (QApplication, QMainWindow, QWidget, QVBoxLayout, 
                              QHBoxLayout, QLabel, QLineEdit, QRadioButton, 
                              QButtonGroup, QPushButton, QTextEdit, QGroupBox,
@@ -13,6 +14,8 @@ from matplotlib.figure import Figure
 import matplotlib
 matplotlib.use('Qt5Agg')
 import os
+from ExpressionParser import ExpressionError, parse_coefficients
+from SystemAnalysis import associations, loop_functions, stability_margins
 
 class InterfaceControle(QMainWindow):
     def __init__(self):
@@ -167,6 +170,7 @@ class InterfaceControle(QMainWindow):
         self.serie_radio = QRadioButton("Series")
         self.paralelo_radio = QRadioButton("Parallel")
         self.feedback_radio = QRadioButton("Feedback")
+        self.todas_radio = QRadioButton("All")
         
         self.serie_radio.setChecked(True)
         
@@ -199,16 +203,19 @@ class InterfaceControle(QMainWindow):
         self.serie_radio.setStyleSheet(radio_style)
         self.paralelo_radio.setStyleSheet(radio_style)
         self.feedback_radio.setStyleSheet(radio_style)
+        self.todas_radio.setStyleSheet(radio_style)
         
         radio_layout = QHBoxLayout()
         radio_layout.addWidget(self.serie_radio)
         radio_layout.addWidget(self.paralelo_radio)
         radio_layout.addWidget(self.feedback_radio)
+        radio_layout.addWidget(self.todas_radio)
         radio_layout.addStretch()
         
         self.button_group.addButton(self.serie_radio, 0)
         self.button_group.addButton(self.paralelo_radio, 1)
         self.button_group.addButton(self.feedback_radio, 2)
+        self.button_group.addButton(self.todas_radio, 3)
         
         input_layout.addLayout(radio_layout)
         
@@ -293,29 +300,61 @@ class InterfaceControle(QMainWindow):
         self.title_animation.setEasingCurve(QEasingCurve.InOutSine)
         
     
-    def processar_expressao(self, expr):
-        """Processa a expressão para aceitar diferentes formatos de entrada"""
-        # Remover espaços
-        expr = expr.strip()
-        
-        # Substituir ^ por ** para potências (prioridade para s^2, s^3, etc.)
-        expr = expr.replace('^', '**')
-        
-        # Processar múltiplos * para multiplicação implícita
-        # Exemplo: s*s*s vira s**3, s*s vira s**2, etc.
-        import re
-        
-        # Encontrar padrões de s*s*s... e converter para s**n
-        def replace_multiple_stars(match):
-            s_count = match.group(0).count('s')
-            if s_count > 1:
-                return f's**{s_count}'
-            return match.group(0)
-        
-        # Aplicar a substituição para s*s*s... padrões
-        expr = re.sub(r's(\*s)+', replace_multiple_stars, expr)
-        
-        return expr
+    def formatar_tf(self, sistema):
+        """Texto da função de transferência sem as linhas de Inputs e Outputs"""
+        lines = str(sistema).split('\n')
+        filtered_lines = []
+        for line in lines:
+            if not line.startswith('Inputs') and not line.startswith('Outputs') and not line.startswith('<TransferFunction>'):
+                filtered_lines.append(line)
+        return '\n'.join(filtered_lines).strip()
+    
+    def coeficientes(self, G):
+        """(num, den) de uma função de transferência SISO"""
+        return G.num[0][0], G.den[0][0]
+    
+    def calcular_associacoes(self, G1, G2):
+        """Série, paralelo e realimentação a partir dos mesmos produtos de polinômios"""
+        resultados = associations(self.coeficientes(G1), self.coeficientes(G2))
+        return {nome: control.tf(num[0], den[0]) for nome, (num, den) in resultados.items()}
+    
+    def mostrar_lado_a_lado(self, resultados):
+        """Mostra as associações em colunas lado a lado"""
+        titulos = {'series': "SÉRIE (CASCATA)", 'parallel': "PARALELO", 'feedback': "REALIMENTAÇÃO"}
+        cabecalho = ''.join(f"<th>{titulos[nome]}</th>" for nome in resultados)
+        celulas = ''.join(f"<td><pre>{html.escape(self.formatar_tf(sistema))}</pre></td>"
+                          for sistema in resultados.values())
+        self.result_text.clear()
+        self.result_text.setHtml(f"<table width='100%' cellpadding='8'>"
+                                 f"<tr>{cabecalho}</tr><tr>{celulas}</tr></table>")
+    
+    def analisar_malha(self, G1, G2):
+        """Malha fechada, L, S, T e esforço U/R de uma única fatoração da malha"""
+        funcoes = loop_functions(((1.0,), (1.0,)), self.coeficientes(G1), self.coeficientes(G2))
+        nomes = {
+            'closed_loop': "G_resultado(s)",
+            'loop': "L(s) = G1(s) × G2(s)",
+            'sensitivity': "S(s) = 1 / (1 + L(s))",
+            'complementary': "T(s) = L(s) / (1 + L(s))",
+            'effort': "U(s)/R(s) (entrada de G1)",
+        }
+        return {nomes[chave]: control.tf(num[0], den[0]) for chave, (num, den) in funcoes.items()}
+        
+    def margens(self, L):
+        """Linhas com as margens de ganho, fase e atraso de L(s)"""
+        m = {chave: valor[0] for chave, valor in stability_margins(*self.coeficientes(L)).items()}
+        if np.isinf(m['gain_margin']):
+            linhas = ["Margem de ganho: infinita"]
+        else:
+            linhas = [f"Margem de ganho: {m['gain_margin']:.4g} "
+                      f"({20 * np.log10(m['gain_margin']):.4g} dB) em {m['phase_crossover']:.4g} rad/s"]
+        if np.isinf(m['phase_margin']):
+            linhas.append("Margem de fase: infinita")
+        else:
+            linhas.append(f"Margem de fase: {m['phase_margin']:.4g}° em {m['gain_crossover']:.4g} rad/s")
+        linhas.append("Margem de atraso: infinita" if np.isinf(m['delay_margin'])
+                      else f"Margem de atraso: {m['delay_margin']:.4g} s")
+        return linhas
         
     def calcular_sistema(self):
         """Calcula o sistema baseado na configuração selecionada"""
@@ -327,21 +366,13 @@ class InterfaceControle(QMainWindow):
             QMessageBox.critical(self, "Erro", "Por favor, insira ambas as funções G1(s) e G2(s)")
             return
         
-        try:
-            # Criar as funções de transferência
-            # Processar as expressões para aceitar diferentes formatos
-            g1_expr_processed = self.processar_expressao(g1_expr)
-            g2_expr_processed = self.processar_expressao(g2_expr)
-            
-            # Criar variável local s para o eval
-            s = self.s
-            
-            self.G1 = eval(g1_expr_processed)
-            self.G2 = eval(g2_expr_processed)
-            
-        except Exception as e:
-            QMessageBox.critical(self, "Erro", f"Erro ao processar as funções: {str(e)}\n\nFORMATOS ACEITOS:\n• 10 / (s^2 + 2*s + 10)\n• 5 / (s^2 + 5)\n• 1 / (s + 1)\n• s / (s^2 + 3*s + 2)\n\nUse 's' para a variável e '^' para potências.")
-            return
+        # Criar as funções de transferência direto dos coeficientes, sem eval
+        for nome, expr in (("G1", g1_expr), ("G2", g2_expr)):
+            try:
+                setattr(self, nome, control.tf(*parse_coefficients(expr)))
+            except ExpressionError as e:
+                QMessageBox.critical(self, "Erro", f"Erro em {nome}(s):\n\n{e.pointer(expr)}\n\n{str(e)}\n\nFORMATOS ACEITOS:\n• 10 / (s^2 + 2s + 10)\n• (s + 1)(s + 2) / s^3\n• 1e-3 / (2.5e1 s + 1)\n• zpk([-1], [-2, -3], 5)\n• tf([1, 2], [1, 3, 2])\n\nUse 's' para a variável e '^' para potências.")
+                return
         
         try:
             # Obter configuração selecionada
@@ -349,8 +380,15 @@ class InterfaceControle(QMainWindow):
                 config = "serie"
             elif self.paralelo_radio.isChecked():
                 config = "paralelo"
-            else:
+            elif self.feedback_radio.isChecked():
                 config = "feedback"
+            else:
+                config = "todas"
+            
+            if config == "todas":
+                # As três associações compartilham os produtos N1·N2, D1·D2, N1·D2 e N2·D1
+                self.mostrar_lado_a_lado(self.calcular_associacoes(self.G1, self.G2))
+                return
             
             if config == "serie":
                 sistema = control.series(self.G1, self.G2)
@@ -361,27 +399,27 @@ class InterfaceControle(QMainWindow):
                 formula = "G_resultado(s) = G1(s) + G2(s)"
                 tipo = "PARALELO"
             elif config == "feedback":
-                sistema = control.feedback(self.G1, self.G2)
+                # L, S, T e U/R saem da mesma fatoração da malha
+                malha = self.analisar_malha(self.G1, self.G2)
+                sistema = malha.pop("G_resultado(s)")
                 formula = "G_resultado(s) = G1(s) / (1 + G1(s) × G2(s))"
                 tipo = "REALIMENTAÇÃO"
             
             # Limpar e mostrar apenas o resultado final
             self.result_text.clear()
-            # Extrair apenas a função de transferência sem informações do sistema
-            sistema_str = str(sistema)
-            # Remover as linhas de Inputs e Outputs
-            lines = sistema_str.split('\n')
-            filtered_lines = []
-            for line in lines:
-                if not line.startswith('Inputs') and not line.startswith('Outputs') and not line.startswith('<TransferFunction>'):
-                    filtered_lines.append(line)
-            
-            # Juntar as linhas filtradas
-            clean_result = '\n'.join(filtered_lines).strip()
             
             # Centralizar o resultado
             self.result_text.setAlignment(Qt.AlignCenter)
-            self.result_text.append(clean_result)
+            self.result_text.append(self.formatar_tf(sistema))
+            
+            if config == "feedback":
+                self.result_text.append("\nAnálise da malha:")
+                for nome, funcao in malha.items():
+                    self.result_text.append(f"\n{nome} =")
+                    self.result_text.append(self.formatar_tf(funcao))
+                self.result_text.append("\nMargens de estabilidade de L(s):")
+                for linha in self.margens(malha["L(s) = G1(s) × G2(s)"]):
+                    self.result_text.append(linha)
             
         except Exception as e:
             QMessageBox.critical(self, "Erro", f"Erro ao calcular a associação: {str(e)}")
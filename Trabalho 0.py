@@ -1,4 +1,5 @@
 import control
+from SystemAnalysis import associations
 
 # Definindo as funções de transferência
 # G1(s) = 10 / (s^2 + 2s + 10)
@@ -9,14 +10,17 @@ s = control.TransferFunction.s
 G1 = 10 / (s**2 + 2*s + 10)
 G2 = 5 / (s**2 + 5)
 
+# As três associações saem dos mesmos produtos N1·N2, D1·D2, N1·D2 e N2·D1
+resultados = associations((G1.num[0][0], G1.den[0][0]), (G2.num[0][0], G2.den[0][0]))
+
 # 1. Sistema em cascata (série)
-G_cascata = control.series(G1, G2)
+G_cascata = control.tf(resultados['series'][0][0], resultados['series'][1][0])
 
 # 2. Sistema em paralelo
-G_paralelo = control.parallel(G1, G2)
+G_paralelo = control.tf(resultados['parallel'][0][0], resultados['parallel'][1][0])
 
 # 3. Sistema com realimentação (malha fechada)
-G_feedback = control.feedback(G1, G2)
+G_feedback = control.tf(resultados['feedback'][0][0], resultados['feedback'][1][0])
 
 # Resultados finais
 print("1. SISTEMA EM CASCATA:")